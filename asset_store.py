@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Content-addressed store for the images of converted manuals.
+
+Manuals share many images (product photos, Protegus screenshots, wiring
+diagrams), and each conversion extracts its own copy. The store keeps one
+file per distinct image, named by the SHA-256 of its bytes:
+
+    <store>/ab/ab12...ef.png
+
+and every `imageN.png` in a manual folder becomes a hardlink to its store
+file. Markdown keeps its `./imageN.png` paths, MkDocs and Typora see plain
+files, and identical images take disk space once.
+
+The store defaults to `.assets/` in the folder that holds the manuals
+(docs/manuals/.assets), so links never cross file systems; ASSET_STORE
+overrides it, and ASSET_STORE=0 turns the store off in image_stage.py. Pipeline stages never modify an image in place (they write a
+new file and rename it over the old one), so a shared file only changes
+when every manual's link to it is replaced. Where hardlinks are not
+possible the image is left as a separate copy.
+
+A store file whose only link is the store itself is no longer used by any
+manual; `gc` removes those.
+
+    asset_store.py dedupe <manual-dir>...   # Link existing manuals to the store
+    asset_store.py gc [<store-dir>]         # Drop images no manual uses
+    asset_store.py stats [<store-dir>]
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STORE_NAME = ".assets"
+ASSET_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".emf", ".wmf")
+
+
+def default_store(out_dir: Path) -> Path:
+    """The store for the manuals in `out_dir` (ASSET_STORE overrides it)."""
+    override = os.environ.get("ASSET_STORE")
+    if override and override != "0":
+        return Path(override)
+    return out_dir.resolve() / STORE_NAME
+
+
+def store_root(manual_dir: Path) -> Path:
+    """The store for one manual folder."""
+    return default_store(manual_dir.resolve().parent)
+
+
+def digest_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def asset_path(store: Path, digest: str, suffix: str) -> Path:
+    return store / digest[:2] / f"{digest}{suffix.lower()}"
+
+
+def find_assets(folder: Path) -> List[Path]:
+    return sorted(p for p in folder.iterdir()
+                  if p.suffix.lower() in ASSET_SUFFIXES and p.is_file())
+
+
+def _link_over(src: Path, dst: Path) -> None:
+    """Atomically replace `dst` with a hardlink to `src`."""
+    scratch = dst.with_name(f".{dst.name}.link")
+    scratch.unlink(missing_ok=True)
+    os.link(src, scratch)
+    os.replace(scratch, dst)
+
+
+def intern(path: Path, store: Path) -> str:
+    """Make `path` a hardlink to its store file; returns what happened.
+
+    "stored": the image was new and `path` itself went into the store;
+    "linked": `path` now shares an image stored earlier;
+    "shared": it already did;
+    "copy": hardlinks failed, `path` is left as it was.
+    """
+    target = asset_path(store, digest_file(path), path.suffix)
+    try:
+        if target.is_file():
+            if os.path.samefile(target, path):
+                return "shared"
+            _link_over(target, path)
+            return "linked"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        scratch = Path(tempfile.mkstemp(prefix=".tmp-", dir=target.parent)[1])
+        scratch.unlink()
+        os.link(path, scratch)
+        os.replace(scratch, target)
+        return "stored"
+    except OSError:
+        return "copy"
+
+
+def intern_folder(folder: Path, store: Optional[Path] = None) -> Dict[str, int]:
+    """Intern every image in `folder`; returns how many ended up in each status."""
+    store = store or store_root(folder)
+    counts: Dict[str, int] = {}
+    for path in find_assets(folder):
+        status = intern(path, store)
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def store_files(store: Path) -> Iterable[Path]:
+    if store.is_dir():
+        for path in store.glob("??/*"):
+            if path.is_file() and not path.name.startswith("."):
+                yield path
+
+
+def gc(store: Path) -> Tuple[int, int]:
+    """Remove store files no manual links to; returns (files, bytes) removed."""
+    files = size = 0
+    for path in store_files(store):
+        info = path.stat()
+        if info.st_nlink == 1:
+            path.unlink()
+            files += 1
+            size += info.st_size
+    return files, size
+
+
+def stats(store: Path) -> Dict[str, int]:
+    """Distinct images, the links to them and the bytes the links would take as copies."""
+    result = {"images": 0, "links": 0, "bytes": 0, "saved": 0}
+    for path in store_files(store):
+        info = path.stat()
+        links = info.st_nlink - 1
+        result["images"] += 1
+        result["links"] += links
+        result["bytes"] += info.st_size
+        result["saved"] += max(0, links - 1) * info.st_size
+    return result
+
+
+def summary(counts: Dict[str, int]) -> str:
+    return ", ".join(f"{n} {status}" for status, n in sorted(counts.items())) or "no images"
+
+
+def main(argv: List[str]) -> int:
+    if not argv or argv[0] not in ("dedupe", "gc", "stats"):
+        print("Usage: asset_store.py dedupe <manual-dir>... | gc [<store-dir>] | stats [<store-dir>]",
+              file=sys.stderr)
+        return 2
+    command, args = argv[0], argv[1:]
+    if command == "dedupe":
+        if not args:
+            print("Usage: asset_store.py dedupe <manual-dir>...", file=sys.stderr)
+            return 2
+        for folder in map(Path, args):
+            print(f"{folder}: {summary(intern_folder(folder))}")
+        return 0
+    store = Path(args[0]) if args else default_store(Path(os.environ.get("OUT_DIR", "docs/manuals")))
+    if command == "gc":
+        files, size = gc(store)
+        print(f"Removed {files} unused image(s), {size / 1e6:.1f} MB from {store}")
+    else:
+        info = stats(store)
+        print(f"{info['images']} image(s), {info['bytes'] / 1e6:.1f} MB in {store}; "
+              f"{info['links']} link(s) from manuals, {info['saved'] / 1e6:.1f} MB saved")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
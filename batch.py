@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""Convert many DOCX manuals in parallel.
+
+Each conversion runs convert-single.sh in its own scratch working directory,
+so pandoc's media extraction and the script's pushd/popd never share state
+between workers. Output of each manual is captured and printed as one block
+when that manual finishes, followed by a summary of status and duration per
+file.
+
+Manuals that would write to the same docs/manuals/<name> folder are run one
+after another by the same worker, in the order they were given.
+
+Manuals whose build manifest shows no changed input are skipped without
+starting a worker process (see build_cache.py); --force converts them anyway.
+
+With --pandoc-batch the pandoc cache is filled first for every manual that
+needs converting, through one long-lived pandoc process per worker (see
+pandoc_stage.py --batch); the conversions then reuse the cached documents
+instead of starting pandoc and loading the Lua filters once per manual.
+
+With --split every manual is written as one page per chapter (see
+chapters.py).
+
+With --profile every conversion writes a per-stage report (see
+stage_profile.py); the run ends with the totals per stage and the slowest
+manuals.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import build_cache
+import pandoc_stage
+import stage_profile
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+CONVERT_SINGLE = SCRIPT_DIR / "convert-single.sh"
+DEFAULT_PATTERNS = ["*.docx", "docx manuals/*.docx"]
+
+
+@dataclass
+class Result:
+    source: Path
+    status: str = "pending"
+    duration: float = 0.0
+    log: str = ""
+    returncode: Optional[int] = None
+
+
+@dataclass
+class Job:
+    """All sources that convert into the same output folder."""
+
+    name: str
+    sources: List[Path]
+    results: List[Result] = field(default_factory=list)
+
+
+def find_sources(patterns: List[str], base: Path) -> List[Path]:
+    """Expand glob patterns (relative to `base`) into .docx files, skipping Word lock files."""
+    sources: List[Path] = []
+    for pattern in patterns:
+        for path in sorted(base.glob(pattern)):
+            if path.is_file() and not path.name.startswith("~$"):
+                sources.append(path.resolve())
+    return sources
+
+
+def plan_jobs(sources: List[Path]) -> List[Job]:
+    jobs: Dict[str, Job] = {}
+    for source in sources:
+        name = source.stem
+        jobs.setdefault(name, Job(name=name, sources=[])).sources.append(source)
+    return list(jobs.values())
+
+
+def convert_one(source: Path, env: Dict[str, str], options: List[str]) -> Result:
+    result = Result(source=source)
+    workdir = tempfile.mkdtemp(prefix="convert-")
+    start = time.monotonic()
+    try:
+        proc = subprocess.run(
+            [str(CONVERT_SINGLE), *options, str(source)],
+            cwd=workdir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        result.returncode = proc.returncode
+        result.log = proc.stdout
+        result.status = "ok" if proc.returncode == 0 else "failed"
+    except OSError as exc:
+        result.log = f"{exc}\n"
+        result.status = "failed"
+    finally:
+        result.duration = time.monotonic() - start
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def run_job(job: Job, env: Dict[str, str], force: bool = False,
+            options: Optional[List[str]] = None) -> Job:
+    manual_dir = Path(env["OUT_DIR"]) / job.name
+    for source in job.sources:
+        if not force:
+            start = time.monotonic()
+            up_to_date, reasons = build_cache.check(source, manual_dir)
+            if up_to_date:
+                job.results.append(Result(source=source, status="skipped",
+                                          duration=time.monotonic() - start,
+                                          log="⏭  Up to date\n"))
+                continue
+        # Already checked here; don't let convert-single.sh check again
+        job.results.append(convert_one(source, dict(env, FORCE="1"), options or []))
+    return job
+
+
+def display(path: Path) -> str:
+    try:
+        return str(path.relative_to(Path.cwd()))
+    except ValueError:
+        return str(path)
+
+
+def print_job(job: Job, log_dir: Optional[Path]) -> None:
+    blocks = []
+    for result in job.results:
+        blocks.append(f"=== {display(result.source)} ({result.status}, {result.duration:.1f}s)\n")
+        blocks.append(result.log)
+    text = "".join(blocks)
+    print(text.rstrip("\n"))
+    sys.stdout.flush()
+    if log_dir is not None:
+        (log_dir / f"{job.name}.log").write_text(text, encoding="utf-8")
+
+
+def print_summary(jobs: List[Job], elapsed: float) -> None:
+    results = [result for job in jobs for result in job.results]
+    width = max((len(display(r.source)) for r in results), default=4)
+    print("")
+    print(f"{'File':<{width}}  Status   Time")
+    for result in sorted(results, key=lambda r: display(r.source)):
+        print(f"{display(result.source):<{width}}  {result.status:<7} {result.duration:6.1f}s")
+    failed = sum(1 for r in results if r.status == "failed")
+    skipped = sum(1 for r in results if r.status == "skipped")
+    converted = len(results) - failed - skipped
+    print("")
+    print(f"✓ Batch completed: {converted} converted, {skipped} up to date, "
+          f"{failed} failed ({len(results)} files) in {elapsed:.1f}s")
+    if failed:
+        print(f"❌ {failed} file(s) failed")
+
+
+def report_profiles(jobs: List[Job], out_dir: Path, json_path: Optional[Path]) -> None:
+    """Summarize the stage_profile.py reports of the manuals converted in this run."""
+    reports = []
+    for job in jobs:
+        if any(r.status == "ok" for r in job.results):
+            report = out_dir / job.name / stage_profile.REPORT_NAME
+            if report.is_file():
+                reports.append(stage_profile.load(report))
+    if not reports:
+        return
+    summary = stage_profile.aggregate(reports)
+    stage_profile.print_summary(summary)
+    if json_path is not None:
+        summary["reports"] = reports
+        json_path.write_text(json.dumps(summary, indent=2, ensure_ascii=False) + "\n",
+                             encoding="utf-8")
+        print(f"Profile written to {json_path}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sources", nargs="*", type=Path,
+                        help="DOCX files to convert (default: *.docx and 'docx manuals/*.docx')")
+    parser.add_argument("-j", "--jobs", type=int,
+                        default=int(os.environ.get("JOBS", 0)) or os.cpu_count() or 1,
+                        help="number of parallel conversions (default: $JOBS or CPU count)")
+    parser.add_argument("--log-dir", type=Path,
+                        help="also write each manual's output to <log-dir>/<name>.log")
+    parser.add_argument("--force", action="store_true",
+                        help="convert every manual, even if its inputs are unchanged")
+    parser.add_argument("--from-cache", action="store_true",
+                        help="re-run post-processing from cached pandoc output only (implies --force)")
+    parser.add_argument("--pandoc-batch", action="store_true",
+                        help="run pandoc for all manuals in long-lived processes before converting")
+    parser.add_argument("--split", action="store_true",
+                        help="write one page per chapter (H2) instead of one index.md")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every stage of every conversion and summarize the run")
+    parser.add_argument("--profile-json", type=Path,
+                        help="with --profile, also write the reports and totals to this file")
+    args = parser.parse_args(argv)
+
+    if not CONVERT_SINGLE.is_file():
+        print(f"Missing {CONVERT_SINGLE.name}", file=sys.stderr)
+        return 1
+
+    cwd = Path.cwd()
+    if args.sources:
+        sources = [path.resolve() for path in args.sources]
+    else:
+        sources = find_sources(DEFAULT_PATTERNS, cwd)
+    jobs = plan_jobs(sources)
+
+    if args.split:
+        # Also part of the build manifest, so checked here as well as in the workers
+        os.environ["SPLIT_CHAPTERS"] = "1"
+    env = dict(os.environ)
+    # Workers run in scratch directories, so the output folder must be absolute
+    env["OUT_DIR"] = str((cwd / env.get("OUT_DIR", "docs/manuals")).resolve())
+    # Share the CPUs between conversions and their image workers
+    env.setdefault("IMAGE_JOBS", str(max(1, (os.cpu_count() or 1) // max(1, args.jobs))))
+    if args.log_dir is not None:
+        args.log_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Converting {len(sources)} file(s) with {args.jobs} worker(s) -> {env['OUT_DIR']}")
+    start = time.monotonic()
+    force = args.force or args.from_cache or env.get("FORCE") == "1"
+    options = ["--from-cache"] if args.from_cache else []
+    if args.profile:
+        options.append("--profile")
+    if not force:
+        build_cache.pipeline_inputs()  # hash the pipeline once, before the workers start
+    if args.pandoc_batch and not args.from_cache:
+        pending = [source for source in sources
+                   if force or not build_cache.check(source, Path(env["OUT_DIR"]) / source.stem)[0]]
+        if pending:
+            print(f"Running pandoc for {len(pending)} file(s) in {min(args.jobs, len(pending))} "
+                  f"batch process(es)...")
+            errors = pandoc_stage.fill_cache(pending, args.jobs)
+            for source, message in errors.items():
+                print(f"⚠️  {display(source)}: {message} (converting with the pandoc CLI)")
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        futures = [pool.submit(run_job, job, env, force, options) for job in jobs]
+        for future in as_completed(futures):
+            print_job(future.result(), args.log_dir)
+    print_summary(jobs, time.monotonic() - start)
+    if args.profile:
+        report_profiles(jobs, Path(env["OUT_DIR"]), args.profile_json)
+
+    return 1 if any(r.status == "failed" for job in jobs for r in job.results) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
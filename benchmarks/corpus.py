@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""Generate a synthetic manual corpus for the pipeline benchmarks.
+
+Every manual is built from numbered pages. A page is one H2 section with a
+numbered H3, body text, and a configurable number of tables (each with
+rowspan groups), images, callouts and numbered lists. The same content is
+written twice:
+
+* `<name>.docx`: a minimal WordprocessingML document (heading styles,
+  numbered lists, tables with vertical merges, inline PNG drawings, "Note"
+  callout tables) for the pandoc step;
+* `<name>.md`: what pandoc leaves for the Python post-processors (HTML
+  tables with rowspan cells, `./imageN.png` image links, escaped GitHub alerts,
+  underline markers, numbered lists split by images);
+
+plus the PNG images themselves in `<name>/media/`. Images are wider than
+the 1200 px limit, so the image stage resizes and quantizes them.
+
+Everything is derived from --seed with the standard library only, so the
+same options always give byte-identical files (see `Spec.digest`).
+
+    python3 benchmarks/corpus.py <out-dir> [--manuals 2] [--pages 40] [--tables 2] ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import struct
+import sys
+import zipfile
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Tuple
+from xml.sax.saxutils import escape
+
+WORDS = (
+    "communicator control panel event message receiver monitoring station "
+    "connection channel terminal keypad module settings password network "
+    "protocol signal power supply battery antenna cable output input zone "
+    "server account report configure connect select enter default enable"
+).split()
+
+# 2001-01-01, so zip entries do not carry the generation time
+ZIP_DATE = (2001, 1, 1, 0, 0, 0)
+
+
+@dataclass(frozen=True)
+class Spec:
+    """Size of the corpus; counts are per page unless noted."""
+
+    manuals: int = 2
+    pages: int = 40
+    tables: int = 2
+    rows: int = 8
+    rowspans: int = 2
+    images: int = 2
+    image_width: int = 1600
+    image_height: int = 900
+    callouts: int = 1
+    lists: int = 1
+    list_items: int = 6
+    seed: int = 1
+
+    def digest(self) -> str:
+        return hashlib.sha256(json.dumps(asdict(self), sort_keys=True).encode()).hexdigest()[:12]
+
+    @property
+    def unique_images(self) -> int:
+        """Distinct images per manual (manuals share them, like real ones do)."""
+        return max(1, min(self.pages * self.images, 8))
+
+
+# Content model -------------------------------------------------------------
+#
+# A page is a list of blocks: ("h2", text), ("h3", text), ("p", text),
+# ("list", [items]), ("image", n), ("callout", text), ("table", rows) where
+# rows is a list of [(text, rowspan, is_header)] and covered cells are absent.
+
+Block = Tuple[str, object]
+
+
+def sentence(rng: random.Random, words: int = 14) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def make_table(rng: random.Random, spec: Spec) -> List[List[Tuple[str, int, bool]]]:
+    rows = [[("Parameter", 1, True), ("Value", 1, True), ("Notes", 1, True)]]
+    spans = set(rng.sample(range(spec.rows - 1), min(spec.rowspans, max(spec.rows - 2, 0))))
+    covered = 0
+    for r in range(spec.rows):
+        row = []
+        if covered:
+            covered -= 1
+        elif r in spans:
+            row.append((f"Group {r}", 2, False))
+            covered = 1
+        else:
+            row.append((rng.choice(WORDS).title(), 1, False))
+        row.append((f"{rng.randint(1, 999)} {rng.choice(('V', 'mA', 's', 'MHz'))}", 1, False))
+        row.append((sentence(rng, 6), 1, False))
+        rows.append(row)
+    return rows
+
+
+def make_page(rng: random.Random, spec: Spec, number: int, image_base: int) -> List[Block]:
+    blocks: List[Block] = [
+        ("h2", f"Section {number}"),
+        ("p", sentence(rng) + " " + sentence(rng)),
+        ("h3", f"{number}.1 Settings for part {number}"),
+    ]
+    for _ in range(spec.lists):
+        items = [sentence(rng, 10) for _ in range(spec.list_items)]
+        blocks.append(("list", items[: len(items) // 2]))
+        if spec.images:
+            blocks.append(("image", image_base))
+        blocks.append(("list", items[len(items) // 2:]))
+    for i in range(spec.images):
+        blocks.append(("image", image_base + i))
+        blocks.append(("p", sentence(rng)))
+    for _ in range(spec.callouts):
+        blocks.append(("callout", sentence(rng, 12)))
+    for _ in range(spec.tables):
+        blocks.append(("table", make_table(rng, spec)))
+        blocks.append(("p", sentence(rng)))
+    return blocks
+
+
+def make_manual(spec: Spec, index: int) -> List[List[Block]]:
+    rng = random.Random(spec.seed * 1000 + index)
+    return [make_page(rng, spec, n + 1, n * spec.images) for n in range(spec.pages)]
+
+
+def image_number(spec: Spec, n: int) -> int:
+    return n % spec.unique_images + 1
+
+
+# PNG -----------------------------------------------------------------------
+
+def make_png(spec: Spec, number: int) -> bytes:
+    """A screenshot-like RGB image: flat panels, stripes and a noise band."""
+    rng = random.Random(spec.seed * 7919 + number)
+    width, height = spec.image_width, spec.image_height
+    palette = [bytes(rng.randrange(256) for _ in range(3)) for _ in range(6)]
+    plain = b"".join(palette[(x * 6) // width] for x in range(width))
+    striped = b"".join(palette[(x // 16) % 6] for x in range(width))
+    raw = bytearray()
+    for y in range(height):
+        raw.append(0)
+        if (y // 40) % 5 == 4:
+            raw += bytes(rng.randrange(256) for _ in range(width * 3)) if y % 40 == 0 else striped
+        else:
+            raw += plain
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(bytes(raw), 6)) + chunk(b"IEND", b""))
+
+
+# Markdown (pandoc GFM output) ------------------------------------------------
+
+def table_html(rows: List[List[Tuple[str, int, bool]]]) -> str:
+    lines = ["<table>", "<thead>"]
+    for r, row in enumerate(rows):
+        if r == 1:
+            lines += ["</thead>", "<tbody>"]
+        lines.append("<tr>")
+        for text, rowspan, header in row:
+            tag = "th" if header else "td"
+            span = f' rowspan="{rowspan}"' if rowspan > 1 else ""
+            lines.append(f"<{tag}{span}><p>{escape(text)}</p></{tag}>")
+        lines.append("</tr>")
+    lines += ["</tbody>", "</table>"]
+    return "\n".join(lines)
+
+
+def to_markdown(spec: Spec, pages: List[List[Block]], title: str) -> str:
+    out = [f"**Cellular communicator {title}**", ""]
+    for page in pages:
+        for kind, value in page:
+            if kind == "h2":
+                out.append(f"## {value}")
+            elif kind == "h3":
+                out.append(f"### {value}")
+            elif kind == "p":
+                words = str(value).split(" ")
+                words[1] = f"⟪U⟫{words[1]}⟪/U⟫"
+                words[3] = f"***{words[3]}***"
+                out.append(" ".join(words).replace("station", "station\\'s"))
+            elif kind == "list":
+                out.append("\n\n".join(f"{i}.  {item}" for i, item in enumerate(value, 1)))
+            elif kind == "image":
+                n = image_number(spec, int(value))
+                out.append(f'<img alt="" src="./image{n}.png" '
+                           f'style="width:6.5in;height:3.6in" />')
+            elif kind == "callout":
+                out.append(f"> \\[!NOTE\\]\n> {value}")
+            elif kind == "table":
+                out.append(table_html(value))
+            out.append("")
+    return "\n".join(out)
+
+
+# DOCX ----------------------------------------------------------------------
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Default Extension="png" ContentType="image/png"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+<Override PartName="/word/numbering.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml"/>
+</Types>"""
+
+PACKAGE_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+STYLES = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:styles xmlns:w="{W_NS}">
+<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>
+<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/><w:basedOn w:val="Normal"/><w:pPr><w:outlineLvl w:val="0"/></w:pPr></w:style>
+<w:style w:type="paragraph" w:styleId="Heading2"><w:name w:val="heading 2"/><w:basedOn w:val="Normal"/><w:pPr><w:outlineLvl w:val="1"/></w:pPr></w:style>
+<w:style w:type="paragraph" w:styleId="ListParagraph"><w:name w:val="List Paragraph"/><w:basedOn w:val="Normal"/></w:style>
+</w:styles>"""
+
+NUMBERING = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:numbering xmlns:w="{W_NS}">
+<w:abstractNum w:abstractNumId="0"><w:lvl w:ilvl="0"><w:start w:val="1"/><w:numFmt w:val="decimal"/><w:lvlText w:val="%1."/></w:lvl></w:abstractNum>
+<w:num w:numId="1"><w:abstractNumId w:val="0"/></w:num>
+</w:numbering>"""
+
+DRAWING = """<w:drawing><wp:inline><wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{n}" name="Picture {n}"/>\
+<a:graphic xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">\
+<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">\
+<pic:pic xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">\
+<pic:nvPicPr><pic:cNvPr id="{n}" name="image{n}.png"/><pic:cNvPicPr/></pic:nvPicPr>\
+<pic:blipFill><a:blip r:embed="rImg{n}"/></pic:blipFill>\
+<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm></pic:spPr>\
+</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing>"""
+
+
+def run(text: str) -> str:
+    return f'<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def para(text: str = "", style: str = "", extra: str = "", body: str = "") -> str:
+    props = f'<w:pStyle w:val="{style}"/>' if style else ""
+    props += extra
+    ppr = f"<w:pPr>{props}</w:pPr>" if props else ""
+    return f"<w:p>{ppr}{run(text) if text else ''}{body}</w:p>"
+
+
+def cell(content: str, merge: str = "") -> str:
+    vmerge = {"": "", "restart": '<w:vMerge w:val="restart"/>', "continue": "<w:vMerge/>"}[merge]
+    return f"<w:tc><w:tcPr>{vmerge}</w:tcPr>{content}</w:tc>"
+
+
+def table_xml(rows: List[List[Tuple[str, int, bool]]]) -> str:
+    out = ["<w:tbl><w:tblPr/>"]
+    pending = 0  # rows still covered by the first-column merge
+    for row in rows:
+        cells = []
+        if pending:
+            cells.append(cell(para(), "continue"))
+            pending -= 1
+        for text, rowspan, header in row:
+            if header:
+                content = f'<w:p><w:r><w:rPr><w:b/></w:rPr><w:t>{escape(text)}</w:t></w:r></w:p>'
+            else:
+                content = para(text)
+            if rowspan > 1:
+                cells.append(cell(content, "restart"))
+                pending = rowspan - 1
+            else:
+                cells.append(cell(content))
+        out.append("<w:tr>" + "".join(cells) + "</w:tr>")
+    out.append("</w:tbl>")
+    return "".join(out)
+
+
+def to_document_xml(spec: Spec, pages: List[List[Block]], title: str) -> str:
+    body = [para(f"Cellular communicator {title}")]
+    cx, cy = 5943600, int(5943600 * spec.image_height / spec.image_width)
+    for page in pages:
+        for kind, value in page:
+            if kind == "h2":
+                body.append(para(str(value), "Heading1"))
+            elif kind == "h3":
+                body.append(para(str(value), "Heading2"))
+            elif kind == "p":
+                body.append(para(str(value)))
+            elif kind == "list":
+                numpr = '<w:numPr><w:ilvl w:val="0"/><w:numId w:val="1"/></w:numPr>'
+                body.extend(para(item, "ListParagraph", numpr) for item in value)
+            elif kind == "image":
+                n = image_number(spec, int(value))
+                body.append(f"<w:p><w:r>{DRAWING.format(n=n, cx=cx, cy=cy)}</w:r></w:p>")
+            elif kind == "callout":
+                body.append("<w:tbl><w:tblPr/><w:tr>" + cell(para("Note")) + cell(para(str(value)))
+                            + "</w:tr></w:tbl>")
+            elif kind == "table":
+                body.append(table_xml(value))
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<w:document xmlns:w="{W_NS}" xmlns:r="{R_NS}" '
+            f'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing">'
+            f'<w:body>{"".join(body)}<w:sectPr/></w:body></w:document>')
+
+
+def document_rels(spec: Spec) -> str:
+    rels = ['<Relationship Id="rStyles" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>',
+            '<Relationship Id="rNumbering" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/numbering" Target="numbering.xml"/>']
+    for n in range(1, spec.unique_images + 1):
+        rels.append(f'<Relationship Id="rImg{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" Target="media/image{n}.png"/>')
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + "".join(rels) + "</Relationships>")
+
+
+def write_docx(path: Path, spec: Spec, pages: List[List[Block]], title: str,
+               images: List[bytes]) -> None:
+    parts = [
+        ("[Content_Types].xml", CONTENT_TYPES),
+        ("_rels/.rels", PACKAGE_RELS),
+        ("word/document.xml", to_document_xml(spec, pages, title)),
+        ("word/_rels/document.xml.rels", document_rels(spec)),
+        ("word/styles.xml", STYLES),
+        ("word/numbering.xml", NUMBERING),
+    ]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        for name, text in parts:
+            docx.writestr(zipfile.ZipInfo(name, ZIP_DATE), text.encode("utf-8"),
+                          compress_type=zipfile.ZIP_DEFLATED)
+        for n, data in enumerate(images, 1):
+            docx.writestr(zipfile.ZipInfo(f"word/media/image{n}.png", ZIP_DATE), data,
+                          compress_type=zipfile.ZIP_STORED)
+
+
+# Corpus ----------------------------------------------------------------------
+
+@dataclass
+class Manual:
+    name: str
+    docx: Path
+    markdown: Path
+    media: Path
+    pages: int
+    tables: int
+    images: int
+
+
+def generate(out_dir: Path, spec: Spec) -> List[Manual]:
+    """Write the corpus for `spec` into `out_dir`; returns its manuals."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    images = [make_png(spec, n) for n in range(1, spec.unique_images + 1)]
+    manuals = []
+    for index in range(spec.manuals):
+        name = f"SYN{index + 1} UM_ENG"
+        pages = make_manual(spec, index)
+        title = f"SYN{index + 1}"
+        docx = out_dir / f"{name}.docx"
+        markdown = out_dir / f"{name}.md"
+        media = out_dir / name / "media"
+        write_docx(docx, spec, pages, title, images)
+        markdown.write_text(to_markdown(spec, pages, title), encoding="utf-8")
+        media.mkdir(parents=True, exist_ok=True)
+        for n, data in enumerate(images, 1):
+            (media / f"image{n}.png").write_bytes(data)
+        manuals.append(Manual(name, docx, markdown, media, spec.pages,
+                              spec.pages * spec.tables, len(images)))
+    return manuals
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add one option per Spec field."""
+    for name, default in asdict(Spec()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default,
+                            help=f"(default: {default})")
+
+
+def spec_from_args(args: argparse.Namespace) -> Spec:
+    return Spec(**{name: getattr(args, name) for name in asdict(Spec())})
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir", type=Path)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    spec = spec_from_args(args)
+    manuals = generate(args.out_dir, spec)
+    print(f"Wrote {len(manuals)} manual(s) to {args.out_dir} (corpus {spec.digest()})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
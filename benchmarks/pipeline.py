@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Time every pipeline stage on a synthetic corpus and compare with a baseline.
+
+The corpus comes from benchmarks/corpus.py (same options, same seed, same
+bytes). Measured stages:
+
+* pandoc-filters: DOCX -> filtered JSON AST through the Lua filters, as
+  pandoc_stage.py runs it (skipped when pandoc is not installed);
+* pandoc-gfm: JSON AST -> GFM;
+* every postprocess.py stage, each fed the output of the stage before it;
+* images: image_stage.py on the manual's images with an empty cache;
+* images-cached: the same images again, all cache hits.
+
+For each stage it reports the best wall time of --repeat runs, throughput
+(pages per second; tables per second for the tables stage, images per
+second for the image stages) and peak memory: traced Python allocations for
+the in-process stages, and peak RSS of the process that ran pandoc or the
+image stage (each measured in a fresh worker process).
+
+    python3 benchmarks/pipeline.py [corpus options] [--repeat 5]
+    python3 benchmarks/pipeline.py --save-baseline        # store benchmarks/baseline.json
+    python3 benchmarks/pipeline.py --baseline benchmarks/baseline.json --max-regression 1.25
+
+With a baseline, every stage shows its time relative to the stored one; a
+stage slower than --max-regression times its baseline (and by more than
+--noise-ms) makes the run exit with status 1. Baselines are only comparable
+on the same machine and corpus options; the corpus digest is stored with
+them. Runs offline on Linux.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import corpus  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+Result = Dict[str, float]
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def traced_peak(func: Callable[[], object]) -> int:
+    """Peak Python allocations (bytes) while `func` runs."""
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss() -> int:
+    """Peak RSS (bytes) of this process and its finished children; Linux reports KiB."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * 1024
+
+
+# Stages run in fresh worker processes, so peak RSS belongs to one stage ----
+
+def _pandoc_worker(docx: str, repeat: int) -> Tuple[float, float, int]:
+    import pandoc_stage
+
+    times = {"filters": math.inf, "gfm": math.inf}
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="bench-pandoc-") as tmp:
+            workdir = Path(tmp)
+            start = time.perf_counter()
+            pandoc_stage.run_filters(Path(docx), workdir)
+            middle = time.perf_counter()
+            subprocess.run(["pandoc", pandoc_stage.AST_NAME, "-f", "json",
+                            "-o", pandoc_stage.MARKDOWN_NAME, *pandoc_stage.WRITER_ARGS],
+                           cwd=workdir, check=True)
+            end = time.perf_counter()
+        times["filters"] = min(times["filters"], middle - start)
+        times["gfm"] = min(times["gfm"], end - middle)
+    return times["filters"], times["gfm"], peak_rss()
+
+
+def _image_worker(media: str, repeat: int, jobs: int) -> Tuple[float, float, int]:
+    scratch = tempfile.mkdtemp(prefix="bench-images-")
+    # Before the import: image workers must not touch the real cache
+    os.environ["PIPELINE_CACHE_DIR"] = str(Path(scratch) / "cache")
+    import image_stage
+
+    cold = warm = math.inf
+    for _ in range(repeat):
+        shutil.rmtree(scratch)
+        with tempfile.TemporaryDirectory(prefix="bench-images-") as tmp:
+            folder = Path(tmp) / "manual"
+            shutil.copytree(media, folder)
+            start = time.perf_counter()
+            image_stage.optimize_folder(folder, jobs)
+            middle = time.perf_counter()
+            shutil.rmtree(folder)
+            shutil.copytree(media, folder)
+            image_stage.optimize_folder(folder, jobs)
+            end = time.perf_counter()
+        cold = min(cold, middle - start)
+        warm = min(warm, end - middle)
+    shutil.rmtree(scratch, ignore_errors=True)
+    return cold, warm, peak_rss()
+
+
+def in_worker(func, *args):
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(func, *args).result()
+
+
+# Suite -----------------------------------------------------------------------
+
+def run_suite(manuals: List[corpus.Manual], repeat: int, image_jobs: int,
+              skip: List[str]) -> Dict[str, Result]:
+    """Measure every stage over the corpus; values are summed over manuals."""
+    results: Dict[str, Result] = {}
+
+    def add(stage: str, seconds: float, peak: int, units: float, unit: str) -> None:
+        entry = results.setdefault(stage, {"seconds": 0.0, "peak_bytes": 0, "units": 0, "unit": unit})
+        entry["seconds"] += seconds
+        entry["peak_bytes"] = max(entry["peak_bytes"], peak)
+        entry["units"] += units
+
+    if "pandoc" not in skip and shutil.which("pandoc"):
+        for manual in manuals:
+            filters, gfm, rss = in_worker(_pandoc_worker, str(manual.docx), repeat)
+            add("pandoc-filters", filters, rss, manual.pages, "pages")
+            add("pandoc-gfm", gfm, rss, manual.pages, "pages")
+    elif "pandoc" not in skip:
+        print("⚠️  pandoc not found: skipping the pandoc stages", file=sys.stderr)
+
+    if "postprocess" not in skip:
+        from postprocess import STAGES
+
+        for manual in manuals:
+            text = manual.markdown.read_text(encoding="utf-8")
+            for name, stage in STAGES:
+                seconds = best_time(lambda: stage(text), repeat)
+                peak = traced_peak(lambda: stage(text))
+                if name == "tables":
+                    add(name, seconds, peak, manual.tables, "tables")
+                else:
+                    add(name, seconds, peak, manual.pages, "pages")
+                with contextlib.redirect_stdout(io.StringIO()):
+                    text = stage(text)
+
+    if "images" not in skip:
+        for manual in manuals:
+            cold, warm, rss = in_worker(_image_worker, str(manual.media), repeat, image_jobs)
+            add("images", cold, rss, manual.images, "images")
+            add("images-cached", warm, rss, manual.images, "images")
+    return results
+
+
+def print_results(results: Dict[str, Result], baseline: Optional[Dict[str, Result]],
+                  max_regression: float, noise: float) -> List[str]:
+    """Print the table; returns the stages slower than the baseline allows."""
+    regressions = []
+    header = f"{'stage':<16} {'time':>9} {'throughput':>18} {'peak MiB':>9}"
+    if baseline is not None:
+        header += f" {'vs base':>8}"
+    print(header)
+    for stage, entry in results.items():
+        rate = entry["units"] / entry["seconds"] if entry["seconds"] else math.inf
+        line = (f"{stage:<16} {entry['seconds'] * 1000:>7.1f}ms "
+                f"{rate:>10.1f} {entry['unit'] + '/s':<7} {entry['peak_bytes'] / 2**20:>9.1f}")
+        if baseline is not None:
+            base = baseline.get(stage)
+            if base and base["seconds"]:
+                ratio = entry["seconds"] / base["seconds"]
+                mark = ""
+                if ratio > max_regression and entry["seconds"] - base["seconds"] > noise:
+                    regressions.append(stage)
+                    mark = " SLOWER"
+                line += f" {ratio:>7.2f}x{mark}"
+            else:
+                line += f" {'new':>8}"
+        print(line)
+    total = sum(entry["seconds"] for stage, entry in results.items() if stage != "images-cached")
+    print(f"{'total':<16} {total * 1000:>7.1f}ms")
+    return regressions
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    corpus.add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage; the best counts")
+    parser.add_argument("--image-jobs", type=int, default=1,
+                        help="image_stage.py workers (default: 1, for stable numbers)")
+    parser.add_argument("--skip", action="append", default=[],
+                        choices=["pandoc", "postprocess", "images"], help="leave out a stage group")
+    parser.add_argument("--corpus-dir", type=Path,
+                        help="write the corpus here and keep it (default: a temporary folder)")
+    parser.add_argument("--baseline", type=Path, nargs="?", const=DEFAULT_BASELINE,
+                        help=f"compare with a stored baseline (default: {DEFAULT_BASELINE.name})")
+    parser.add_argument("--save-baseline", type=Path, nargs="?", const=DEFAULT_BASELINE,
+                        help="store this run as the baseline")
+    parser.add_argument("--max-regression", type=float, default=1.25,
+                        help="fail when a stage takes longer than this times its baseline")
+    parser.add_argument("--noise-ms", type=float, default=5.0,
+                        help="ignore slow-downs smaller than this many milliseconds (default: 5)")
+    args = parser.parse_args(argv)
+
+    spec = corpus.spec_from_args(args)
+    baseline = None
+    if args.baseline is not None:
+        stored = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if stored.get("corpus") != spec.digest():
+            print(f"⚠️  {args.baseline} was measured on another corpus "
+                  f"({stored.get('corpus')} vs {spec.digest()})", file=sys.stderr)
+        baseline = stored["results"]
+
+    with tempfile.TemporaryDirectory(prefix="bench-corpus-") as tmp:
+        out_dir = args.corpus_dir or Path(tmp)
+        manuals = corpus.generate(out_dir, spec)
+        pages = sum(m.pages for m in manuals)
+        print(f"Corpus {spec.digest()}: {len(manuals)} manual(s), {pages} pages, "
+              f"{sum(m.tables for m in manuals)} tables, {sum(m.images for m in manuals)} images "
+              f"(Python {platform.python_version()}, {os.cpu_count()} CPUs)")
+        results = run_suite(manuals, args.repeat, args.image_jobs, args.skip)
+
+    regressions = print_results(results, baseline, args.max_regression, args.noise_ms / 1000)
+    if args.save_baseline is not None:
+        data = {"corpus": spec.digest(), "spec": asdict(spec),
+                "python": platform.python_version(), "results": results}
+        args.save_baseline.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {args.save_baseline}")
+    if regressions:
+        print(f"❌ Slower than baseline x{args.max_regression}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Time the table stage on synthetic documents full of damaged tables.
+
+Each document repeats one block of tables N times. The block holds the
+shapes fix_table_structure.py repairs (Specifications tables, h1 cells,
+empty rows, malformed rowspan headers) next to damaged HTML: unclosed cells
+and rows, unterminated attribute quotes and comments, long whitespace runs
+where a repair pattern expects <p>, huge rowspan/colspan values, and a
+trail of <table> tags that are never closed.
+
+    python3 benchmarks/table_repair.py [--sizes 100,200,400,800,1600] [--max-slope 1.3]
+
+For every size it prints the document size and the time of the repair plus
+pipe conversion (the postprocess.py "tables" stage) and of the HTML-only
+repair. The growth exponent is fitted on a log-log scale; above --max-slope
+(1.0 is linear) the benchmark exits with status 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import math
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from postprocess import load_script  # noqa: E402
+
+BLOCK = """\
+## Specifications
+
+<table>
+<tbody>
+<tr>
+<td rowspan="2"><strong>Parameter</strong>
+
+<p>Network connectivity</p>
+</td>
+<td rowspan="2">Description :======== LTE / Ethernet</td>
+</tr>
+<tr>
+</tr>
+<tr>
+<td>Power</td>
+<td>12 V</td>
+</tr>
+</tbody>
+</table>
+
+<table>
+<tbody>
+<tr>
+<th rowspan="2"><strong>Name</strong>
+<p>GT</p></th>
+<th rowspan="2"><strong>Value</strong>
+<p>4G</p></th>
+</tr>
+<tr>
+</tr>
+<tr><td><h1 id="a"><strong>Head</strong></h1></td><td><h1>Plain</h1> rest</td></tr>
+<tr><td> </td></tr>
+</tbody>
+</table>
+
+<table style="width:90%;">
+<thead><tr><th>A</th><th>B</th></tr></thead>
+<tbody>
+<tr><td rowspan="99999999">span<td colspan="99999999">wide
+<tr><td title="unterminated>x<td><!-- open comment <td>y
+<tr><td rowspan="2"><strong>H</strong>{whitespace}</td><td>z</td></tr>
+<tr><td>""''"'"</td><td><<<>>></td>
+</tbody>
+</table>
+
+Text with <a "quoted and <b 'unclosed attributes.
+
+"""
+
+TRAIL = '<table style="x">\n' + '<tr><td rowspan="2">unterminated</td></tr>\n' * 20
+
+
+def make_document(blocks: int) -> str:
+    body = BLOCK.replace("{whitespace}", " \n" * 200) * blocks
+    return body + TRAIL * blocks
+
+
+def time_call(func: Callable[[str], str], text: str, repeat: int) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func(text)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def slope(sizes: List[int], times: List[float]) -> float:
+    """Least-squares exponent k in time ~ size**k."""
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sum((x - mx) ** 2 for x in xs)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,200,400,800,1600",
+                        help="comma-separated numbers of repeated blocks")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size; the best counts")
+    parser.add_argument("--max-slope", type=float, default=1.3,
+                        help="fail if time grows faster than size**MAX_SLOPE")
+    args = parser.parse_args(argv)
+
+    structure = load_script("fix_table_structure.py")
+    pipes = load_script("html-tables-to-pipes.py")
+
+    def stage(text: str) -> str:
+        return structure.fix_table_structure(text, serialize=pipes.table_to_pipe)
+
+    sizes = [int(n) for n in args.sizes.split(",")]
+    lengths, stage_times, html_times = [], [], []
+    print(f"{'blocks':>8} {'KiB':>9} {'tables':>9} {'html':>9}")
+    for blocks in sizes:
+        text = make_document(blocks)
+        lengths.append(len(text))
+        stage_times.append(time_call(stage, text, args.repeat))
+        html_times.append(time_call(structure.fix_table_structure, text, args.repeat))
+        print(f"{blocks:>8} {len(text) / 1024:>9.0f} {stage_times[-1]:>8.3f}s {html_times[-1]:>8.3f}s")
+
+    status = 0
+    for name, times in (("tables", stage_times), ("html", html_times)):
+        k = slope(lengths, times)
+        verdict = "ok" if k <= args.max_slope else "SUPER-LINEAR"
+        print(f"{name}: time ~ size^{k:.2f} ({verdict})")
+        if k > args.max_slope:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Incremental builds: skip manuals whose inputs have not changed.
+
+After a successful conversion, convert-single.sh records a build manifest
+next to the output (docs/manuals/<name>/.build-manifest.json). It holds the
+SHA-256 of every input that shapes the output:
+
+* the source .docx,
+* every Lua filter in lua-filters.txt and filter-bundle.lua,
+* the Python stages (postprocess.py and the scripts it loads),
+* the substitution rules (rules/*.yml),
+* convert-single.sh itself,
+* the output mode (one index.md or split into chapters, see chapters.py),
+* the pandoc, pngquant and Pillow versions,
+
+plus the hash of the index.md it produced. Before converting, the manifest
+is compared with the current inputs; if nothing differs (and index.md was
+not edited by hand) the conversion is skipped.
+
+The .docx is only re-hashed when its size or mtime changed, and the
+pipeline hashes are computed once per process, so a check costs a few
+stat() calls.
+
+    build_cache.py check  <input.docx> <manual-dir>   # exit 0 = up to date
+    build_cache.py record <input.docx> <manual-dir>
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+MANIFEST_NAME = ".build-manifest.json"
+MANIFEST_VERSION = 1
+FILTER_LIST = SCRIPT_DIR / "lua-filters.txt"
+# Conversion caches (pandoc output, optimized images); see pandoc_stage.py
+CACHE_ROOT = Path(os.environ.get("PIPELINE_CACHE_DIR", SCRIPT_DIR / ".cache"))
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def lua_filters() -> List[Path]:
+    """Filters listed in lua-filters.txt, in pipeline order."""
+    filters = []
+    for line in FILTER_LIST.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            filters.append(SCRIPT_DIR / line)
+    return filters
+
+
+def python_stages() -> List[Path]:
+    """postprocess.py, the rule engine, the table model and every script postprocess.py loads."""
+    import postprocess
+
+    files = {Path(postprocess.__file__).resolve(), SCRIPT_DIR / "rule_engine.py",
+             SCRIPT_DIR / "table_model.py", SCRIPT_DIR / "markdown_blocks.py"}
+    files.update(Path(path) for path in postprocess.LOADED_SCRIPTS)
+    return sorted(files)
+
+
+def rule_files() -> List[Path]:
+    from rule_engine import rule_files as files
+
+    return files()
+
+
+def tool_version(command: str) -> str:
+    if shutil.which(command) is None:
+        return "missing"
+    try:
+        proc = subprocess.run([command, "--version"], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        return "missing"
+    lines = proc.stdout.splitlines()
+    return lines[0].strip() if lines else "unknown"
+
+
+def pillow_version() -> str:
+    try:
+        import PIL
+    except ImportError:
+        return "missing"
+    return PIL.__version__
+
+
+def _relative(path: Path) -> str:
+    try:
+        return str(path.relative_to(SCRIPT_DIR))
+    except ValueError:
+        return str(path)
+
+
+def _hash_files(group: str, paths: List[Path]) -> Dict[str, str]:
+    return {
+        f"{group}:{_relative(path)}": sha256_file(path) if path.is_file() else "missing"
+        for path in paths
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def pandoc_inputs() -> Dict[str, str]:
+    """Hashes of the inputs that shape pandoc's output: Lua filters and pandoc version."""
+    inputs = _hash_files("filter", lua_filters() + [SCRIPT_DIR / "filter-bundle.lua"])
+    inputs["tool:pandoc"] = tool_version("pandoc")
+    return inputs
+
+
+@functools.lru_cache(maxsize=None)
+def pipeline_inputs() -> Dict[str, str]:
+    """Hash of every pipeline file and tool version, keyed by name."""
+    inputs: Dict[str, str] = dict(pandoc_inputs())
+    for group, paths in (
+        ("stage", python_stages()),
+        ("rules", rule_files()),
+        ("script", [SCRIPT_DIR / "convert-single.sh", SCRIPT_DIR / "pandoc_stage.py",
+                    SCRIPT_DIR / "image_stage.py", SCRIPT_DIR / "chapters.py"]),
+    ):
+        inputs.update(_hash_files(group, paths))
+    inputs["tool:pngquant"] = tool_version("pngquant")
+    inputs["tool:pillow"] = pillow_version()
+    if os.environ.get("SPLIT_CHAPTERS", "0") == "1":
+        inputs["option:split-chapters"] = "1"
+        if os.environ.get("SPLIT_DIRECTORY_URLS", "1") == "0":
+            inputs["option:split-directory-urls"] = "0"
+    return inputs
+
+
+def source_fingerprint(source: Path, previous: Optional[dict] = None) -> dict:
+    """size/mtime/sha256 of the source; reuses the old hash if size and mtime match."""
+    st = source.stat()
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        return dict(previous)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256_file(source)}
+
+
+def manifest_path(manual_dir: Path) -> Path:
+    return manual_dir / MANIFEST_NAME
+
+
+def load_manifest(manual_dir: Path) -> Optional[dict]:
+    try:
+        data = json.loads(manifest_path(manual_dir).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return data if data.get("version") == MANIFEST_VERSION else None
+
+
+def check(source: Path, manual_dir: Path) -> Tuple[bool, List[str]]:
+    """Return (up_to_date, reasons the manual needs rebuilding)."""
+    manifest = load_manifest(manual_dir)
+    if manifest is None:
+        return False, ["no build manifest"]
+
+    output = manual_dir / "index.md"
+    if not output.is_file():
+        return False, ["index.md is missing"]
+    recorded_output = manifest.get("output", {})
+    st = output.stat()
+    if (recorded_output.get("size"), recorded_output.get("mtime_ns")) != (st.st_size, st.st_mtime_ns):
+        if sha256_file(output) != recorded_output.get("sha256"):
+            return False, ["index.md was modified"]
+
+    reasons = []
+    recorded_source = manifest.get("source", {})
+    if source_fingerprint(source, recorded_source)["sha256"] != recorded_source.get("sha256"):
+        reasons.append(f"source changed: {source.name}")
+
+    recorded_inputs = manifest.get("inputs", {})
+    current_inputs = pipeline_inputs()
+    for key in sorted(set(recorded_inputs) | set(current_inputs)):
+        if recorded_inputs.get(key) != current_inputs.get(key):
+            reasons.append(f"changed: {key}")
+    return not reasons, reasons
+
+
+def record(source: Path, manual_dir: Path) -> None:
+    """Write the manifest for a manual that was just converted."""
+    output = manual_dir / "index.md"
+    st = output.stat()
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "source": {"path": str(source), **source_fingerprint(source)},
+        "inputs": pipeline_inputs(),
+        "output": {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256_file(output)},
+    }
+    path = manifest_path(manual_dir)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def invalidate(manual_dir: Path) -> None:
+    manifest_path(manual_dir).unlink(missing_ok=True)
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) != 3 or argv[0] not in ("check", "record", "invalidate"):
+        print("Usage: build_cache.py check|record|invalidate <input.docx> <manual-dir>", file=sys.stderr)
+        return 2
+    command, source, manual_dir = argv[0], Path(argv[1]), Path(argv[2])
+    if command == "record":
+        record(source, manual_dir)
+        return 0
+    if command == "invalidate":
+        invalidate(manual_dir)
+        return 0
+    up_to_date, reasons = check(source, manual_dir)
+    for reason in reasons:
+        print(f"  {reason}")
+    return 0 if up_to_date else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
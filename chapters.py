@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""Split a converted manual into one page per chapter.
+
+Every manual is normally one index.md. With SPLIT_CHAPTERS=1
+(convert-single.sh --split, batch.py --split) the document is cut at its
+H2 headings after post-processing:
+
+* index.md keeps what comes before the first H2 (title, description);
+* every chapter goes to `<slug>.md`, named after its heading the way MkDocs
+  names the heading's anchor, so inserting a chapter does not rename the
+  others;
+* links to `#anchor` are rewritten to `<page>.md#anchor` where the target
+  is on another page. Anchors are worked out as MkDocs' toc extension makes
+  them (including the `_1` suffixes of repeated headings, which restart on
+  every page);
+* MkDocs does not rewrite URLs in raw HTML, and builds `<slug>.md` as
+  `<slug>/index.html` (use_directory_urls, the default). So `src` and
+  `href` in raw HTML (`<img src="./image1.png">`, `<a href="#id">`) are
+  written as the final URLs: `../image1.png` on a chapter page, and
+  `../<slug>/#anchor` for an anchor on another page. A site built with
+  `use_directory_urls: false` needs SPLIT_DIRECTORY_URLS=0;
+* a page whose text did not change is not written again, so `mkdocs serve`
+  and publish_sync.py only see the pages that changed. For that the
+  conversion writes the whole document to `.index.full.md` (hidden from
+  MkDocs) instead of index.md, and the split writes index.md itself;
+* an index.md that is already split (no H2 left, pages in .nav.yml) is
+  not split again;
+* `.nav.yml` lists the pages in order. `chapters.py nav` prints it as a
+  MkDocs nav fragment (preview.sh and publish.sh use it). Pages listed
+  there that a new conversion no longer produces are deleted.
+
+Without SPLIT_CHAPTERS a conversion removes the pages and .nav.yml of an
+earlier split, so the folder holds index.md alone again.
+
+    chapters.py update <manual-dir>    # After post-processing: split, or drop an earlier split
+    chapters.py document-name          # File the conversion writes the document to
+    chapters.py split <index.md>       # Split a full index.md in place
+    chapters.py nav <manual-dir> [--prefix P] [--indent N]   # MkDocs nav entries
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+import unicodedata
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+ENV_VAR = "SPLIT_CHAPTERS"
+# Whether the site builds page.md as page/index.html (MkDocs' use_directory_urls)
+DIRECTORY_URLS_VAR = "SPLIT_DIRECTORY_URLS"
+INDEX_NAME = "index.md"
+NAV_NAME = ".nav.yml"
+# The whole converted document, before the split (MkDocs skips dot files)
+FULL_NAME = ".index.full.md"
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+FENCE_RE = re.compile(r"^\s*(```|~~~)")
+# attr_list on a heading: "## Title {#custom-id .class}"
+ATTR_RE = re.compile(r"\s*\{([^}]*)\}\s*$")
+ATTR_ID_RE = re.compile(r"#([\w-]+)")
+# Ids set in raw HTML (pandoc bookmarks, <a id="...">); MkDocs keeps them
+HTML_ID_RE = re.compile(r"""<[A-Za-z][^>]*?\sid=["']([^"']+)["']""")
+MD_LINK_RE = re.compile(r"(\]\()#([^)\s]+)((?:\s+\"[^\"]*\")?\))")
+HTML_URL_RE = re.compile(r"""(\s(?:src|href)=["'])([^"']*)(["'])""")
+URL_SCHEME_RE = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:")
+INLINE_LINK_RE = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+TAG_RE = re.compile(r"<[^>]+>")
+ID_COUNT_RE = re.compile(r"^(.*)_([0-9]+)$")
+NAV_LINE_RE = re.compile(r"^- (\".*\"): (.+)$")
+
+
+def enabled() -> bool:
+    return os.environ.get(ENV_VAR, "0") == "1"
+
+
+def directory_urls() -> bool:
+    return os.environ.get(DIRECTORY_URLS_VAR, "1") != "0"
+
+
+def document_name() -> str:
+    """File the conversion stages write the whole document to."""
+    return FULL_NAME if enabled() else INDEX_NAME
+
+
+def slugify(value: str, separator: str = "-") -> str:
+    """Python-Markdown's toc slugify (the MkDocs default)."""
+    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    value = re.sub(r"[^\w\s-]", "", value).strip().lower()
+    return re.sub(r"[{}\s]+".format(separator), separator, value)
+
+
+def unique(value: str, used: Set[str]) -> str:
+    """The toc extension's de-duplication: `id`, `id_1`, `id_2`..."""
+    while value in used or not value:
+        match = ID_COUNT_RE.match(value)
+        if match:
+            value = f"{match.group(1)}_{int(match.group(2)) + 1}"
+        else:
+            value = f"{value}_1"
+    used.add(value)
+    return value
+
+
+def heading_text(title: str) -> Tuple[str, Optional[str]]:
+    """Plain text of a heading and its explicit {#id}, if any."""
+    explicit = None
+    attrs = ATTR_RE.search(title)
+    if attrs:
+        found = ATTR_ID_RE.search(attrs.group(1))
+        explicit = found.group(1) if found else None
+        title = title[:attrs.start()]
+    title = INLINE_LINK_RE.sub(r"\1", title)
+    title = TAG_RE.sub("", title)
+    return title.replace("*", "").replace("`", "").strip(), explicit
+
+
+@dataclass
+class Page:
+    name: str
+    title: str
+    lines: List[str] = field(default_factory=list)
+    # Anchor in the single document -> anchor on this page
+    anchors: Dict[str, str] = field(default_factory=dict)
+
+
+def split(text: str, intro_title: str) -> List[Page]:
+    """Cut `text` at H2 headings; the first page is index.md."""
+    pages = [Page(INDEX_NAME, intro_title)]
+    names = {INDEX_NAME}
+    document_ids: Set[str] = set()
+    page_ids: Set[str] = set()
+    in_fence = False
+    for line in text.split("\n"):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        heading = None if in_fence else HEADING_RE.match(line)
+        if heading and len(heading.group(1)) == 2:
+            title, _ = heading_text(heading.group(2))
+            stem = slugify(title) or "chapter"
+            name = f"{stem}.md"
+            count = 1
+            while name in names:
+                count += 1
+                name = f"{stem}-{count}.md"
+            names.add(name)
+            pages.append(Page(name, title))
+            page_ids = set()
+        page = pages[-1]
+        page.lines.append(line)
+        if in_fence:
+            continue
+        if heading:
+            title, explicit = heading_text(heading.group(2))
+            if explicit:
+                document_ids.add(explicit)
+                page_ids.add(explicit)
+                page.anchors[explicit] = explicit
+            else:
+                slug = slugify(title)
+                page.anchors[unique(slug, document_ids)] = unique(slug, page_ids)
+        for anchor in HTML_ID_RE.findall(line):
+            document_ids.add(anchor)
+            page_ids.add(anchor)
+            page.anchors[anchor] = anchor
+    # The intro is listed under the manual's H1
+    for line in pages[0].lines:
+        heading = HEADING_RE.match(line)
+        if heading and len(heading.group(1)) == 1:
+            pages[0].title = heading_text(heading.group(2))[0] or intro_title
+            break
+    return pages
+
+
+def has_chapters(text: str) -> bool:
+    return any(len(m.group(1)) == 2 for m in map(HEADING_RE.match, text.split("\n")) if m)
+
+
+def page_url(name: str, directory_urls: bool = True) -> str:
+    """URL of a page relative to the manual folder's URL, as MkDocs builds it."""
+    if name == INDEX_NAME:
+        return "" if directory_urls else "index.html"
+    stem = name[:-len(".md")]
+    return f"{stem}/" if directory_urls else f"{stem}.html"
+
+
+def relink(pages: List[Page], directory_urls: bool = True) -> Dict[str, str]:
+    """Text of every page, with #anchor links pointing at the page that has the anchor.
+
+    Markdown links point at `<page>.md#anchor`, which MkDocs turns into a
+    URL; URLs in raw HTML are written as MkDocs will serve them.
+    """
+    where: Dict[str, Tuple[str, str]] = {}
+    for page in pages:
+        for anchor, local in page.anchors.items():
+            where.setdefault(anchor, (page.name, local))
+
+    texts = {}
+    for page in pages:
+        # The manual folder, seen from the URL of this page
+        base = "../" if directory_urls and page.name != INDEX_NAME else ""
+
+        def target(anchor: str) -> str:
+            if anchor not in where:
+                return f"#{anchor}"
+            name, local = where[anchor]
+            return f"#{local}" if name == page.name else f"{name}#{local}"
+
+        def html_url(url: str) -> str:
+            if url.startswith("#"):
+                anchor = url[1:]
+                if anchor not in where or where[anchor][0] == page.name:
+                    return target(anchor)
+                name, local = where[anchor]
+                return f"{base}{page_url(name, directory_urls)}#{local}"
+            if not base or not url or url.startswith("/") or URL_SCHEME_RE.match(url):
+                return url
+            return base + (url[2:] if url.startswith("./") else url)
+
+        text = "\n".join(page.lines).strip("\n") + "\n"
+        text = MD_LINK_RE.sub(lambda m: m.group(1) + target(m.group(2)) + m.group(3), text)
+        text = HTML_URL_RE.sub(lambda m: m.group(1) + html_url(m.group(2)) + m.group(3), text)
+        texts[page.name] = text
+    return texts
+
+
+def read_nav(manual_dir: Path) -> List[Tuple[str, str]]:
+    """(title, page) pairs of the last split, from .nav.yml."""
+    try:
+        lines = (manual_dir / NAV_NAME).read_text(encoding="utf-8").splitlines()
+    except OSError:
+        return []
+    entries = []
+    for line in lines:
+        match = NAV_LINE_RE.match(line)
+        if match:
+            entries.append((json.loads(match.group(1)), match.group(2)))
+    return entries
+
+
+def write_if_changed(path: Path, text: str) -> bool:
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return False
+    except OSError:
+        pass
+    scratch = path.with_name(f".{path.name}.tmp")
+    scratch.write_text(text, encoding="utf-8")
+    os.replace(scratch, path)
+    return True
+
+
+def split_file(index: Path) -> Optional[Dict[str, int]]:
+    """Split `index` into pages next to it; counts of written/unchanged/removed pages.
+
+    None if `index` is the intro page of an earlier split: splitting it
+    again would drop every chapter page.
+    """
+    manual_dir = index.parent
+    text = index.read_text(encoding="utf-8")
+    if index.name == INDEX_NAME and not has_chapters(text) and len(read_nav(manual_dir)) > 1:
+        return None
+    pages = split(text, manual_dir.name)
+    texts = relink(pages, directory_urls())
+    counts = {"written": 0, "unchanged": 0, "removed": 0}
+    for page in pages:
+        changed = write_if_changed(manual_dir / page.name, texts[page.name])
+        counts["written" if changed else "unchanged"] += 1
+
+    current = {page.name for page in pages}
+    for _, name in read_nav(manual_dir):
+        if name not in current and (manual_dir / name).is_file():
+            (manual_dir / name).unlink()
+            counts["removed"] += 1
+    nav = ["# Pages of this manual in order (chapters.py); paths are relative to this folder"]
+    nav += [f"- {json.dumps(page.title, ensure_ascii=False)}: {page.name}" for page in pages]
+    write_if_changed(manual_dir / NAV_NAME, "\n".join(nav) + "\n")
+    return counts
+
+
+def remove(manual_dir: Path) -> int:
+    """Delete the chapter pages and .nav.yml of an earlier split."""
+    removed = 0
+    for _, name in read_nav(manual_dir):
+        if name != INDEX_NAME and (manual_dir / name).is_file():
+            (manual_dir / name).unlink()
+            removed += 1
+    (manual_dir / NAV_NAME).unlink(missing_ok=True)
+    return removed
+
+
+def update(manual_dir: Path) -> None:
+    """The conversion step: split the document if SPLIT_CHAPTERS=1, else undo an earlier split."""
+    if enabled():
+        full = manual_dir / FULL_NAME
+        counts = split_file(full if full.is_file() else manual_dir / INDEX_NAME)
+        full.unlink(missing_ok=True)
+        if counts is None:
+            print(f"⏭  {manual_dir / INDEX_NAME} is already split (see {NAV_NAME})")
+            return
+        print(f"Split into {counts['written'] + counts['unchanged']} pages "
+              f"({counts['written']} written, {counts['unchanged']} unchanged, "
+              f"{counts['removed']} removed)")
+    elif (manual_dir / NAV_NAME).exists():
+        print(f"Removed {remove(manual_dir)} chapter page(s) of an earlier split")
+
+
+def nav_fragment(manual_dir: Path, prefix: str = "", indent: int = 0) -> List[str]:
+    """The pages as MkDocs nav entries; just index.md if the manual is not split."""
+    entries = read_nav(manual_dir) or [(manual_dir.name, INDEX_NAME)]
+    pad = " " * indent
+    return [f"{pad}- {json.dumps(title, ensure_ascii=False)}: {prefix}{name}"
+            for title, name in entries]
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("split")
+    p.add_argument("index", type=Path)
+    p = commands.add_parser("update")
+    p.add_argument("manual_dir", type=Path)
+    p = commands.add_parser("nav")
+    p.add_argument("manual_dir", type=Path)
+    p.add_argument("--prefix", default="", help="prepended to every page path")
+    p.add_argument("--indent", type=int, default=0)
+    commands.add_parser("document-name")
+    args = parser.parse_args(argv)
+
+    if args.command == "split":
+        if not args.index.is_file():
+            print(f"❌ {args.index} not found", file=sys.stderr)
+            return 1
+        counts = split_file(args.index)
+        if counts is None:
+            print(f"⏭  {args.index} is already split (see {NAV_NAME})")
+            return 0
+        print(f"✅ {counts['written']} page(s) written, {counts['unchanged']} unchanged, "
+              f"{counts['removed']} removed")
+    elif args.command == "update":
+        update(args.manual_dir)
+    elif args.command == "document-name":
+        print(document_name())
+    else:
+        print("\n".join(nav_fragment(args.manual_dir, args.prefix, args.indent)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
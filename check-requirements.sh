@@ -14,6 +14,20 @@ else
     exit 1
 fi
 
+# Image optimization tools (optional: images are left as extracted without them)
+if python3 -c "import PIL" >/dev/null 2>&1; then
+    echo "✅ Pillow: $(python3 -c 'import PIL; print(PIL.__version__)')"
+else
+    echo "⚠️  Pillow: Not found (images are not resized)"
+    echo "   Install with: pip install Pillow"
+fi
+if command -v pngquant >/dev/null 2>&1; then
+    echo "✅ pngquant: $(pngquant --version)"
+else
+    echo "⚠️  pngquant: Not found (PNGs get lossless optimization only)"
+    echo "   Install with: brew install pngquant"
+fi
+
 # Check if Lua filters exist
 missing_filters=""
 for f in normalize-headings.lua strip-toc.lua strip-cover.lua; do
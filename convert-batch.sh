@@ -1,23 +1,15 @@
 #!/bin/bash
 set -euo pipefail
 
+# Convert all .docx files in the current directory and in "docx manuals/".
+# Conversions run in parallel; set JOBS (or pass -j N) to change the number
+# of workers (default: CPU count). Extra arguments are passed to batch.py,
+# e.g. ./convert-batch.sh -j 4 --log-dir logs
+
 # Get absolute paths
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
 # Ensure convert-single.sh exists
 [ -f "$SCRIPT_DIR/convert-single.sh" ] || { echo "Missing convert-single.sh"; exit 1; }
 
-count=0
-shopt -s nullglob
-
-for f in *.docx "docx manuals"/*.docx; do
-  [ -f "$f" ] || continue
-
-  echo "Converting: $f"
-  "$SCRIPT_DIR/convert-single.sh" "$f"
-
-  ((count++))
-done
-
-echo ""
-echo "✓ Batch completed: $count files converted"
+exec python3 "$SCRIPT_DIR/batch.py" "$@"
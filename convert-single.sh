@@ -11,8 +11,25 @@ set -euo pipefail
 # including H1 tags in cells, rowspan issues, and empty rows. See TABLE_STRUCTURE_FIX.md
 # for details. This ensures tables display properly with horizontal headers in MkDocs.
 
+# --from-cache: start from the cached pandoc output (see pandoc_stage.py)
+# and re-run only the post-processing; fails if the document is not cached.
+# --profile: write a per-stage timing/memory report to
+# <manual>/.profile.json (see stage_profile.py).
+# --split: one page per H2 chapter plus .nav.yml (same as SPLIT_CHAPTERS=1;
+# see chapters.py).
+FROM_CACHE=()
+PROFILE=0
+while [ $# -gt 0 ]; do
+  case "$1" in
+    --from-cache) FROM_CACHE=(--from-cache); FORCE=1; shift ;;
+    --profile) PROFILE=1; shift ;;
+    --split) export SPLIT_CHAPTERS=1; shift ;;
+    *) break ;;
+  esac
+done
+
 if [ $# -eq 0 ]; then
-  echo "Usage: $0 <input.docx>"; exit 1
+  echo "Usage: $0 [--from-cache] [--profile] [--split] <input.docx>"; exit 1
 fi
 
 OUT_DIR="${OUT_DIR:-docs/manuals}"
@@ -23,209 +40,78 @@ inp="$(cd "$(dirname "$1")" && pwd)/$(basename "$1")"
 base="$(basename "${inp%.docx}")"
 doc_dir="${OUT_DIR}/${base}"
 
-# Ensure filters exist
-for f in strip-cover.lua strip-toc.lua promote-strong-top.lua fix-numbered-heading-levels.lua normalize-headings.lua move-first-image-to-description.lua split-inline-images.lua convert-image-sizes.lua softwrap-tokens.lua clean-table-pipes.lua mark-two-col.lua convert-underline.lua remove-unwanted-blockquotes.lua maintain-list-continuity.lua strip-classes.lua fix-typography.lua fix-crossrefs.lua clean-html-blocks.lua unwrap-table-blockquotes.lua remove-standalone-asterisks.lua fix-rowspan-headers.lua flatten-instruction-tables.lua; do
+# Ensure the Lua filters exist (lua-filters.txt lists them in pipeline order)
+while IFS= read -r f; do
+  case "$f" in ''|'#'*) continue ;; esac
   [ -f "$SCRIPT_DIR/$f" ] || { echo "Missing $f"; exit 1; }
-done
-# Check the new filter in filters subdirectory
-[ -f "$SCRIPT_DIR/filters/flatten-two-cell-tables.lua" ] || { echo "Missing filters/flatten-two-cell-tables.lua"; exit 1; }
+done < "$SCRIPT_DIR/lua-filters.txt"
 
-mkdir -p "$doc_dir"
-pushd "$doc_dir" >/dev/null
-
-pandoc "$inp" \
-  -o "index.md" \
-  -t gfm \
-  --extract-media="." \
-  --wrap=none \
-  --markdown-headings=atx \
-  --lua-filter="$SCRIPT_DIR/strip-cover.lua" \
-  --lua-filter="$SCRIPT_DIR/strip-toc.lua" \
-  --lua-filter="$SCRIPT_DIR/promote-strong-top.lua" \
-  --lua-filter="$SCRIPT_DIR/map-docx-heading-levels.lua" \
-  --lua-filter="$SCRIPT_DIR/fix-numbered-heading-levels.lua" \
-  --lua-filter="$SCRIPT_DIR/remove-table-widths.lua" \
-  --lua-filter="$SCRIPT_DIR/filters/flatten-two-cell-tables.lua" \
-  --lua-filter="$SCRIPT_DIR/flatten-instruction-tables.lua" \
-  --lua-filter="$SCRIPT_DIR/unwrap-table-blockquotes.lua" \
-  --lua-filter="$SCRIPT_DIR/normalize-headings.lua" \
-  --lua-filter="$SCRIPT_DIR/strip-manual-heading-numbers.lua" \
-  --lua-filter="$SCRIPT_DIR/move-first-image-to-description.lua" \
-  --lua-filter="$SCRIPT_DIR/split-inline-images.lua" \
-  --lua-filter="$SCRIPT_DIR/convert-image-sizes.lua" \
-  --lua-filter="$SCRIPT_DIR/softwrap-tokens.lua" \
-  --lua-filter="$SCRIPT_DIR/remove-empty-table-columns.lua" \
-  --lua-filter="$SCRIPT_DIR/clean-table-pipes.lua" \
-  --lua-filter="$SCRIPT_DIR/mark-two-col.lua" \
-  --lua-filter="$SCRIPT_DIR/convert-underline.lua" \
-  --lua-filter="$SCRIPT_DIR/remove-unwanted-blockquotes.lua" \
-  --lua-filter="$SCRIPT_DIR/maintain-list-continuity.lua" \
-  --lua-filter="$SCRIPT_DIR/strip-classes.lua" \
-  --lua-filter="$SCRIPT_DIR/fix-typography.lua" \
-  --lua-filter="$SCRIPT_DIR/fix-crossrefs.lua" \
-  --lua-filter="$SCRIPT_DIR/remove-standalone-asterisks.lua" \
-  --lua-filter="$SCRIPT_DIR/clean-html-blocks.lua"
-
-# If Pandoc made ./media/, flatten to current folder and fix links
-if [ -d "media" ]; then
-  echo "  Flattening media folder..."
-  shopt -s nullglob
-  for f in media/*; do mv "$f" .; done
-  rmdir media
-  # Rewrite ](media/xxx) -> ](xxx) and src="./media/xxx" -> src="xxx"
-  sed -i '' 's#](\./media/#](#g' index.md
-  sed -i '' 's#](media/#](#g' index.md
-  sed -i '' 's#src="\./media/#src="#g' index.md
-  sed -i '' 's#src="media/#src="#g' index.md
-  echo "  Fixed image paths"
+# Skip manuals whose source, filters, stages, rules and tools are unchanged
+# since the last conversion (see build_cache.py). FORCE=1 always converts.
+if [ "${FORCE:-0}" != "1" ] && python3 "$SCRIPT_DIR/build_cache.py" check "$inp" "$doc_dir" >/dev/null; then
+  echo "⏭  Up to date: ${doc_dir}/index.md"
+  exit 0
 fi
 
-# Fix any remaining error references
-sed -i '' 's/Error! Reference source not found\./see the referenced section/g' index.md
-
-# Convert first markdown image to centered HTML with width=400 (before Description heading)
-sed -i '' '1,/^## Description/{ s#^!\[GT Cellular Communicator\](./image1.png)$#<div style="text-align: center;">\n  <img src="./image1.png" alt="GT Cellular Communicator" width="400">\n</div>#; }' index.md
-
-# Clean up blockquotes in tables
-sed -i '' 's/<blockquote>//g; s/<\/blockquote>//g' index.md
-
-# Fix HTML blocks with {=html} tags that prevent proper rendering in MkDocs
-sed -i '' 's/`<img \([^`]*\)>`{=html}/<img \1>/g' index.md
-
-# Fix underlined text with HTML tags to proper markdown underline
-sed -i '' 's/`<u>`{=html}\([^`]*\)`<\/u>`{=html}/<u>\1<\/u>/g' index.md
-
-# Fix escaped apostrophes in text (remove backslashes before single quotes)
-sed -i '' "s/\\\\'/'/g" index.md
-
-# Fix escaped quotes (remove backslashes before double quotes)
-sed -i '' 's/\\"/"/g' index.md
-
-# Fix escaped angle brackets in Annex conversion table (\<z\> → <z>, \<v\> → <v>, \<n\> → <n>)
-sed -i '' 's/\\</</g; s/\\>/>/g' index.md
-
-# Remove stray pipe characters from table cells (author formatting artifact from DOCX)
-# DISABLED: This was too aggressive and was removing legitimate table column separators
-# The html-tables-to-pipes.py script now handles this properly
-# Pattern 1: " | " between any text → " " (just space)
-# sed -i '' 's/ | / /g' index.md
-# Pattern 2: trailing " |" at end of line or before tags → remove entirely
-# sed -i '' 's/ |$//' index.md
-# sed -i '' 's/ |</</g' index.md
-
-# Remove table separator artifacts from DOCX (equal signs and plus)
-# Pattern: "Model ======...+ " → "Model "
-sed -i '' 's/Model [=]+\+ /Model /g' index.md
-
-# Remove duplicate heading IDs like {#id .class} {#id-id-.class}
-# Pattern: {#something} {#something-something-.class} → {#something}
-sed -i '' -E 's/\{#([^}]+)\} \{#[^}]+\}/{#\1}/g' index.md
-
-# Remove HTML comment artifacts (<!-- -->)
-sed -i '' 's/<!-- -->//g' index.md
-
-# Remove duplicate product images wrapped in <div> tags (keeps only the one after H1 title)
-# This removes standalone <div><img src="imageN.png" ... width="400"></div> blocks (before ./ is added)
-# The H1 image is added later by sed, so this safely removes all duplicates
-perl -i -0777 -pe 's/<div>[\s\n]*<img\s+src="(?:\.\/)?(image[1-5]\.png)"[^>]*width="400"[^>]*>[\s\n]*<\/div>[\s\n]*/\n/g' index.md
-
-# Fix title formatting - make "Works with Protegus2 app:" bold like other titles
-sed -i '' 's/^Works with Protegus2 app:/**Works with Protegus2 app:**/g' index.md
-
-# Fix Features section structure - change from bold to H3 (subsection) and make first line bold
-sed -i '' 's/^\*\*Features\*\*$/### Features/g' index.md
-sed -i '' 's/^Connects to the control panel'\''s serial or keyboard bus or telephone line (TIP\/RING)\.$/\*\*Connects to the control panel'\''s serial or keyboard bus or telephone line (TIP\/RING).\*\*/g' index.md
-
-# Note: H1 title is now automatically generated by promote-strong-top.lua filter
-# It extracts the product name from the cover page and creates proper title
-
-# Normalize heading levels: ALL section headings should be H2, not H1
-# Only the product title (created by promote-strong-top.lua) should be H1
-# Strategy: First convert all H1 to H2, then convert product titles back to H1
-sed -i '' 's/^# \(.*\)$/## \1/g' index.md
-sed -i '' 's/^## \(.*Alarm Panel\)$/# \1/g' index.md
-sed -i '' 's/^## \(.*Cellular Communicator\)$/# \1/g' index.md
-
-# Fix heading hierarchy using Word classes and numbered headings
-# - Python script handles unnumbered headings with Word classes (.2-Po-Pag)
-# - Lua filter handles numbered headings in text (11.1 Title)
-python3 "$SCRIPT_DIR/fix-heading-hierarchy.py" index.md
-
-# Add centered product image after H1 title (must run AFTER heading normalization)
-# Works for all product types: Communicators, Alarm Panels, etc.
-sed -i '' '/^# .*Alarm Panel$/a\
-\
-<div style="text-align: center;">\
-  <img src="./image1.png" alt="Product Image" width="400">\
-</div>
-' index.md
-sed -i '' '/^# .*Cellular Communicator$/a\
-\
-<div style="text-align: center;">\
-  <img src="./image1.png" alt="Product Image" width="400">\
-</div>
-' index.md
-
-# Remove excessive bold/italic formatting from Description opening paragraph
-# First remove all bold-italic (***text***) → (text)
-sed -i '' 's/\*\*\*\([^*][^*]*[^*]\)\*\*\*/\1/g' index.md
-# Then clean up nested bold/italic: **The *text* word** → The text word
-sed -i '' 's/^\*\*The \*\([^*]*\) control panel\*\*/The \1 control panel/g' index.md
-
-# Fix GitHub-style alerts by removing backslash escaping from square brackets
-sed -i '' 's/\\\[/[/g; s/\\\]/]/g' index.md
-
-# Convert GitHub-style alerts to MkDocs admonitions format
-sed -i '' 's/> \[!NOTE\]/!!! note/g' index.md
-sed -i '' 's/> \[!IMPORTANT\]/!!! warning "Important"/g' index.md
-sed -i '' 's/> \[!WARNING\]/!!! warning/g' index.md
-sed -i '' 's/> \[!TIP\]/!!! tip/g' index.md
-sed -i '' 's/> \[!CAUTION\]/!!! warning "Caution"/g' index.md
-
-# Fix admonition formatting (proper indentation)
-python3 "$SCRIPT_DIR/fix_admonitions.py" index.md
-
-# Fix table structure issues (H1 in cells, empty rows, malformed headers)
-python3 "$SCRIPT_DIR/fix_table_structure.py" index.md
-
-# Convert HTML tables to pipe tables for human readability (AFTER table structure fixes)
-echo "Converting HTML tables to pipe tables..."
-python3 "$SCRIPT_DIR/html-tables-to-pipes.py" index.md
-
-# Convert underline markers to HTML tags
-# The convert-underline.lua filter uses special markers (⟪U⟫ and ⟪/U⟫) that survive GFM conversion
-# Now convert them to proper <u> tags
-echo "Converting underline markers to HTML tags..."
-sed -i '' 's/⟪U⟫/<u>/g; s/⟪\/U⟫/<\/u>/g' index.md
-
-python3 "$SCRIPT_DIR/normalize-callouts.py" index.md
-python3 "$SCRIPT_DIR/fix-relative-images.py" index.md
-python3 "$SCRIPT_DIR/fix-list-continuity.py" index.md
-python3 "$SCRIPT_DIR/reduce-spacing.py" index.md
-
-# Fix table spacing: ensure blank line before tables
-python3 "$SCRIPT_DIR/fix-table-spacing.py" index.md
-
-# Optimize images for web and print (max 1200px width, 85% quality)
-echo "Optimizing images..."
-shopt -s nullglob
-for img in *.png *.jpg *.jpeg; do
-  [ -f "$img" ] || continue
-
-  # Get dimensions
-  WIDTH=$(sips -g pixelWidth "$img" 2>/dev/null | grep pixelWidth | awk '{print $2}')
-
-  # Only resize if wider than 1200px
-  if [ "$WIDTH" -gt 1200 ] 2>/dev/null; then
-    sips -Z 1200 "$img" >/dev/null 2>&1
+mkdir -p "$doc_dir"
+python3 "$SCRIPT_DIR/build_cache.py" invalidate "$inp" "$doc_dir"
+
+# stage NAME [--input P]... [--output P]... -- COMMAND...: run one step,
+# timed and measured when profiling
+stage() {
+  if [ "$PROFILE" = "1" ]; then
+    python3 "$SCRIPT_DIR/stage_profile.py" run "$REPORT" "$@"
+  else
+    while [ "$1" != "--" ]; do shift; done
+    shift
+    "$@"
   fi
+}
+if [ "$PROFILE" = "1" ]; then
+  REPORT="$(cd "$doc_dir" && pwd)/.profile.json"
+  python3 "$SCRIPT_DIR/stage_profile.py" start "$REPORT" "$inp"
+fi
 
-  # Optimize PNGs with pngquant if available
-  if [[ "$img" == *.png ]] && command -v pngquant &> /dev/null; then
-    pngquant --quality=80-95 --force --ext .png "$img" >/dev/null 2>&1 || true
-  fi
-done
-echo "Images optimized"
+pushd "$doc_dir" >/dev/null
+
+# The whole document is index.md, or with --split .index.full.md until the
+# chapters stage writes the pages (so unchanged pages keep their files)
+doc_md="$(python3 "$SCRIPT_DIR/chapters.py" document-name)"
+
+# DOCX -> GFM with every Lua filter applied; writes index.md and, next to
+# it, the images it references as ./imageN.ext (streamed out of the DOCX).
+# The filtered document is cached by docx/filter/pandoc hash, so unchanged
+# documents skip pandoc entirely.
+stage pandoc --input "$inp" --output . -- \
+  python3 "$SCRIPT_DIR/pandoc_stage.py" ${FROM_CACHE[@]+"${FROM_CACHE[@]}"} --name "$doc_md" "$inp" .
+
+# Markdown post-processing: Word artifact cleanup, heading normalization,
+# callouts (GitHub alerts -> admonitions), table structure fixes,
+# HTML -> pipe tables, list continuity and spacing.
+# All stages run in one process over a single read/write of index.md;
+# see postprocess.py for the stage order. The sed-style substitutions are
+# declared in rules/base.yml and rules/products/*.yml.
+stage postprocess --input "$doc_md" --output "$doc_md" -- \
+  python3 "$SCRIPT_DIR/postprocess.py" "$doc_md"
+
+# With SPLIT_CHAPTERS=1, cut the document into index.md and one page per
+# chapter, writing only the pages that changed; otherwise drop the pages of
+# an earlier split
+stage chapters --input "$doc_md" --output . -- \
+  python3 "$SCRIPT_DIR/chapters.py" update .
+
+# Search index entries of this manual's pages, merged into the site's
+# search_index.json later (see search_index.py)
+stage search --input . -- python3 "$SCRIPT_DIR/search_index.py" build .
+
+# Optimize images for web and print (max 1200px, PNGs quantized); runs in
+# parallel and reuses results cached by image hash (see image_stage.py)
+echo "Optimizing images..."
+stage images --input . --output . -- python3 "$SCRIPT_DIR/image_stage.py" .
 
 popd >/dev/null
+python3 "$SCRIPT_DIR/build_cache.py" record "$inp" "$doc_dir"
+if [ "$PROFILE" = "1" ]; then
+  python3 "$SCRIPT_DIR/stage_profile.py" finish "$REPORT"
+fi
 echo "✅ Wrote: ${doc_dir}/index.md (images in same folder)"
\ No newline at end of file
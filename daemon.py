@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""Conversion daemon: warm workers behind a loopback job API.
+
+Every convert-single.sh run starts several Python processes, and each one
+imports the post-processing scripts and compiles the rules again before
+doing any work. The daemon keeps a pool of worker processes that have
+already imported pandoc_stage.py, postprocess.py (stages and rules compiled)
+and image_stage.py, and converts each job in one of them, running the
+same steps as convert-single.sh:
+
+    build manifest check -> pandoc (cached) -> post-processing -> chapters
+    -> search index -> images -> asset store -> build manifest
+
+(the chapters step splits manuals only if the daemon was started with
+SPLIT_CHAPTERS=1; see chapters.py).
+
+Jobs are accepted over HTTP on 127.0.0.1 only:
+
+    POST /jobs      {"source": "docx manuals/GT+ UM_ENG_2025 09 11.docx",
+                     "force": false, "from_cache": false, "wait": false}
+    GET  /jobs      all jobs, newest last
+    GET  /jobs/<id> one job
+    GET  /health
+
+A job reports its status (queued, running, ok, skipped, failed), the
+output folder, index.md and images it wrote, the worker's log (everything
+written to stdout and stderr during the job, by pandoc and the other tools
+too) and the seconds spent queued and in each step. With "wait": true the request
+returns once the job has finished.
+
+At most --queue jobs wait at a time (further requests get 503) and
+--workers run at once. Jobs for the same manual run one after another, in
+the order they were submitted, so a folder under docs/manuals is only ever
+written by one worker; interning images into the shared asset store is
+serialized between workers with a lock file. The daemon expects to be the
+only writer of OUT_DIR while it runs.
+
+When a filter, stage, rule or tool version changes (see build_cache.py),
+the next job starts a fresh worker pool, so workers never convert with
+stale rules.
+
+    daemon.py serve [--port 8765] [--workers N] [--queue 64]
+    daemon.py submit [--port 8765] [--force] [--from-cache] <input.docx>...
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import fcntl
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import build_cache
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+LOCK_NAME = ".daemon.lock"
+# Finished jobs kept for GET /jobs
+HISTORY = 500
+
+
+# Worker side ---------------------------------------------------------------
+
+def _warm_up() -> None:
+    """Pool initializer: import the stages once per worker process."""
+    import image_stage  # noqa: F401
+    import pandoc_stage  # noqa: F401
+    import postprocess  # noqa: F401
+    import search_index  # noqa: F401
+
+
+@contextlib.contextmanager
+def _locked(path: Path):
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def _job_output(log: io.StringIO):
+    """Send file descriptors 1 and 2 of this worker to `log` for one job.
+
+    pandoc, pngquant and the other tools write straight to the inherited
+    descriptors, which contextlib.redirect_stdout does not reach; a worker
+    runs one job at a time, so the descriptors can be swapped for the job.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = (os.dup(1), os.dup(2))
+    with tempfile.TemporaryFile() as capture:
+        os.dup2(capture.fileno(), 1)
+        os.dup2(capture.fileno(), 2)
+        try:
+            with open(1, "w", encoding="utf-8", buffering=1, closefd=False) as out, \
+                    contextlib.redirect_stdout(out):
+                yield
+        finally:
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+            capture.seek(0)
+            log.write(capture.read().decode("utf-8", errors="replace"))
+
+
+def convert(source: str, out_dir: str, force: bool, from_cache: bool,
+            image_jobs: int) -> dict:
+    """Convert one manual in this process, as convert-single.sh does."""
+    import asset_store
+    import chapters
+    import image_stage
+    import pandoc_stage
+    import postprocess
+    import search_index
+    from stage_profile import Timer
+
+    source_path = Path(source)
+    manual_dir = Path(out_dir) / source_path.stem
+    result = {"status": "failed", "timing": {}, "images": [], "log": ""}
+    log = io.StringIO()
+    try:
+        with _job_output(log):
+            if not force and build_cache.check(source_path, manual_dir)[0]:
+                print(f"⏭  Up to date: {manual_dir / 'index.md'}")
+                result["status"] = "skipped"
+                return result
+            manual_dir.mkdir(parents=True, exist_ok=True)
+            build_cache.invalidate(manual_dir)
+
+            with Timer() as timer:
+                hit = pandoc_stage.convert(source_path, manual_dir, from_cache=from_cache,
+                                           name=chapters.document_name())
+            result["timing"]["pandoc"] = timer.wall_s
+            print("  Pandoc: reused cached document" if hit else "  Pandoc: converted and cached")
+
+            index = manual_dir / chapters.document_name()
+            with Timer() as timer:
+                text = postprocess.run_stages(index.read_text(encoding="utf-8"))
+                index.write_text(text, encoding="utf-8")
+            result["timing"]["postprocess"] = timer.wall_s
+            print(f"Post-processed {index} ({len(postprocess.STAGES)} stages)")
+            chapters.update(manual_dir)
+            with Timer() as timer:
+                if search_index.build(manual_dir) is not None:
+                    print("Search index built")
+            result["timing"]["search"] = timer.wall_s
+
+            with Timer() as timer:
+                counts = image_stage.optimize_folder(manual_dir, image_jobs)
+                summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+                print(f"Images optimized ({summary or 'none found'})")
+                if counts and os.environ.get("ASSET_STORE") != "0":
+                    store = asset_store.store_root(manual_dir)
+                    store.mkdir(parents=True, exist_ok=True)
+                    with _locked(store.parent / LOCK_NAME):
+                        interned = asset_store.intern_folder(manual_dir, store)
+                    print(f"Asset store: {asset_store.summary(interned)}")
+            result["timing"]["images"] = timer.wall_s
+
+            build_cache.record(source_path, manual_dir)
+            result["images"] = [path.name for path in image_stage.find_images(manual_dir)]
+            print(f"✅ Wrote: {index}")
+        result["status"] = "ok"
+    except pandoc_stage.CacheMiss as exc:
+        log.write(f"❌ {exc}\n")
+    except subprocess.CalledProcessError as exc:
+        log.write(f"❌ pandoc failed with exit status {exc.returncode}\n")
+    except Exception:
+        log.write(traceback.format_exc())
+    finally:
+        result["log"] = log.getvalue()
+    return result
+
+
+# Daemon side ---------------------------------------------------------------
+
+@dataclass
+class DaemonJob:
+    id: str
+    source: str
+    force: bool = False
+    from_cache: bool = False
+    status: str = "queued"
+    output: Optional[str] = None
+    index: Optional[str] = None
+    images: List[str] = field(default_factory=list)
+    timing: Dict[str, float] = field(default_factory=dict)
+    log: str = ""
+    submitted: float = field(default_factory=time.monotonic)
+
+    def to_json(self) -> dict:
+        data = asdict(self)
+        del data["submitted"]
+        return data
+
+
+class QueueFull(RuntimeError):
+    """More than --queue jobs are waiting."""
+
+
+class Daemon:
+    """Queue, per-manual ordering and the warm worker pool."""
+
+    def __init__(self, out_dir: Path, workers: int, queue_size: int):
+        self.out_dir = out_dir
+        self.workers = workers
+        self.image_jobs = max(1, (os.cpu_count() or 1) // workers)
+        self.queue: "queue.Queue[DaemonJob]" = queue.Queue(maxsize=queue_size)
+        self.jobs: Dict[str, DaemonJob] = {}
+        self.ids = itertools.count(1)
+        self.guard = threading.Lock()
+        # Per job: the event of the previous job for the same manual, and its own
+        self.order: Dict[str, Tuple[Optional[threading.Event], threading.Event]] = {}
+        self.last: Dict[str, threading.Event] = {}
+        self.done = threading.Condition(self.guard)
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pool_inputs: Optional[Dict[str, str]] = None
+
+    def start(self) -> None:
+        self.current_pool()
+        for n in range(self.workers):
+            threading.Thread(target=self.dispatch, name=f"dispatch-{n}", daemon=True).start()
+
+    def current_pool(self) -> ProcessPoolExecutor:
+        """The worker pool, replaced if the pipeline changed since it started."""
+        with self.guard:
+            build_cache.pipeline_inputs.cache_clear()
+            build_cache.pandoc_inputs.cache_clear()
+            inputs = build_cache.pipeline_inputs()
+            if self.pool is None or inputs != self.pool_inputs:
+                if self.pool is not None:
+                    print("🔄 Pipeline changed: restarting workers")
+                    # Running jobs finish in the old pool
+                    self.pool.shutdown(wait=False)
+                context = multiprocessing.get_context("spawn")
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                initializer=_warm_up)
+                self.pool_inputs = inputs
+            return self.pool
+
+    def submit(self, source: Path, force: bool, from_cache: bool) -> DaemonJob:
+        with self.guard:
+            job = DaemonJob(id=str(next(self.ids)), source=str(source),
+                            force=force or from_cache, from_cache=from_cache)
+            try:
+                self.queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(f"{self.queue.maxsize} jobs already queued") from None
+            self.jobs[job.id] = job
+            # Each job waits for the one submitted before it for the same manual
+            finished = threading.Event()
+            self.order[job.id] = (self.last.get(source.stem), finished)
+            self.last[source.stem] = finished
+            self.prune()
+        return job
+
+    def prune(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job.status not in ("queued", "running")]
+        for job_id in finished[:max(0, len(self.jobs) - HISTORY)]:
+            del self.jobs[job_id]
+
+    def dispatch(self) -> None:
+        while True:
+            job = self.queue.get()
+            with self.guard:
+                previous, finished = self.order.pop(job.id)
+            if previous is not None:
+                previous.wait()
+            try:
+                job.timing["queued"] = round(time.monotonic() - job.submitted, 6)
+                job.status = "running"
+                start = time.monotonic()
+                try:
+                    future = self.current_pool().submit(
+                        convert, job.source, str(self.out_dir), job.force, job.from_cache,
+                        self.image_jobs)
+                    result = future.result()
+                except Exception as exc:  # a worker died, or the pool could not start
+                    result = {"status": "failed", "timing": {}, "images": [], "log": f"❌ {exc}\n"}
+                job.timing.update(result["timing"])
+                job.timing["total"] = round(time.monotonic() - start, 6)
+                job.images = result["images"]
+                job.log = result["log"]
+                if result["status"] != "failed":
+                    manual_dir = self.out_dir / Path(job.source).stem
+                    job.output = str(manual_dir)
+                    job.index = str(manual_dir / "index.md")
+                with self.done:
+                    job.status = result["status"]
+                    self.done.notify_all()
+            finally:
+                finished.set()
+            print(f"{'✅' if job.status != 'failed' else '❌'} Job {job.id} {job.status}: "
+                  f"{Path(job.source).name} ({job.timing['total']:.1f}s)")
+            sys.stdout.flush()
+
+    def wait(self, job: DaemonJob) -> None:
+        with self.done:
+            self.done.wait_for(lambda: job.status not in ("queued", "running"))
+
+
+class Handler(BaseHTTPRequestHandler):
+    daemon: Daemon
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def reply(self, status: int, body: object) -> None:
+        data = json.dumps(body, ensure_ascii=False, indent=2).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path == "/health":
+            self.reply(200, {"status": "ok", "workers": self.daemon.workers,
+                             "queued": self.daemon.queue.qsize()})
+        elif self.path == "/jobs":
+            with self.daemon.guard:
+                self.reply(200, [job.to_json() for job in self.daemon.jobs.values()])
+        elif self.path.startswith("/jobs/"):
+            job = self.daemon.jobs.get(self.path[len("/jobs/"):])
+            if job is None:
+                self.reply(404, {"error": "no such job"})
+            else:
+                self.reply(200, job.to_json())
+        else:
+            self.reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self.path != "/jobs":
+            self.reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            source = Path(body["source"]).resolve()
+        except (KeyError, TypeError, ValueError):
+            self.reply(400, {"error": 'expected JSON with "source"'})
+            return
+        if source.suffix.lower() != ".docx" or not source.is_file():
+            self.reply(400, {"error": f"not a .docx file: {source}"})
+            return
+        try:
+            job = self.daemon.submit(source, bool(body.get("force")), bool(body.get("from_cache")))
+        except QueueFull as exc:
+            self.reply(503, {"error": str(exc)})
+            return
+        if body.get("wait"):
+            self.daemon.wait(job)
+            self.reply(200, job.to_json())
+        else:
+            self.reply(202, job.to_json())
+
+
+def serve(port: int, workers: int, queue_size: int) -> int:
+    out_dir = (Path.cwd() / os.environ.get("OUT_DIR", "docs/manuals")).resolve()
+    daemon = Daemon(out_dir, workers, queue_size)
+    Handler.daemon = daemon
+    server = ThreadingHTTPServer((HOST, port), Handler)
+    daemon.start()
+    print(f"🚀 Conversion daemon on http://{HOST}:{port} with {workers} warm worker(s) "
+          f"-> {out_dir} (Ctrl+C to stop)")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if daemon.pool is not None:
+            daemon.pool.shutdown(wait=True, cancel_futures=True)
+    return 0
+
+
+# Client --------------------------------------------------------------------
+
+def request(port: int, method: str, path: str, body: Optional[dict] = None) -> dict:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(f"http://{HOST}:{port}{path}", data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        return json.loads(exc.read() or b"{}") | {"status": "rejected", "http": exc.code}
+
+
+def submit(port: int, sources: List[Path], force: bool, from_cache: bool) -> int:
+    """Queue every source, then wait for all of them and print their results."""
+    jobs = []
+    for source in sources:
+        job = request(port, "POST", "/jobs", {"source": str(source.resolve()), "force": force,
+                                              "from_cache": from_cache})
+        if job.get("status") == "rejected":
+            print(f"❌ {source}: {job.get('error')}", file=sys.stderr)
+            continue
+        jobs.append(job)
+    failed = len(sources) - len(jobs)
+    for job in jobs:
+        while job["status"] in ("queued", "running"):
+            time.sleep(0.2)
+            job = request(port, "GET", f"/jobs/{job['id']}")
+        timing = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in job["timing"].items())
+        print(f"=== {job['source']} ({job['status']}; {timing})")
+        print(job["log"].rstrip("\n"))
+        failed += job["status"] == "failed"
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("serve", help="run the daemon")
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--workers", type=int,
+                   default=int(os.environ.get("JOBS", 0)) or os.cpu_count() or 1,
+                   help="conversions at once (default: $JOBS or CPU count)")
+    p.add_argument("--queue", type=int, default=64,
+                   help="jobs that may wait before requests are refused (default: 64)")
+    p = commands.add_parser("submit", help="convert manuals through a running daemon")
+    p.add_argument("sources", nargs="+", type=Path)
+    p.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p.add_argument("--force", action="store_true", help="convert even if the inputs are unchanged")
+    p.add_argument("--from-cache", action="store_true",
+                   help="re-run post-processing from cached pandoc output only")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        return serve(args.port, max(1, args.workers), max(1, args.queue))
+    try:
+        return submit(args.port, args.sources, args.force, args.from_cache)
+    except urllib.error.URLError as exc:
+        print(f"❌ No daemon on port {args.port}: {exc.reason}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,256 @@
+-- filter-bundle.lua
+-- Runs every filter from lua-filters.txt in one --lua-filter call.
+--
+-- Passing 25 --lua-filter options makes pandoc walk the whole document once
+-- per filter (twice for filters that return two filter tables). This bundle
+-- loads the same files, in the same order, and fuses neighbouring filters
+-- into one walk where that cannot change the result:
+--
+-- * only filters made of element handlers (Str, Para, Table, ...) fuse;
+--   filters with Pandoc, Blocks, Inlines, Meta or other handlers, or with
+--   `traverse` set, keep a walk of their own;
+-- * pandoc runs all inline handlers of a walk before any block handler, so
+--   a filter with inline handlers never joins a group that already has
+--   block handlers;
+-- * a filter never joins a group in which an earlier filter handles an
+--   element that can contain one of its own element types (a Table handler
+--   followed by a Para handler stays in two walks);
+-- * handlers for the same element type run in filter order on that element;
+--   whatever one returns is passed on to the later filters' handler for the
+--   returned element's type.
+--
+-- Handlers are assumed to work on the element they are given; a handler
+-- that builds new nested elements for a later filter of the same group to
+-- pick up would need its own walk. pandoc_stage.py --verify-bundle compares
+-- the bundled AST with the one from separate filters.
+--
+-- pandoc.utils.stringify is memoized per walk, so filters that stringify
+-- the same element (maintain-list-continuity.lua does so several times) only
+-- build the string once, also across the filters of a fused walk. The memo
+-- is dropped whenever a handler returns a replacement, since the replaced
+-- element, or one it contains, may have been changed in place.
+--
+-- Set LUA_BUNDLE_PLAN=1 to print the walks to stderr.
+--
+-- Loaded with the global BUNDLE_SEPARATE set to true (pandoc-batch.lua does
+-- this unless PIPELINE_LUA_BUNDLE=1), the bundle fuses nothing and leaves
+-- pandoc.utils.stringify alone: every filter gets its own walk, as with one
+-- --lua-filter per file.
+
+local SCRIPT_DIR = (PANDOC_SCRIPT_FILE or ""):match("^(.*)[/\\]") or "."
+local SEPARATE = BUNDLE_SEPARATE == true
+
+local INLINE = {
+  "Str", "Emph", "Underline", "Strong", "Strikeout", "Superscript", "Subscript",
+  "SmallCaps", "Quoted", "Cite", "Code", "Space", "SoftBreak", "LineBreak",
+  "Math", "RawInline", "Link", "Image", "Note", "Span",
+}
+local BLOCK = {
+  "Plain", "Para", "LineBlock", "CodeBlock", "RawBlock", "BlockQuote",
+  "OrderedList", "BulletList", "DefinitionList", "Header", "HorizontalRule",
+  "Table", "Figure", "Div",
+}
+
+-- Element type -> "inline" | "block"
+local KIND = {}
+for _, t in ipairs(INLINE) do KIND[t] = "inline" end
+for _, t in ipairs(BLOCK) do KIND[t] = "block" end
+
+-- What an element can hold: "inlines" or "all" (blocks, and through them anything)
+local CONTAINS = {
+  Emph = "inlines", Underline = "inlines", Strong = "inlines", Strikeout = "inlines",
+  Superscript = "inlines", Subscript = "inlines", SmallCaps = "inlines",
+  Quoted = "inlines", Cite = "inlines", Link = "inlines", Image = "inlines",
+  Span = "inlines", Plain = "inlines", Para = "inlines", LineBlock = "inlines",
+  Header = "inlines",
+  Note = "all", BlockQuote = "all", OrderedList = "all", BulletList = "all",
+  DefinitionList = "all", Table = "all", Figure = "all", Div = "all",
+}
+
+local function can_nest(outer, inner)
+  local holds = CONTAINS[outer]
+  return holds == "all" or (holds == "inlines" and KIND[inner] == "inline")
+end
+
+-- Memoized stringify -------------------------------------------------------
+
+local stringify = pandoc.utils.stringify
+local memo = setmetatable({}, {__mode = "k"})
+
+local function reset_memo()
+  memo = setmetatable({}, {__mode = "k"})
+end
+
+-- Installed before the filters load, since they keep `local S = pandoc.utils.stringify`
+if not SEPARATE then
+  pandoc.utils.stringify = function(x)
+    if type(x) ~= "userdata" then
+      return stringify(x)
+    end
+    local s = memo[x]
+    if s == nil then
+      s = stringify(x)
+      memo[x] = s
+    end
+    return s
+  end
+end
+
+-- Loading ------------------------------------------------------------------
+
+local function filter_paths()
+  local paths = {}
+  for line in io.lines(SCRIPT_DIR .. "/lua-filters.txt") do
+    line = line:match("^%s*(.-)%s*$")
+    if line ~= "" and not line:match("^#") then
+      table.insert(paths, line)
+    end
+  end
+  return paths
+end
+
+-- Load one filter file the way pandoc does: its return value if it has one,
+-- otherwise its global filter functions. Each file gets its own globals.
+local function load_filter_file(name)
+  local path = SCRIPT_DIR .. "/" .. name
+  local env = setmetatable({PANDOC_SCRIPT_FILE = path}, {__index = _G})
+  local chunk = assert(loadfile(path, "t", env))
+  local result = chunk()
+  local filters = {}
+  if result == nil then
+    local filter = {}
+    for key, value in pairs(env) do
+      if type(value) == "function" and key:match("^%u") then
+        filter[key] = value
+      end
+    end
+    if env.traverse then filter.traverse = env.traverse end
+    filters[1] = filter
+  elseif result[1] ~= nil then
+    for i, filter in ipairs(result) do filters[i] = filter end
+  else
+    filters[1] = result
+  end
+  for i, filter in ipairs(filters) do
+    filters[i] = {name = name, filter = filter}
+  end
+  return filters
+end
+
+local function handled_types(filter)
+  local types = {}
+  for key, value in pairs(filter) do
+    if type(value) == "function" then table.insert(types, key) end
+  end
+  table.sort(types)
+  return types
+end
+
+local function fusable(filter)
+  if filter.traverse then return false end
+  for _, t in ipairs(handled_types(filter)) do
+    if KIND[t] == nil then return false end
+  end
+  return true
+end
+
+-- Grouping -----------------------------------------------------------------
+
+local function fits(group, filter)
+  for _, u in ipairs(handled_types(filter)) do
+    if group.has_block and KIND[u] == "inline" then return false end
+    for t in pairs(group.types) do
+      if t ~= u and can_nest(t, u) then return false end
+    end
+  end
+  return true
+end
+
+-- Apply members[1..n] to `el`, each to whatever the previous ones returned.
+-- Returns nil when no handler changed anything.
+local function run_members(members, el)
+  local current = {el}
+  local changed = false
+  for _, member in ipairs(members) do
+    local next_items = {}
+    for _, item in ipairs(current) do
+      local handler = member[item.t]
+      local result = nil
+      if handler then
+        result = handler(item)
+      end
+      if result == nil then
+        table.insert(next_items, item)
+      else
+        changed = true
+        reset_memo()
+        if result.t ~= nil then
+          table.insert(next_items, result)
+        else
+          for _, x in ipairs(result) do table.insert(next_items, x) end
+        end
+      end
+    end
+    current = next_items
+  end
+  if not changed then return nil end
+  if #current == 1 then return current[1] end
+  return current
+end
+
+local function fuse(group)
+  local fused = {}
+  for t in pairs(group.types) do
+    fused[t] = function(el) return run_members(group.members, el) end
+  end
+  return fused
+end
+
+local function build_plan()
+  local plan = {}
+  local group = nil
+  for _, name in ipairs(filter_paths()) do
+    for _, loaded in ipairs(load_filter_file(name)) do
+      local filter = loaded.filter
+      if SEPARATE or not fusable(filter) then
+        group = nil
+        table.insert(plan, {names = {loaded.name}, filter = filter})
+      else
+        if group == nil or not fits(group, filter) then
+          group = {names = {}, members = {}, types = {}, has_block = false}
+          table.insert(plan, group)
+        end
+        table.insert(group.names, loaded.name)
+        table.insert(group.members, filter)
+        for _, t in ipairs(handled_types(filter)) do
+          group.types[t] = true
+          if KIND[t] == "block" then group.has_block = true end
+        end
+      end
+    end
+  end
+  for _, step in ipairs(plan) do
+    if step.members then step.filter = fuse(step) end
+  end
+  return plan
+end
+
+local PLAN = build_plan()
+
+if os.getenv("LUA_BUNDLE_PLAN") == "1" then
+  for i, step in ipairs(PLAN) do
+    io.stderr:write(string.format("walk %2d: %s\n", i, table.concat(step.names, ", ")))
+  end
+end
+
+return {
+  {
+    Pandoc = function(doc)
+      for _, step in ipairs(PLAN) do
+        reset_memo()
+        doc = doc:walk(step.filter)
+      end
+      return doc
+    end,
+  },
+}
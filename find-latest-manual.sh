@@ -10,8 +10,12 @@ fi
 
 PRODUCT_DIR="$1"
 
-# Find .docx files in _EN subdirectory, excluding:
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+
+# Latest .docx in the _EN subdirectory by name (names end in the date),
+# excluding:
 # - Temp files starting with ~$
 # - Files in Archyvas (archive) folders
-# Sort and get the latest (last one)
-ls -1 "${PRODUCT_DIR}/_EN/"*.docx 2>/dev/null | grep -v "~\\\$" | sort | tail -1
+# The listing is cached and only re-read when the folder changed
+# (see source_index.py; source_index.py scan does all products at once)
+python3 "$SCRIPT_DIR/source_index.py" latest "$PRODUCT_DIR"
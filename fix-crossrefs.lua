@@ -1,9 +1,157 @@
 -- fix-crossrefs.lua
+-- Resolves Word cross-references to links to the headings they point at,
+-- and repairs heading levels, from one index of the document.
+--
+-- One pass over the blocks builds the index:
+-- * every heading: its repaired level, its text and the anchor MkDocs
+--   generates for it (toc slugify, with the `_1`, `_2` suffixes of repeated
+--   headings);
+-- * the ids a reference can point at: the heading's identifier (pandoc moves
+--   a Word bookmark in a heading there and points the links at it), bookmark
+--   spans still inside a heading, and bookmarks (Span/Div ids) elsewhere,
+--   which belong to the section they are in.
+-- The ids are keys of one table, so resolving a reference is a lookup
+-- however many headings and references a manual has.
+--
+-- Then every internal link (#id) is resolved:
+-- * to a heading: the link points at the heading's MkDocs anchor; a text
+--   that was Word's field result and means nothing in the published page
+--   ("Error! Reference source not found.", or the heading number "4.2",
+--   which strip-manual-heading-numbers removed from the heading) becomes
+--   the heading's text;
+-- * to a bookmark outside headings: the link stays on the bookmark, which
+--   pandoc writes as <span id="...">; an error text becomes the title of
+--   the bookmark's section;
+-- * to nothing in the document: the link is dropped and its text kept.
+--   Word's error text in REF fields pandoc did not turn into links is left
+--   to the error-reference rule of rules/base.yml.
+--
+-- Heading levels: a heading is at most one level below the heading it is
+-- under (H2 then H4 becomes H2 then H3, and the H4's sub-headings move up
+-- with it). Headings are top-level blocks in pandoc's DOCX output.
+
 local S = pandoc.utils.stringify
-return {
-  Para = function(p)
-    local t = S(p)
-    t = t:gsub("Error! Reference source not found%.", "see the referenced section")
-    if t ~= S(p) then return pandoc.Para({pandoc.Str(t)}) end
+
+local ERROR_TEXT = "Error! Reference source not found."
+
+-- What NFKD + ASCII folding leaves of the accented letters Python-Markdown's
+-- slugify may meet; other non-ASCII characters are dropped, as there
+local FOLD = {}
+for ascii, letters in pairs({
+  a = "àáâãäåāăą", c = "çćĉċč", d = "ď", e = "èéêëēĕėęě", g = "ĝğġģ",
+  h = "ĥ", i = "ìíîïĩīĭį", j = "ĵ", k = "ķ", l = "ĺļľ", n = "ñńņň",
+  o = "òóôõöōŏő", r = "ŕŗř", s = "śŝşš", t = "ţť", u = "ùúûüũūŭůűų",
+  w = "ŵ", y = "ýÿŷ", z = "źżž",
+  A = "ÀÁÂÃÄÅĀĂĄ", C = "ÇĆĈĊČ", D = "Ď", E = "ÈÉÊËĒĔĖĘĚ", G = "ĜĞĠĢ",
+  H = "Ĥ", I = "ÌÍÎÏĨĪĬĮİ", J = "Ĵ", K = "Ķ", L = "ĹĻĽ", N = "ÑŃŅŇ",
+  O = "ÒÓÔÕÖŌŎŐ", R = "ŔŖŘ", S = "ŚŜŞŠ", T = "ŢŤ", U = "ÙÚÛÜŨŪŬŮŰŲ",
+  W = "Ŵ", Y = "ÝŸŶ", Z = "ŹŻŽ",
+}) do
+  for _, code in utf8.codes(letters) do
+    FOLD[utf8.char(code)] = ascii
+  end
+end
+
+-- Python-Markdown's toc slugify (the MkDocs default), as chapters.py has it
+local function slugify(text)
+  text = text:gsub(utf8.charpattern, FOLD):gsub("[\128-\255]", "")
+  text = text:gsub("[^%w%s_%-]", ""):gsub("^%s+", ""):gsub("%s+$", ""):lower()
+  return (text:gsub("[%-%s]+", "-"))
+end
+
+-- The toc extension's de-duplication: id, id_1, id_2...
+local function unique(id, used)
+  while used[id] or id == "" do
+    local base, count = id:match("^(.*)_(%d+)$")
+    if base then
+      id = base .. "_" .. (tonumber(count) + 1)
+    else
+      id = id .. "_1"
+    end
+  end
+  used[id] = true
+  return id
+end
+
+-- Word's field result where the reader expects the target's title
+local function placeholder(text, target)
+  text = text:gsub("^%s+", ""):gsub("%s+$", "")
+  if text == "" or text == ERROR_TEXT then return true end
+  return target.heading and text:match("^%d[%d%.]*%.?$") ~= nil
+end
+
+local function build_index(blocks)
+  local index = {targets = {}, headings = 0}
+  local out = {}
+  local used = {}      -- MkDocs anchors taken
+  local open = {}      -- enclosing headings: {level = original, repaired = level}
+  local section = nil
+
+  local function register(id, target)
+    if id ~= "" and index.targets[id] == nil then
+      index.targets[id] = target
+    end
   end
-}
\ No newline at end of file
+
+  for _, block in ipairs(blocks) do
+    if block.t == "Header" then
+      while #open > 0 and open[#open].level >= block.level do
+        table.remove(open)
+      end
+      local level = block.level
+      if #open > 0 then
+        level = math.min(level, open[#open].repaired + 1)
+      end
+      table.insert(open, {level = block.level, repaired = level})
+      block.level = level
+
+      local title = S(block.content)
+      local heading = {heading = true, title = title, anchor = unique(slugify(title), used)}
+      index.headings = index.headings + 1
+      register(block.identifier, heading)
+      register(heading.anchor, heading)
+      pandoc.walk_block(block, {
+        Span = function(span) register(span.identifier, heading) end,
+      })
+      section = heading
+    else
+      local function bookmark(el)
+        register(el.identifier, {anchor = el.identifier, title = section and section.title})
+      end
+      pandoc.walk_block(block, {Span = bookmark, Div = bookmark})
+    end
+    table.insert(out, block)
+  end
+  return index, out
+end
+
+return {
+  Pandoc = function(doc)
+    local index, blocks = build_index(doc.blocks)
+    local resolved, dropped = 0, 0
+    doc.blocks = blocks
+    doc = doc:walk({
+      Link = function(link)
+        local id = link.target:match("^#(.+)$")
+        if not id then return nil end
+        local target = index.targets[id]
+        if target == nil then
+          dropped = dropped + 1
+          return link.content
+        end
+        resolved = resolved + 1
+        link.target = "#" .. target.anchor
+        if target.title and placeholder(S(link.content), target) then
+          link.content = pandoc.Inlines(pandoc.Str(target.title))
+        end
+        return link
+      end,
+    })
+    if resolved + dropped > 0 then
+      io.stderr:write(string.format(
+        "Cross-references: %d resolved, %d without target (%d headings)\n",
+        resolved, dropped, index.headings))
+    end
+    return doc
+  end,
+}
@@ -9,16 +9,49 @@ import re
 import sys
 from pathlib import Path
 
+import markdown_blocks
+
+LIST_ITEM_RE = re.compile(r'^(\d+)\.\s+(.*)$')
+# How far back an image continues a list, and a section break resets it
+IMAGE_LOOKBACK = 5
+SECTION_LOOKBACK = 10
+
+def is_section_break(line):
+    """Headings, rules and settings windows that may start a new procedure."""
+    lower = line.lower()
+    return (line.startswith('###') or
+            line.startswith('***') or
+            'window:' in lower or
+            'settings' in lower and ('**' in line or 'window' in line))
+
+def section_break_candidates(index):
+    """Every line is_section_break() may accept, found by searching the whole text."""
+    return (index.of_kind(markdown_blocks.HEADING) + index.containing('***') +
+            index.containing('window', ignore_case=True) +
+            index.containing('settings', ignore_case=True))
+
+def continues_numbering(line):
+    """Section breaks that still continue the procedure before them."""
+    return any(keyword in line.lower() for keyword in ['system settings', 'cms reporting', 'sim card'])
+
 def fix_list_continuity(content):
     """Fix numbered list continuity by adjusting start numbers after images."""
-    lines = content.split('\n')
-    result_lines = []
+    index = markdown_blocks.index(content)
+    lines = index.lines
+    result = markdown_blocks.Output()
+    copied = 0
     current_list_num = 0
     in_list = False
 
-    for i, line in enumerate(lines):
+    # Only list items and the lines that end a list change the state below
+    ends = [i for i in index.of_kind(markdown_blocks.HEADING) if lines[i].startswith('##')]
+    ends += [i for i in index.containing('***') if lines[i].startswith('***')]
+    events = sorted(set(index.of_kind(markdown_blocks.LIST_ITEM)).union(ends))
+
+    for i in events:
+        line = lines[i]
         # Check if line is a numbered list item
-        list_match = re.match(r'^(\d+)\.\s+(.*)$', line)
+        list_match = index.kinds[i] == markdown_blocks.LIST_ITEM and LIST_ITEM_RE.match(line)
 
         if list_match:
             list_num = int(list_match.group(1))
@@ -26,38 +59,23 @@ def fix_list_continuity(content):
 
             # If this starts at 1 and we were already in a list, check if we should continue
             if list_num == 1 and in_list:
-                # Look back for images in the last few lines
-                found_image_recently = False
-                for j in range(max(0, i-5), i):
-                    if j < len(lines):
-                        prev_line = lines[j]
-                        if ('<img ' in prev_line or
-                            prev_line.strip().startswith('![') or
-                            prev_line.strip().startswith('<img')):
-                            found_image_recently = True
-                            break
-
-                # Also check for section breaks that should reset numbering
-                found_section_break = False
-                for j in range(max(0, i-10), i):
-                    if j < len(lines):
-                        prev_line = lines[j]
-                        if (prev_line.startswith('###') or
-                            prev_line.startswith('***') or
-                            'window:' in prev_line.lower() or
-                            'settings' in prev_line.lower() and ('**' in prev_line or 'window' in prev_line)):
-                            # Check if this is a new configuration section
-                            if any(keyword in prev_line.lower() for keyword in ['system settings', 'cms reporting', 'sim card']):
-                                found_section_break = False  # These should continue numbering
-                                break
-                            else:
-                                found_section_break = True
-                                break
+                # An image in the last few lines
+                images = index.marks(markdown_blocks.IMAGE)
+                found_image_recently = images.last_before(i) >= max(0, i - IMAGE_LOOKBACK)
+
+                # The earliest section break in the last ten lines decides
+                # whether numbering resets
+                breaks = index.marks('list-section-break', is_section_break,
+                                     section_break_candidates)
+                first_break = breaks.first_from(max(0, i - SECTION_LOOKBACK))
+                found_section_break = first_break < i and not continues_numbering(lines[first_break])
 
                 if found_image_recently and not found_section_break:
                     # Continue the numbering
                     current_list_num += 1
-                    line = f"{current_list_num}. {list_text}"
+                    result.keep(index, copied, i)
+                    result.add(f"{current_list_num}. {list_text}", markdown_blocks.LIST_ITEM)
+                    copied = i + 1
                 else:
                     # Reset numbering for new sections
                     current_list_num = list_num
@@ -74,9 +92,8 @@ def fix_list_continuity(content):
                 in_list = False
                 current_list_num = 0
 
-        result_lines.append(line)
-
-    return '\n'.join(result_lines)
+    result.keep(index, copied, len(lines))
+    return result.text()
 
 def main():
     if len(sys.argv) != 2:
@@ -5,23 +5,26 @@ import re
 import sys
 from pathlib import Path
 
-if len(sys.argv) != 2:
-    print("Usage: fix-relative-images.py <markdown-file>", file=sys.stderr)
-    raise SystemExit(1)
+# Markdown images/links `(image...)` -> `(./image...)`
+MARKDOWN_PATTERN = re.compile(r"(!?\[[^\]]*\]\()(?!(?:\./|https?://|#))(image[^)]+)\)")
 
-path = Path(sys.argv[1])
-text = path.read_text(encoding="utf-8")
+# HTML img src attributes
+HTML_PATTERN = re.compile(r"src=\"(?!(?:\./|https?://))(image[^\"]*)\"")
 
-def _mk_repl(match: re.Match[str]) -> str:
-    prefix, target = match.groups()
-    return f"{prefix}(./{target})"
 
-# Markdown images/links `(image...)` -> `(./image...)`
-markdown_pattern = re.compile(r"(!?\[[^\]]*\]\()(?!(?:\./|https?://|#))(image[^)]+)\)")
-text = markdown_pattern.sub(lambda m: f"{m.group(1)}./{m.group(2)})", text)
+def fix_relative_images(text: str) -> str:
+    """Prefix bare `imageN.ext` references with `./`."""
+    text = MARKDOWN_PATTERN.sub(lambda m: f"{m.group(1)}./{m.group(2)})", text)
+    return HTML_PATTERN.sub(lambda m: f"src=\"./{m.group(1)}\"", text)
+
+
+def main(path: Path) -> None:
+    text = path.read_text(encoding="utf-8")
+    path.write_text(fix_relative_images(text), encoding="utf-8")
 
-# HTML img src attributes
-html_pattern = re.compile(r"src=\"(?!(?:\./|https?://))(image[^\"]*)\"")
-text = html_pattern.sub(lambda m: f"src=\"./{m.group(1)}\"", text)
 
-path.write_text(text, encoding="utf-8")
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: fix-relative-images.py <markdown-file>", file=sys.stderr)
+        raise SystemExit(1)
+    main(Path(sys.argv[1]))
@@ -7,38 +7,34 @@ Adds blank line before tables that immediately follow:
 - Any other content without proper spacing
 """
 import sys
-import re
+
+import markdown_blocks
 
 def fix_table_spacing(content):
     """Add blank line before tables when missing."""
-    lines = content.split('\n')
-    result = []
-    i = 0
-    
-    while i < len(lines):
-        current_line = lines[i]
-        result.append(current_line)
+    index = markdown_blocks.index(content)
+    lines = index.lines
+    result = markdown_blocks.Output()
+    copied = 0
 
-        # Check if next line starts a NEW table (not just any table row)
-        if i < len(lines) - 1:
-            next_line = lines[i + 1]
-            is_table_row = next_line.strip().startswith('|') and '|' in next_line.strip()[1:]
+    # A NEW table starts where a run of table rows does (not at every table row)
+    for block in index.blocks:
+        start = block.start
+        if block.kind != markdown_blocks.TABLE_ROW or start == 0 or '|' not in lines[start].strip()[1:]:
+            continue
 
-            # Only treat as table start if current line is NOT already a table line
-            current_is_table_row = current_line.strip().startswith('|')
-            is_table_start = is_table_row and not current_is_table_row
+        # Check if the line before is non-empty and not a heading
+        before = start - 1
+        current_is_content = index.kinds[before] != markdown_blocks.BLANK and not lines[before].strip().startswith('#')
 
-            if is_table_start:
-                # Check if current line is non-empty and non-blank
-                current_is_content = current_line.strip() and not current_line.strip().startswith('#')
+        # Add blank line if missing
+        if current_is_content:
+            result.keep(index, copied, start)
+            result.add('', markdown_blocks.BLANK)
+            copied = start
 
-                # Add blank line if missing
-                if current_is_content:
-                    result.append('')
-
-        i += 1
-    
-    return '\n'.join(result)
+    result.keep(index, copied, len(lines))
+    return result.text()
 
 if __name__ == '__main__':
     if len(sys.argv) != 2:
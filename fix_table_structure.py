@@ -7,155 +7,140 @@ Problems addressed:
 2. Empty TR rows that create layout problems
 3. Malformed rowspan structures
 4. Convert data cells with headers to proper table headers
+
+Each table is parsed once into the table_model.py object model; the fixes
+below edit its rows and cells, and only tables they change are rebuilt.
+Tables are located by offset in one scan and every pattern is matched
+against a single cell, so the run time is linear in the document size
+(benchmarks/table_repair.py checks this on damaged tables).
 """
 
 import re
 import sys
-from typing import List, Tuple
+from typing import Callable, List, Optional
 
-def fix_table_headers(content: str) -> str:
-    """Convert malformed table headers from td with h1 to proper th elements."""
+from table_model import Cell, Row, Table, rewrite_tables
 
-    # Pattern: <td rowspan="2"><h1><strong>Header</strong></h1>
-    pattern = r'<td(\s+[^>]*)?><h1[^>]*><strong>([^<]+)</strong></h1>'
+# Patterns for the inner HTML of one cell
+H1_STRONG_PATTERN = re.compile(r'<h1[^>]*><strong>([^<]+)</strong></h1>')
+H1_PATTERN = re.compile(r'<h1[^>]*>([^<]+)</h1>')
+H1_HEADER_DATA_PATTERN = re.compile(r'<h1[^>]*>([^<]+)</h1>\s*<p>([^<]*)</p>\s*')
+STRONG_HEADER_DATA_PATTERN = re.compile(r'<strong>([^<]+)</strong>\s*<p>([^<]*)</p>\s*')
+STRONG_HEADER_SPACE_DATA_PATTERN = re.compile(r'<strong>([^<]+)</strong>\s+<p>([^<]*)</p>\s*')
+PLAIN_TEXT_PATTERN = re.compile(r'[^<]+')
+# Whitespace with at least one newline, written so that it cannot backtrack
+MALFORMED_ROWSPAN_PATTERN = re.compile(r'<strong>([^<]+)</strong>[^\S\n]*\n\s*<p>([^<]*)</p>')
+EMPTY_PARAGRAPH_PATTERN = re.compile(r'(<strong>[^<]+</strong>)\s*<p>\s*</p>')
 
-    def replace_header(match):
-        attributes = match.group(1) or ''
-        header_text = match.group(2)
-        # Convert to proper table header
-        return f'<th{attributes}><strong>{header_text}</strong></th>'
+# Corrupted header separators like "Description :==============", anywhere
+SEPARATOR_PATTERN = re.compile(r'(Description|Parameter)\s*:=+\s*')
 
-    return re.sub(pattern, replace_header, content)
 
-def fix_empty_rows(content: str) -> str:
-    """Remove empty table rows that cause layout issues."""
+def header_row(headers: List[str]) -> Row:
+    return Row('thead', [Cell('th', f'<strong>{header}</strong>') for header in headers])
 
-    # Remove completely empty tr tags
-    content = re.sub(r'<tr>\s*</tr>', '', content)
 
-    # Remove tr tags that only contain empty td tags
-    content = re.sub(r'<tr>\s*<td[^>]*>\s*</td>\s*</tr>', '', content)
+def fix_table_headers(table: Table) -> None:
+    """Convert malformed table headers from td with h1 to proper th elements."""
 
-    return content
+    # <td rowspan="2"><h1><strong>Header</strong></h1>... becomes a th
+    for row in table.rows:
+        for cell in row.cells:
+            match = H1_STRONG_PATTERN.match(cell.content) if cell.tag == 'td' else None
+            if match:
+                cell.tag = 'th'
+                cell.content = f'<strong>{match.group(1)}</strong>' + cell.content[match.end():]
+                table.changed = True
+
+def fix_empty_rows(table: Table) -> None:
+    """Remove empty table rows that cause layout issues."""
 
-def fix_malformed_rowspan_tables(content: str) -> str:
+    def is_empty(row: Row) -> bool:
+        if row.attrs:
+            return False
+        # Completely empty tr, or a tr that only holds one empty td
+        return not row.cells or (
+            len(row.cells) == 1 and row.cells[0].tag == 'td' and not row.cells[0].content.strip()
+        )
+
+    rows = [row for row in table.rows if not is_empty(row)]
+    if len(rows) != len(table.rows):
+        table.rows = rows
+        table.changed = True
+
+def fix_malformed_rowspan_tables(table: Table) -> None:
     """Fix tables with problematic rowspan structure."""
 
-    def fix_single_table(table_match):
-        table_content = table_match.group(0)
-
-        # Check for the specific malformed pattern we've seen:
-        # <th rowspan="2">Header</th>\n<p>content</p>\n</td>
-        # OR <td rowspan="2"><strong>Header</strong>\n<p>content</p></td>
-        malformed_pattern = r'<t[dh] rowspan="2"><strong>([^<]+)</strong>\s*\n\s*<p>([^<]*)</p></t[dh]>'
-
-        if re.search(malformed_pattern, table_content):
-            print("Fixing malformed table with rowspan headers and mismatched tags")
-
-            # Extract the headers and first row content
-            headers = []
-            first_row_content = []
-
-            for match in re.finditer(malformed_pattern, table_content):
-                headers.append(match.group(1))
-                first_row_content.append(match.group(2))
-
-            if len(headers) >= 2:
-                # Get table structure parts
-                table_start = re.search(r'<table[^>]*>.*?<tbody>', table_content, re.DOTALL)
-                if table_start:
-                    table_prefix = table_start.group(0)
-
-                    # Create proper table structure
-                    new_content = table_prefix + '\n'
-
-                    # Add header row
-                    new_content += '<tr>\n'
-                    for header in headers:
-                        new_content += f'<th><strong>{header}</strong></th>\n'
-                    new_content += '</tr>\n'
-
-                    # Add first data row
-                    new_content += '<tr>\n'
-                    for content in first_row_content:
-                        new_content += f'<td><p>{content}</p></td>\n'
-                    new_content += '</tr>\n'
-
-                    # Remove the malformed first row and empty row
-                    remaining_content = table_content
-                    # Remove the malformed row
-                    remaining_content = re.sub(r'<tr>\s*' + malformed_pattern + r'\s*' + malformed_pattern + r'\s*</tr>', '', remaining_content, flags=re.DOTALL)
-                    # Remove empty rows
-                    remaining_content = re.sub(r'<tr>\s*</tr>', '', remaining_content)
-
-                    # Get the rest of the table after removing malformed parts
-                    tbody_pattern = r'<tbody>.*?</tbody>'
-                    tbody_match = re.search(tbody_pattern, remaining_content, re.DOTALL)
-                    if tbody_match:
-                        tbody_content = tbody_match.group(0)
-                        # Extract just the rows, excluding tbody tags
-                        rows_pattern = r'<tbody>\s*(.*?)\s*</tbody>'
-                        rows_match = re.search(rows_pattern, tbody_content, re.DOTALL)
-                        if rows_match:
-                            remaining_rows = rows_match.group(1).strip()
-                            if remaining_rows:
-                                new_content += remaining_rows + '\n'
-
-                    new_content += '</tbody>\n</table>'
-                    return new_content
-
-        return table_content
-
-    # Apply fix to each table
-    return re.sub(r'<table[^>]*>.*?</table>', fix_single_table, content, flags=re.DOTALL)
-
-def fix_specifications_table(content: str) -> str:
+    # Check for the specific malformed pattern we've seen:
+    # <th rowspan="2">Header</th>\n<p>content</p>\n</td>
+    # OR <td rowspan="2"><strong>Header</strong>\n<p>content</p></td>
+    def malformed(cell: Cell) -> Optional[re.Match]:
+        if cell.rowspan != 2:
+            return None
+        return MALFORMED_ROWSPAN_PATTERN.fullmatch(cell.content)
+
+    matches = [m for row in table.rows for m in map(malformed, row.cells) if m]
+    if not matches:
+        return
+    print("Fixing malformed table with rowspan headers and mismatched tags")
+    if len(matches) < 2 or 'tbody' not in table.sections:
+        return
+
+    # Keep what comes before the body, then the header row and first data
+    # row built from the malformed cells, then the rest of the body without
+    # the malformed row itself and empty rows
+    before = [row for row in table.rows if row.section not in ('tbody', 'tfoot')]
+    headers = Row('tbody', [Cell('th', f'<strong>{m.group(1)}</strong>') for m in matches])
+    first_row = Row('tbody', [Cell('td', f'<p>{m.group(2)}</p>') for m in matches])
+    rest = [
+        row for row in table.section_rows('tbody')
+        if (row.cells or row.attrs)
+        and not (len(row.cells) == 2 and all(malformed(cell) for cell in row.cells))
+    ]
+    table.rows = before + [headers, first_row] + rest
+    table.changed = True
+
+def fix_specifications_table(table: Table) -> None:
     """Fix the malformed Specifications table structure.
 
     Detects tables with rowspan=2 headers that contain both header text and data,
     and restructures them into proper header row + data rows.
     """
 
+    body = table.section_rows('tbody')
+    if not body:
+        return
+    first = body[0]
+    cells = first.cells
+    if len(cells) != 2 or any(cell.tag != 'td' or cell.rowspan != 2 for cell in cells):
+        return
+
+    def replace_first_row(headers: List[str], data: List[str]) -> None:
+        index = table.rows.index(first)
+        table.rows[index:index + 1] = [
+            header_row(headers),
+            Row('tbody', [Cell('td', value) for value in data]),
+        ]
+        table.changed = True
+
     # Pattern 0: Both cells have <h1>Header</h1><p>Data</p> (SP3 manual)
     # This appears when Pandoc outputs H1 tags in table cells
-    pattern0 = r'<tbody>\s*<tr>\s*<td rowspan="2"><h1[^>]*>([^<]+)</h1>\s*<p>([^<]*)</p>\s*</td>\s*<td rowspan="2"><h1[^>]*>([^<]+)</h1>\s*<p>([^<]*)</p>\s*</td>\s*</tr>'
-
     # Pattern 1: Both cells have <strong>Header</strong><p>Data</p>
     # This appears in GET manual's "Purpose of terminals" table
-    pattern1 = r'<tbody>\s*<tr>\s*<td rowspan="2"><strong>([^<]+)</strong>\s*<p>([^<]*)</p>\s*</td>\s*<td rowspan="2"><strong>([^<]+)</strong>\s*<p>([^<]*)</p>\s*</td>\s*</tr>'
-
-    def fix_both_cells(match):
-        header1 = match.group(1)  # "Terminal"
-        data1 = match.group(2)     # "+12 VDC"
-        header2 = match.group(3)   # "Description"
-        data2 = match.group(4)     # "+10 V/+18 V DC power supply"
-
-        # Build proper table structure with thead and tbody
-        result = '<thead>\n<tr>\n'
-        result += f'<th><strong>{header1}</strong></th>\n'
-        result += f'<th><strong>{header2}</strong></th>\n'
-        result += '</tr>\n</thead>\n<tbody>\n<tr>\n'
-        result += f'<td>{data1}</td>\n'
-        result += f'<td>{data2}</td>\n'
-        result += '</tr>'
-        return result
-
-    # Apply pattern 0 first (H1 tags - SP3 manual)
-    content = re.sub(pattern0, fix_both_cells, content, flags=re.DOTALL)
-
-    # Apply pattern 1 (strong tags - GET manual)
-    content = re.sub(pattern1, fix_both_cells, content, flags=re.DOTALL)
+    for pattern in (H1_HEADER_DATA_PATTERN, STRONG_HEADER_DATA_PATTERN):
+        both = [pattern.fullmatch(cell.content) for cell in cells]
+        if all(both):
+            replace_first_row([m.group(1) for m in both], [m.group(2) for m in both])
+            return
 
     # Pattern 2: <td rowspan="2"><strong>Header</strong>\n\n<p>Data</p></td>
+    # followed by <td rowspan="2">DescriptionData</td>
     # This appears in GET manual's Specifications table
-    # Use DOTALL to match across newlines
-    pattern2 = r'<tbody>\s*<tr>\s*<td rowspan="2"><strong>([^<]+)</strong>\s+<p>([^<]*)</p>\s*</td>\s*<td rowspan="2">([^<]+)</td>\s*</tr>'
-
-    def fix_single_table(match):
-        # Extract the parts
-        header1 = match.group(1)  # "Parameter"
-        data1 = match.group(2)     # "Network connectivity"
-        header_and_data2 = match.group(3)  # "DescriptionLTE / Ethernet"
+    first_match = STRONG_HEADER_SPACE_DATA_PATTERN.fullmatch(cells[0].content)
+    if first_match and PLAIN_TEXT_PATTERN.fullmatch(cells[1].content):
+        header1 = first_match.group(1)  # "Parameter"
+        data1 = first_match.group(2)     # "Network connectivity"
+        header_and_data2 = cells[1].content  # "DescriptionLTE / Ethernet"
 
         # Split the combined header+data (e.g., "DescriptionLTE / Ethernet")
         # Look for pattern like "Description" followed by data
@@ -168,65 +153,68 @@ def fix_specifications_table(content: str) -> str:
             header2 = "Description"
             data2 = header_and_data2
 
-        # Build proper table structure with thead and tbody
-        result = '<thead>\n<tr>\n'
-        result += f'<th><strong>{header1}</strong></th>\n'
-        result += f'<th><strong>{header2}</strong></th>\n'
-        result += '</tr>\n</thead>\n<tbody>\n<tr>\n'
-        result += f'<td><p>{data1}</p></td>\n'
-        result += f'<td>{data2}</td>\n'
-        result += '</tr>'
-
-        return result
+        replace_first_row([header1, header2], [f'<p>{data1}</p>', data2])
 
-    # Apply pattern 2
-    content = re.sub(pattern2, fix_single_table, content, flags=re.DOTALL)
-
-    return content
-
-def clean_table_content(content: str) -> str:
+def clean_table_content(table: Table) -> None:
     """Clean up table cell content."""
 
-    # Remove h1 tags from table cells with <strong> wrapper
-    content = re.sub(r'<(td|th)([^>]*)><h1[^>]*><strong>([^<]+)</strong></h1>(.*?)</\1>',
-                     r'<\1\2><strong>\3</strong>\4</\1>', content, flags=re.DOTALL)
+    for row in table.rows:
+        for cell in row.cells:
+            content = cell.content
 
-    # Remove h1 tags from table cells WITHOUT <strong> wrapper (GET manual case)
-    content = re.sub(r'<(td|th)([^>]*)><h1[^>]*>([^<]+)</h1>',
-                     r'<\1\2><strong>\3</strong>', content, flags=re.DOTALL)
+            # Remove h1 tags from table cells, with or without <strong> wrapper
+            match = H1_STRONG_PATTERN.match(content) or H1_PATTERN.match(content)
+            if match:
+                content = f'<strong>{match.group(1)}</strong>' + content[match.end():]
 
-    # Clean up corrupted header separators like "Description :=============="
-    content = re.sub(r'(Description|Parameter)\s*:=+\s*', r'\1', content)
+            # Clean up corrupted header separators like "Description :=============="
+            content = SEPARATOR_PATTERN.sub(r'\1', content)
 
-    # Fix malformed rowspan table headers - convert td with h1 to th
-    content = re.sub(r'<td(\s+rowspan="[^"]+")><h1[^>]*>([^<]+)</h1>',
-                     r'<th\1><strong>\2</strong></th>', content)
+            # Clean up empty paragraphs in table cells
+            match = EMPTY_PARAGRAPH_PATTERN.match(content)
+            if match:
+                content = match.group(1) + content[match.end():]
 
-    # Clean up empty paragraphs in table cells
-    content = re.sub(r'<(td|th)([^>]*)><strong>([^<]+)</strong>\s*<p>\s*</p>',
-                     r'<\1\2><strong>\3</strong>', content)
+            if content != cell.content:
+                cell.content = content
+                table.changed = True
 
-    return content
+def clean_text(text: str) -> str:
+    """Clean up corrupted header separators outside tables."""
 
-def fix_table_structure(content: str) -> str:
-    """Apply all table structure fixes."""
+    return SEPARATOR_PATTERN.sub(r'\1', text)
 
-    print("Fixing table structure issues...")
+def repair_table(table: Table) -> Table:
+    """Apply every structure fix to one parsed table."""
 
     # Step 1: Fix Specifications table structure (GET manual)
-    content = fix_specifications_table(content)
+    fix_specifications_table(table)
 
     # Step 2: Fix table headers
-    content = fix_table_headers(content)
+    fix_table_headers(table)
 
     # Step 3: Remove empty rows
-    content = fix_empty_rows(content)
+    fix_empty_rows(table)
 
     # Step 4: Fix malformed rowspan tables
-    content = fix_malformed_rowspan_tables(content)
+    fix_malformed_rowspan_tables(table)
 
     # Step 5: Clean table content
-    content = clean_table_content(content)
+    clean_table_content(table)
+
+    return table
+
+def fix_table_structure(content: str,
+                        serialize: Callable[[Table], str] = Table.to_html) -> str:
+    """Apply all table structure fixes.
+
+    Each repaired table is written with `serialize`; html-tables-to-pipes.py
+    passes its pipe table writer so a table is parsed only once.
+    """
+
+    print("Fixing table structure issues...")
+
+    content = rewrite_tables(content, lambda table: serialize(repair_table(table)), clean_text)
 
     print("Table structure fixes completed")
     return content
@@ -0,0 +1,22 @@
+-- flatten-media-paths.lua
+-- Point every image at the manual folder: media/image1.png -> ./image1.png
+--
+-- pandoc_stage.py copies the referenced images out of the DOCX package
+-- straight into the manual folder under these names, so nothing later has
+-- to move files or rewrite links. Runs first, so the filters that build
+-- <img> HTML (convert-image-sizes.lua, move-first-image-to-description.lua)
+-- already see the final path.
+
+function Image(img)
+  local src = img.src
+  -- Leave URLs, data: URIs, absolute paths and anchors alone
+  if src:match("^%a[%w+.-]*:") or src:match("^/") or src:match("^#") then
+    return nil
+  end
+  local name = src:match("([^/\\]+)$")
+  if name == nil or src == "./" .. name then
+    return nil
+  end
+  img.src = "./" .. name
+  return img
+end
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Optimize the images of a converted manual, in parallel and cached.
+
+For every *.png, *.jpg and *.jpeg in a manual folder:
+
+* images wider than 1200 px are scaled down so that neither side exceeds
+  1200 px (what `sips -Z 1200` did), JPEGs saved at 85% quality;
+* PNGs are quantized with pngquant (--quality=80-95) when it is installed,
+  otherwise saved with Pillow's lossless optimizer.
+
+Images are processed by a pool of worker processes (IMAGE_JOBS, default:
+CPU count). Each result is stored in .cache/images/ under the hash of the
+input bytes and the settings (size limit, qualities, Pillow and pngquant
+versions), so a re-run only processes new or changed images and copies the
+rest from the cache. Identical images in one folder are optimized once.
+
+The optimized images are then hardlinked into the shared asset store (see
+asset_store.py), so an image that several manuals contain is stored once;
+ASSET_STORE=0 keeps plain copies.
+
+    image_stage.py <manual-dir>
+
+Needs Pillow (pip install Pillow); without it images are only quantized.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import asset_store
+import build_cache
+import stage_profile
+
+try:
+    from PIL import Image
+except ImportError:  # resizing is skipped, see main()
+    Image = None
+
+IMAGE_CACHE = build_cache.CACHE_ROOT / "images"
+IMAGE_PATTERNS = ("*.png", "*.jpg", "*.jpeg")
+
+MAX_SIZE = 1200
+PNG_QUALITY = "80-95"
+JPEG_QUALITY = 85
+
+
+def settings() -> Dict[str, str]:
+    """Everything besides the input bytes that shapes an optimized image."""
+    return {
+        "max_size": str(MAX_SIZE),
+        "png_quality": PNG_QUALITY,
+        "jpeg_quality": str(JPEG_QUALITY),
+        "pillow": build_cache.pillow_version(),
+        "pngquant": build_cache.tool_version("pngquant"),
+    }
+
+
+def cache_path(data: bytes, suffix: str, config: Dict[str, str]) -> Path:
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    key = digest.hexdigest()
+    return IMAGE_CACHE / key[:2] / f"{key}{suffix}"
+
+
+def store(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, scratch = tempfile.mkstemp(prefix=".tmp-", dir=path.parent)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(scratch, path)
+
+
+def resize(src: Path, dst: Path) -> bool:
+    """Write `src` scaled down to MAX_SIZE to `dst`; False if it is small enough."""
+    if Image is None:
+        return False
+    with Image.open(src) as img:
+        width, height = img.size
+        if width <= MAX_SIZE:
+            return False
+        scale = MAX_SIZE / max(width, height)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        resized = img.resize(size, Image.LANCZOS)
+        if dst.suffix == ".png":
+            resized.save(dst, "PNG", optimize=True)
+        else:
+            if resized.mode not in ("RGB", "L"):
+                resized = resized.convert("RGB")
+            resized.save(dst, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return True
+
+
+def quantize(src: Path, dst: Path, config: Dict[str, str]) -> bool:
+    """Write an optimized `src` PNG to `dst`; False if nothing smaller came out."""
+    if config["pngquant"] != "missing":
+        proc = subprocess.run(
+            ["pngquant", f"--quality={PNG_QUALITY}", "--force", "--output", str(dst), str(src)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        # Exit status 99: the quality target could not be met; keep the original
+        return proc.returncode == 0 and dst.is_file()
+    if Image is None:
+        return False
+    with Image.open(src) as img:
+        img.save(dst, "PNG", optimize=True)
+    return dst.stat().st_size < src.stat().st_size
+
+
+def optimize(path: Path, config: Dict[str, str]) -> Tuple[str, str]:
+    """Optimize one image in place; returns (name, what happened)."""
+    data = path.read_bytes()
+    suffix = path.suffix.lower()
+    cached = cache_path(data, suffix, config)
+    if cached.is_file():
+        status = "cached"
+    else:
+        with tempfile.TemporaryDirectory(prefix="image-") as tmp:
+            current = Path(tmp) / f"input{suffix}"
+            current.write_bytes(data)
+            actions = []
+            resized = Path(tmp) / f"resized{suffix}"
+            if resize(current, resized):
+                current = resized
+                actions.append("resized")
+            if suffix == ".png":
+                quantized = Path(tmp) / f"quantized{suffix}"
+                if quantize(current, quantized, config):
+                    current = quantized
+                    actions.append("quantized")
+            status = "+".join(actions) or "unchanged"
+            result = current.read_bytes()
+            store(cached, result)
+            # An optimized image maps to itself, so running the stage over
+            # its own output never quantizes twice
+            store(cache_path(result, suffix, config), result)
+    result = cached.read_bytes()
+    if result != data:
+        scratch = path.with_name(f".{path.name}.tmp")
+        scratch.write_bytes(result)
+        os.replace(scratch, path)
+    return path.name, status
+
+
+def find_images(folder: Path) -> List[Path]:
+    images = set()
+    for pattern in IMAGE_PATTERNS:
+        images.update(p for p in folder.glob(pattern) if p.is_file())
+    return sorted(images)
+
+
+def optimize_folder(folder: Path, jobs: int) -> Dict[str, int]:
+    """Optimize every image in `folder`; returns how many ended up in each status."""
+    config = settings()
+    images = find_images(folder)
+    counts: Dict[str, int] = {}
+    if not images:
+        return counts
+    # Identical images are optimized once; the copies are then cache hits
+    unique: Dict[Tuple[str, str], Path] = {}
+    for path in images:
+        unique.setdefault((asset_store.digest_file(path), path.suffix.lower()), path)
+    first = list(unique.values())
+    if jobs <= 1 or len(first) == 1:
+        results = [optimize(path, config) for path in first]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(first))) as pool:
+            results = list(pool.map(optimize, first, [config] * len(first)))
+    chosen = set(first)
+    results += [optimize(path, config) for path in images if path not in chosen]
+    for _name, status in results:
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) != 1:
+        print("Usage: image_stage.py <manual-dir>", file=sys.stderr)
+        return 2
+    if Image is None:
+        print("⚠️  Pillow not installed (pip install Pillow): images are not resized", file=sys.stderr)
+    jobs = int(os.environ.get("IMAGE_JOBS", 0)) or os.cpu_count() or 1
+    folder = Path(argv[0])
+    counts = optimize_folder(folder, jobs)
+    summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+    print(f"Images optimized ({summary or 'none found'})")
+    stage_profile.record("images", counts={
+        "images_total": sum(counts.values()),
+        "images_optimized": sum(n for status, n in counts.items()
+                                if status not in ("cached", "unchanged")),
+        "images_cached": counts.get("cached", 0),
+    })
+    if counts and os.environ.get("ASSET_STORE") != "0":
+        store = asset_store.store_root(folder)
+        print(f"Asset store: {asset_store.summary(asset_store.intern_folder(folder, store))}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""Classify the lines of a Markdown document once, for the line-based stages.
+
+fix-list-continuity.py, fix-table-spacing.py, reduce-spacing.py and
+normalize-callouts.py all walk index.md line by line. Instead of each
+splitting the text and re-testing every line with its own regexes, they
+query a `BlockIndex`:
+
+* `kinds[i]`: what line i is (BLANK, HEADING, ADMONITION, QUOTE, TABLE_ROW,
+  LIST_ITEM, IMAGE, HTML or TEXT), decided in one pass with plain string
+  tests and one regex for list markers;
+* `offsets[i]`: where line i starts in the text;
+* `blocks`: maximal runs of lines of the same kind, and `block_of[i]`;
+* `marks(name)`: for a kind (IMAGE also counts `<img ` inside table rows
+  and list items) or a stage's own line predicate, the
+  nearest matching line before or from any line in O(1), so a stage that
+  looks back over a window of lines does not rescan it.
+
+`index(text)` keeps the indexes of the last few documents. A stage that
+writes its result through `Output` registers the index of that result, in
+which only the lines it added were classified, so the chain of line-based
+stages classifies a document once; a stage that leaves the text unchanged
+passes its index on as well.
+
+    markdown_blocks.py <markdown-file>     # Print the blocks
+"""
+
+from __future__ import annotations
+
+import functools
+import itertools
+import re
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+BLANK = "blank"
+HEADING = "heading"
+ADMONITION = "admonition"
+QUOTE = "quote"
+TABLE_ROW = "table-row"
+LIST_ITEM = "list-item"
+IMAGE = "image"
+HTML = "html"
+TEXT = "text"
+
+# "1. ", "2) ", "- ", "* ", "+ " (indented too); "***" and "**bold**" are not items
+LIST_MARKER = re.compile(r"\s*(?:\d+[.)]|[-*+])(?:\s|$)")
+# Kind by the first character after the indentation; MAYBE_LIST needs LIST_MARKER
+MAYBE_LIST = "maybe-list"
+FIRST_CHAR = {">": QUOTE, "|": TABLE_ROW, "<": HTML}
+FIRST_CHAR.update(dict.fromkeys("0123456789-*+", MAYBE_LIST))
+
+
+def classify(lines: List[str]) -> List[str]:
+    """Kind of every line, from plain string tests (one regex for list markers)."""
+    kinds: List[str] = []
+    append = kinds.append
+    first_char = FIRST_CHAR.get
+    for line in lines:
+        content = line.lstrip()
+        if not content:
+            append(BLANK)
+        elif line[0] == "#":
+            append(HEADING)
+        elif line.startswith("!!! "):
+            append(ADMONITION)
+        else:
+            kind = first_char(content[0])
+            if kind is None:
+                append(IMAGE if content.startswith("![") else TEXT)
+            elif kind is MAYBE_LIST:
+                append(LIST_ITEM if LIST_MARKER.match(line) else TEXT)
+            elif kind is HTML and content.startswith("<img"):
+                append(IMAGE)
+            else:
+                append(kind)
+    return kinds
+
+
+@dataclass
+class Block:
+    kind: str
+    start: int
+    end: int  # exclusive
+
+
+class Marks:
+    """Matching lines, with O(1) nearest-match lookups."""
+
+    def __init__(self, positions: List[int], count: int):
+        self.positions = positions
+        # previous[i]: last match before i; following[i]: first match at or after i
+        self.previous = [-1] * (count + 1)
+        self.following = [count] * (count + 1)
+        start = 0
+        for position in positions:
+            self.following[start:position + 1] = [position] * (position + 1 - start)
+            start = position + 1
+        for position, end in zip(positions, positions[1:] + [count]):
+            self.previous[position + 1:end + 1] = [position] * (end - position)
+
+    def last_before(self, i: int) -> int:
+        """Last matching line before line i, or -1."""
+        return self.previous[i]
+
+    def first_from(self, i: int) -> int:
+        """First matching line at or after line i, or the line count."""
+        return self.following[i]
+
+
+class BlockIndex:
+    """Kind of every line of a document; offsets, blocks and marks on first use.
+
+    The lines are shared with every stage that gets the same index, so
+    stages build new lists instead of changing them.
+    """
+
+    def __init__(self, lines: List[str], text: Optional[str] = None,
+                 kinds: Optional[List[str]] = None):
+        self.lines = lines
+        self.kinds = classify(lines) if kinds is None else kinds
+        self._text = text
+        self._positions: Dict[str, List[int]] = {}
+        self._marks: Dict[str, Marks] = {}
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "\n".join(self.lines)
+        return self._text
+
+    @functools.cached_property
+    def offsets(self) -> List[int]:
+        """Where each line starts in the text."""
+        return list(itertools.accumulate((len(line) + 1 for line in self.lines[:-1]), initial=0))
+
+    @functools.cached_property
+    def blocks(self) -> List[Block]:
+        """Maximal runs of lines of the same kind."""
+        kinds = self.kinds
+        starts = [0] + [i for i in range(1, len(kinds)) if kinds[i] != kinds[i - 1]]
+        ends = starts[1:] + [len(kinds)]
+        return [Block(kinds[start], start, end) for start, end in zip(starts, ends) if start < end]
+
+    @functools.cached_property
+    def block_of(self) -> List[int]:
+        """Index into `blocks` of each line."""
+        block_of: List[int] = []
+        for number, block in enumerate(self.blocks):
+            block_of.extend([number] * (block.end - block.start))
+        return block_of
+
+    def of_kind(self, kind: str) -> List[int]:
+        """Numbers of the lines of `kind`, in order."""
+        positions = self._positions.get(kind)
+        if positions is None:
+            positions = self._positions[kind] = [i for i, k in enumerate(self.kinds) if k == kind]
+        return positions
+
+    @functools.cached_property
+    def lowered(self) -> str:
+        # lower() never adds or drops a newline, so line numbers still hold
+        return self.text.lower()
+
+    def containing(self, needle: str, ignore_case: bool = False) -> List[int]:
+        """Lines that contain `needle` (lowercase if ignore_case), by searching the whole text."""
+        text = self.lowered if ignore_case else self.text
+        numbers: List[int] = []
+        line = 0
+        last = 0
+        pos = text.find(needle)
+        while pos != -1:
+            line += text.count("\n", last, pos)
+            last = pos
+            numbers.append(line)
+            # Continue on the next line
+            end = text.find("\n", pos)
+            if end == -1:
+                break
+            pos = text.find(needle, end)
+        return numbers
+
+    def marks(self, name: str, predicate: Optional[Callable[[str], bool]] = None,
+              candidates: Optional[Callable[["BlockIndex"], Iterable[int]]] = None) -> Marks:
+        """Marks for a kind, for IMAGE, or for a stage's own test (built once).
+
+        IMAGE also marks lines that hold an `<img ` elsewhere than at the
+        start, such as table rows and list items. For a stage's test,
+        `predicate` decides on each line `candidates(index)` returns
+        (default: every line).
+        """
+        marks = self._marks.get(name)
+        if marks is None:
+            if predicate is not None:
+                lines = self.lines
+                numbers = sorted(set(candidates(self))) if candidates is not None else range(len(lines))
+                positions = [i for i in numbers if predicate(lines[i])]
+            elif name == IMAGE:
+                positions = sorted(set(self.of_kind(IMAGE)) | set(self.containing("<img ")))
+            else:
+                positions = self.of_kind(name)
+            marks = self._marks[name] = Marks(positions, len(self))
+        return marks
+
+
+class Output:
+    """A stage's result, line by line, with the kinds of the lines it keeps.
+
+    `text()` joins the lines and hands the next stage an index of the
+    result in which only the lines the stage added had to be classified.
+    """
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self.kinds: List[Optional[str]] = []
+        self.exact = True
+
+    def keep(self, index: BlockIndex, start: int, end: Optional[int] = None) -> None:
+        """Line `start` (to `end`, exclusive) of `index`, unchanged."""
+        end = start + 1 if end is None else end
+        self.lines.extend(index.lines[start:end])
+        self.kinds.extend(index.kinds[start:end])
+
+    def add(self, line: str, kind: Optional[str] = None) -> None:
+        """A new line; `kind` if the stage knows it, else it is classified in text()."""
+        self.lines.append(line)
+        self.kinds.append(kind)
+        if "\n" in line:
+            self.exact = False
+
+    def text(self) -> str:
+        text = "\n".join(self.lines)
+        if self.exact:
+            unknown = [i for i, kind in enumerate(self.kinds) if kind is None]
+            for i, kind in zip(unknown, classify([self.lines[i] for i in unknown])):
+                self.kinds[i] = kind
+            remember(BlockIndex(self.lines, text, self.kinds))
+        return text
+
+
+# Indexes of the last few texts, newest last
+CACHE_SIZE = 4
+_cache: "OrderedDict[str, BlockIndex]" = OrderedDict()
+
+
+def remember(blocks: BlockIndex) -> None:
+    _cache[blocks.text] = blocks
+    _cache.move_to_end(blocks.text)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def index(text: str) -> BlockIndex:
+    """The index of `text` split on newlines; shared by stages that see the same text."""
+    blocks = _cache.get(text)
+    if blocks is None:
+        blocks = BlockIndex(text.split("\n"), text)
+        remember(blocks)
+    return blocks
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) != 1:
+        print("Usage: markdown_blocks.py <markdown-file>", file=sys.stderr)
+        return 2
+    blocks = index(Path(argv[0]).read_text(encoding="utf-8"))
+    for block in blocks.blocks:
+        if block.kind == BLANK:
+            continue
+        first = blocks.lines[block.start]
+        print(f"{block.start + 1:>6}-{block.end:<6} {block.kind:<11} {first[:60]}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
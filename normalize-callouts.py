@@ -1,11 +1,26 @@
 #!/usr/bin/env python3
-"""Normalize GitHub-style callouts in Markdown output.
+"""Turn callouts into indented MkDocs admonitions in one pass.
 
-Converts blockquotes that start with `[!NOTE]`, `[!IMPORTANT]`, etc. into
-MkDocs/Material admonition syntax (`!!! note`).
+Callouts reach this stage in three shapes:
 
-It also collapses repeated blockquote prefixes (`> > >`) down to a single `>`
-so the resulting Markdown stays readable and Typora-compatible.
+* GitHub alerts: `> [!NOTE]`, `> [!IMPORTANT] First line`, also behind
+  nested markers (`> > [!TIP]`) and in any letter case;
+* admonitions whose body is still a blockquote: `!!! note` followed by
+  `> ...` lines (content on the `!!!` line is moved into the body);
+* plain blockquotes, whose repeated markers (`> > >`) are collapsed down
+  to a single `>` so the Markdown stays readable and Typora-compatible.
+
+One walk over the lines recognizes all three and emits the final block:
+the `!!! type` line, the body indented by four spaces (one quote level
+removed; deeper quotes are kept as a single `>`), and a blank line after
+it. Blank lines between quote lines stay in the body.
+
+Alert types map as the published manuals have always shown them:
+IMPORTANT and CAUTION become warnings with their own title, unknown types
+become notes.
+
+This replaces the five `> [!TYPE]` rules of rules/base.yml,
+fix_admonitions.py and the two passes this script used to make.
 """
 
 from __future__ import annotations
@@ -13,95 +28,101 @@ from __future__ import annotations
 import re
 import sys
 from pathlib import Path
-from typing import List
+from typing import Optional, Tuple
+
+import markdown_blocks
 
 SUPPORTED = {
     "NOTE": "note",
-    "IMPORTANT": "important",
+    "IMPORTANT": 'warning "Important"',
     "WARNING": "warning",
-    "CAUTION": "caution",
+    "CAUTION": 'warning "Caution"',
     "TIP": "tip",
 }
 
-CALL_RE = re.compile(r"^>\s*\[!([A-Z]+)\]\s*(.*)$")
-QUOTE_RE = re.compile(r"^>\s?(.*)$")
+ALERT_RE = re.compile(r"^>\s*\[!([A-Za-z]+)\]\s*(.*)$")
+ADMONITION_RE = re.compile(r'^(!!! (?:note|warning|tip|caution|important)(?: "[^"]*")?)(?:\s+(.+))?$')
 MULTI_QUOTE_RE = re.compile(r"^(?:>\s*)+(.*)$")
 
 
-def normalize_quotes(lines: List[str]) -> List[str]:
-    """Collapse repeated `>` prefixes down to a single `>`."""
+def collapse_quote(line: str) -> str:
+    """`> > > text` (indented or not) as `> text`."""
 
-    normalized: List[str] = []
-    for line in lines:
-        stripped = line.lstrip()
-        if not stripped.startswith(">"):
-            normalized.append(line)
-            continue
-        # Preserve leading indentation, collapse repeated markers
-        indent = line[: len(line) - len(stripped)]
-        match = MULTI_QUOTE_RE.match(stripped)
-        if match:
-            content = match.group(1)
-            normalized.append(f"{indent}> {content}".rstrip())
-        else:
-            normalized.append(line)
-    return normalized
-
-
-def convert_callouts(lines: List[str]) -> List[str]:
-    output: List[str] = []
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        match = CALL_RE.match(line)
-        if not match:
-            output.append(line)
-            i += 1
-            continue
+    stripped = line.lstrip()
+    indent = line[: len(line) - len(stripped)]
+    return f"{indent}> {MULTI_QUOTE_RE.match(stripped).group(1)}".rstrip()
 
-        callout_type = match.group(1).upper()
-        mapped = SUPPORTED.get(callout_type, "note")
-        title = match.group(2).strip()
 
-        if title:
-            output.append(f"!!! {mapped} \"{title}\"")
-        else:
-            output.append(f"!!! {mapped}")
+def callout_start(line: str, kind: str) -> Optional[Tuple[str, str]]:
+    """(`!!! ...` line, text for the first body line) if `line` opens a callout."""
 
+    if kind == markdown_blocks.QUOTE and line.startswith(">"):
+        match = ALERT_RE.match(collapse_quote(line))
+        if match:
+            return f"!!! {SUPPORTED.get(match.group(1).upper(), 'note')}", match.group(2)
+    elif kind == markdown_blocks.ADMONITION:
+        match = ADMONITION_RE.match(line)
+        if match:
+            return match.group(1), match.group(2) or ""
+    return None
+
+
+def body_line(line: str) -> str:
+    """A `>` line of a callout body, one quote level removed and indented."""
+
+    if line == ">":
+        return ""
+    rest = line[2:] if line.startswith("> ") else line[1:]
+    indented = f"    {rest}"
+    return collapse_quote(indented) if rest.lstrip().startswith(">") else indented
+
+
+def normalize_callouts(text: str) -> str:
+    """Convert every callout of a document and collapse nested quotes."""
+
+    index = markdown_blocks.index(text)
+    lines, kinds = index.lines, index.kinds
+    output = markdown_blocks.Output()
+    copied = 0
+    # Only quote and admonition lines can change
+    events = sorted(index.of_kind(markdown_blocks.QUOTE) + index.of_kind(markdown_blocks.ADMONITION))
+    for i in events:
+        if i < copied:
+            continue  # inside a callout body already written
+        start = callout_start(lines[i], kinds[i])
+        if start is None:
+            if kinds[i] == markdown_blocks.QUOTE:
+                collapsed = collapse_quote(lines[i])
+                if collapsed != lines[i]:
+                    output.keep(index, copied, i)
+                    output.add(collapsed, markdown_blocks.QUOTE)
+                    copied = i + 1
+            continue
+
+        output.keep(index, copied, i)
+        header, first = start
+        output.add(header, markdown_blocks.ADMONITION)
+        if first:
+            output.add(f"    {first}")
         i += 1
-        # Gather the blockquote body lines
-        body_lines: List[str] = []
-        while i < len(lines):
-            cont = QUOTE_RE.match(lines[i])
-            if not cont:
-                break
-            body_lines.append(cont.group(1))
+        while i < len(lines) and (lines[i].startswith(">") or kinds[i] == markdown_blocks.BLANK):
+            if kinds[i] == markdown_blocks.QUOTE and callout_start(lines[i], kinds[i]):
+                break  # the next callout
+            if kinds[i] == markdown_blocks.BLANK:
+                output.add("", markdown_blocks.BLANK)
+            else:
+                output.add(body_line(lines[i]))
             i += 1
+        output.add("", markdown_blocks.BLANK)
+        copied = i
 
-        # Trim leading/trailing empty lines inside the body for cleaner output
-        while body_lines and body_lines[0].strip() == "":
-            body_lines.pop(0)
-        while body_lines and body_lines[-1].strip() == "":
-            body_lines.pop()
-
-        if body_lines:
-            for body_line in body_lines:
-                output.append(f"    {body_line.rstrip()}")
-        else:
-            output.append("    ")
-
-        # Ensure a blank line after the admonition for Markdown parsers
-        if i < len(lines) and lines[i].strip():
-            output.append("")
-
-    return output
+    output.keep(index, copied, len(lines))
+    return output.text()
 
 
 def main(path: Path) -> None:
-    original = path.read_text(encoding="utf-8").splitlines()
-    normalized = normalize_quotes(original)
-    converted = convert_callouts(normalized)
-    path.write_text("\n".join(converted) + "\n", encoding="utf-8")
+    text = path.read_text(encoding="utf-8")
+    path.write_text(normalize_callouts(text), encoding="utf-8")
 
 
 if __name__ == "__main__":
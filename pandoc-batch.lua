@@ -0,0 +1,99 @@
+-- pandoc-batch.lua
+-- Convert many DOCX files in one long-lived pandoc process.
+--
+--   pandoc lua pandoc-batch.lua
+--
+-- Reads one job per line from stdin, "<input.docx>\t<workdir>", and for
+-- each writes <workdir>/ast.json (the document after the Lua filters)
+-- and <workdir>/index.md (GFM, --wrap=none --markdown-headings=atx), the
+-- same two files pandoc_stage.py gets from two pandoc CLI runs. Answers
+-- each job with one line on stdout: "ok\t<input>" or
+-- "error\t<input>\t<message>".
+--
+-- The filters are run through filter-bundle.lua: fused into shared walks
+-- with PIPELINE_LUA_BUNDLE=1, as pandoc_stage.py then passes them, and
+-- otherwise one walk per filter, as separate --lua-filter options run them.
+--
+-- pandoc starts once and the filter files are read from disk once. The
+-- bundle and its filters are still re-run from those sources for every
+-- document, so state a filter keeps in locals or globals never carries
+-- over from one manual to the next, just as with one process per manual.
+--
+-- `pandoc server` cannot be used for this: it does not run Lua filters.
+-- pandoc_stage.py --verify-batch compares the output with the CLI path.
+
+local SCRIPT_DIR = (PANDOC_SCRIPT_FILE or ""):match("^(.*)[/\\]") or "."
+local BUNDLE = SCRIPT_DIR .. "/filter-bundle.lua"
+local SEPARATE = os.getenv("PIPELINE_LUA_BUNDLE") ~= "1"
+
+-- Filter sources by path, read on first use
+local sources = {}
+local raw_loadfile = loadfile
+
+local function cached_loadfile(path, mode, env)
+  local text = sources[path]
+  if text == nil then
+    local f = assert(io.open(path, "rb"))
+    text = f:read("a")
+    f:close()
+    sources[path] = text
+  end
+  return load(text, "@" .. path, mode, env)
+end
+
+-- The bundle wraps pandoc.utils.stringify on load; start from the original
+-- every time so the wrappers do not stack up
+local stringify = pandoc.utils.stringify
+
+local function load_bundle()
+  pandoc.utils.stringify = stringify
+  loadfile = cached_loadfile
+  local env = setmetatable({PANDOC_SCRIPT_FILE = BUNDLE, BUNDLE_SEPARATE = SEPARATE},
+                           {__index = _G})
+  local ok, result = pcall(function() return assert(cached_loadfile(BUNDLE, "t", env))() end)
+  loadfile = raw_loadfile
+  if not ok then error(result, 0) end
+  return result
+end
+
+-- What the pandoc CLI does to text output (not --standalone): end it with a newline
+local function with_newline(text)
+  if text == "" or text:sub(-1) ~= "\n" then
+    return text .. "\n"
+  end
+  return text
+end
+
+local function write_file(path, text)
+  local f = assert(io.open(path, "wb"))
+  f:write(text)
+  f:close()
+end
+
+local function convert(input, workdir)
+  local f = assert(io.open(input, "rb"))
+  local data = f:read("a")
+  f:close()
+  local doc = pandoc.read(data, "docx")
+  for _, filter in ipairs(load_bundle()) do
+    doc = filter.Pandoc(doc) or doc
+  end
+  write_file(workdir .. "/ast.json", with_newline(pandoc.write(doc, "json")))
+  local gfm = pandoc.write(doc, "gfm", {wrap_text = "wrap-none", setext = false})
+  write_file(workdir .. "/index.md", with_newline(gfm))
+end
+
+for line in io.lines() do
+  local input, workdir = line:match("^(.-)\t(.*)$")
+  if input == nil then
+    io.stdout:write("error\t" .. line .. "\texpected <input>\\t<workdir>\n")
+  else
+    local ok, err = pcall(convert, input, workdir)
+    if ok then
+      io.stdout:write("ok\t" .. input .. "\n")
+    else
+      io.stdout:write("error\t" .. input .. "\t" .. tostring(err):gsub("[\r\n]+", " ") .. "\n")
+    end
+  end
+  io.stdout:flush()
+end
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""Run the pandoc DOCX -> GFM step, caching the filtered document.
+
+Pandoc runs in two steps: DOCX -> JSON AST with every Lua filter from
+lua-filters.txt applied, then JSON -> GFM with no filters. The first filter,
+flatten-media-paths.lua, points images at `./imageN.ext`; the images the
+filtered document references are then streamed entry by entry out of the
+DOCX package (word/media/) under those names, with the images the rules/
+substitutions insert (the product image), instead of pandoc's
+--extract-media writing a media/ folder that had to be flattened and
+relinked. Each filter is passed to pandoc as its own --lua-filter; set
+PIPELINE_LUA_BUNDLE=1 to apply them through filter-bundle.lua instead, which
+runs them in order but fuses neighbouring element filters into shared
+document walks (check it with --verify-bundle before switching a corpus
+over). The filtered AST, the GFM text and the extracted media are stored in
+a cache directory keyed by the hash of the .docx, the hashes of the filters,
+the pandoc version and the writer options. A later run with the same key
+copies the cached GFM and media instead of running pandoc, so changing only
+a Python stage or a rule re-runs in well under a second.
+
+    pandoc_stage.py [--from-cache] [--name FILE] <input.docx> <out-dir>
+
+writes <out-dir>/index.md (or FILE) and the images next to it, in the
+layout the manual is published in. With --from-cache the
+cache must already hold the document; pandoc is never started.
+
+    pandoc_stage.py --verify-bundle <input.docx>...
+
+converts each document both ways and reports whether the filtered ASTs are
+identical.
+
+    pandoc_stage.py --batch [-j N] <input.docx>...
+    pandoc_stage.py --verify-batch <input.docx>...
+
+--batch fills the cache for the documents that are not in it yet through
+N long-lived `pandoc lua pandoc-batch.lua` processes, which start pandoc
+and read the filter files once instead of once per document (batch.py
+--pandoc-batch does this before converting). The batch process applies
+the filters as the CLI path does: one walk per filter, or the fused walks
+with PIPELINE_LUA_BUNDLE=1. --verify-batch converts each document through
+the batch process and through the pandoc CLI, in the same mode, and
+reports whether the AST, index.md and the extracted images are identical.
+
+The cache lives in .cache/pandoc/ (override with PIPELINE_CACHE_DIR).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+import build_cache
+import rule_engine
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PANDOC_CACHE = build_cache.CACHE_ROOT / "pandoc"
+FILTER_BUNDLE = SCRIPT_DIR / "filter-bundle.lua"
+BATCH_SCRIPT = SCRIPT_DIR / "pandoc-batch.lua"
+
+WRITER_ARGS = ["-t", "gfm", "--wrap=none", "--markdown-headings=atx"]
+
+AST_NAME = "ast.json"
+MARKDOWN_NAME = "index.md"
+MEDIA_NAME = "media"
+# Where the DOCX package keeps embedded images
+PACKAGE_MEDIA = "word/media/"
+# "./name.ext" as image target or inside an <img src> in the JSON AST
+MEDIA_REF_PATTERN = re.compile(r'\./([^"\\/\s]+\.[A-Za-z0-9]+)')
+
+
+class CacheMiss(RuntimeError):
+    """--from-cache was requested but the document is not cached."""
+
+
+class BatchError(RuntimeError):
+    """pandoc-batch.lua could not convert a document."""
+
+
+class PandocBatch:
+    """A `pandoc lua pandoc-batch.lua` process converting documents one by one."""
+
+    def __init__(self, bundle: Optional[bool] = None):
+        self.bundle = use_bundle() if bundle is None else bundle
+
+    def __enter__(self) -> "PandocBatch":
+        self.proc = subprocess.Popen(
+            ["pandoc", "lua", str(BATCH_SCRIPT)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding="utf-8",
+            env=dict(os.environ, PIPELINE_LUA_BUNDLE="1" if self.bundle else "0"),
+        )
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.proc.stdin.close()
+        self.proc.wait()
+
+    def run(self, source: Path, workdir: Path) -> None:
+        """Write the filtered ast.json and index.md of `source` into `workdir`."""
+        self.proc.stdin.write(f"{source}\t{workdir}\n")
+        self.proc.stdin.flush()
+        reply = self.proc.stdout.readline()
+        if not reply:
+            raise BatchError(f"pandoc lua exited with status {self.proc.wait()}")
+        status, _, message = reply.rstrip("\n").partition("\t")
+        if status != "ok":
+            raise BatchError(message.partition("\t")[2] or message)
+
+
+def cache_key(source: Path) -> str:
+    """Key for the filtered document: source, filters, pandoc version, writer options."""
+    parts = {
+        "source": build_cache.sha256_file(source),
+        "inputs": build_cache.pandoc_inputs(),
+        "writer": WRITER_ARGS,
+        "bundle": use_bundle(),
+        "media": "flat",
+        "rule_media": sorted(rule_media()),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def use_bundle() -> bool:
+    return os.environ.get("PIPELINE_LUA_BUNDLE", "0") == "1"
+
+
+def filter_args(bundle: Optional[bool] = None) -> List[str]:
+    if use_bundle() if bundle is None else bundle:
+        return [f"--lua-filter={FILTER_BUNDLE}"]
+    return [f"--lua-filter={path}" for path in build_cache.lua_filters()]
+
+
+def run_filters(source: Path, workdir: Path, bundle: Optional[bool] = None) -> None:
+    """Write the filtered AST of `source` to `workdir`/ast.json."""
+    subprocess.run(
+        ["pandoc", str(source), "-t", "json", "-o", AST_NAME, *filter_args(bundle)],
+        cwd=workdir, check=True,
+    )
+
+
+def referenced_media(ast: Path) -> Set[str]:
+    """File names the filtered document refers to as ./name.ext, and those the rules insert."""
+    return set(MEDIA_REF_PATTERN.findall(ast.read_text(encoding="utf-8"))) | rule_media()
+
+
+def rule_media() -> Set[str]:
+    """Images the rules/ substitutions insert (the product image, ./image1.png).
+
+    Post-processing adds them after pandoc, so the filtered document does
+    not reference them; without this they would not be extracted.
+    """
+    names: Set[str] = set()
+    for path in rule_engine.rule_files():
+        for rules in rule_engine.load_rule_file(path).values():
+            for rule in rules:
+                names.update(MEDIA_REF_PATTERN.findall(rule.replace))
+    return names
+
+
+def extract_media(source: Path, names: Set[str], dest: Path) -> int:
+    """Stream the package images called `names` into `dest`; returns how many."""
+    count = 0
+    with zipfile.ZipFile(source) as package:
+        for info in package.infolist():
+            name = info.filename[len(PACKAGE_MEDIA):]
+            if not info.filename.startswith(PACKAGE_MEDIA) or name not in names:
+                continue
+            dest.mkdir(parents=True, exist_ok=True)
+            with package.open(info) as src, open(dest / name, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            count += 1
+    return count
+
+
+def run_pandoc(source: Path, workdir: Path, batch: Optional[PandocBatch] = None,
+               bundle: Optional[bool] = None) -> None:
+    """Fill `workdir` with ast.json, index.md and media/ for `source`."""
+    if batch is not None:
+        batch.run(source, workdir)
+        extract_media(source, referenced_media(workdir / AST_NAME), workdir / MEDIA_NAME)
+        return
+    run_filters(source, workdir, bundle)
+    extract_media(source, referenced_media(workdir / AST_NAME), workdir / MEDIA_NAME)
+    subprocess.run(
+        ["pandoc", AST_NAME, "-f", "json", "-o", MARKDOWN_NAME, *WRITER_ARGS],
+        cwd=workdir, check=True,
+    )
+
+
+def store(source: Path, key: str, batch: Optional[PandocBatch] = None) -> Path:
+    """Run pandoc into a scratch folder and move it into the cache atomically."""
+    PANDOC_CACHE.mkdir(parents=True, exist_ok=True)
+    entry = PANDOC_CACHE / key
+    scratch = Path(tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=PANDOC_CACHE))
+    try:
+        run_pandoc(source, scratch, batch)
+        try:
+            os.rename(scratch, entry)
+        except OSError:
+            # Another worker stored the same key first; theirs is identical
+            if not entry.is_dir():
+                raise
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return entry
+
+
+def materialize(entry: Path, out_dir: Path, name: str = MARKDOWN_NAME) -> None:
+    """Place the cached Markdown (as `name`) and its images (flat) into `out_dir`."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(entry / MARKDOWN_NAME, out_dir / name)
+    media = entry / MEDIA_NAME
+    if media.is_dir():
+        for src in media.iterdir():
+            dst = out_dir / src.name
+            # A new file, never the one a manual or the asset store links to
+            dst.unlink(missing_ok=True)
+            shutil.copy2(src, dst)
+
+
+def convert(source: Path, out_dir: Path, from_cache: bool = False,
+            name: str = MARKDOWN_NAME) -> bool:
+    """Write the Markdown (as `name`) and images of `source` into `out_dir`; True on a cache hit."""
+    key = cache_key(source)
+    entry = PANDOC_CACHE / key
+    hit = (entry / MARKDOWN_NAME).is_file()
+    if not hit:
+        if from_cache:
+            raise CacheMiss(f"{source.name} is not in the pandoc cache ({key[:12]})")
+        entry = store(source, key)
+    materialize(entry, out_dir, name)
+    return hit
+
+
+def fill_cache(sources: List[Path], jobs: int) -> Dict[Path, str]:
+    """Convert the sources missing from the cache through `jobs` batch processes.
+
+    Returns an error message per source that failed; the conversion of
+    those falls back to the pandoc CLI later.
+    """
+    if shutil.which("pandoc") is None:
+        return {}
+    missing = [source for source in sources
+               if not (PANDOC_CACHE / cache_key(source) / MARKDOWN_NAME).is_file()]
+    errors: Dict[Path, str] = {}
+
+    def work(chunk: List[Path]) -> None:
+        with PandocBatch() as batch:
+            for source in chunk:
+                try:
+                    store(source, cache_key(source), batch)
+                except (BatchError, OSError, zipfile.BadZipFile) as exc:
+                    errors[source] = str(exc)
+
+    jobs = max(1, min(jobs, len(missing)))
+    chunks = [missing[i::jobs] for i in range(jobs)]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(work, [chunk for chunk in chunks if chunk]))
+    return errors
+
+
+def cached_ast(source: Path) -> Optional[Path]:
+    """Path of the cached filtered AST for `source`, if there is one."""
+    path = PANDOC_CACHE / cache_key(source) / AST_NAME
+    return path if path.is_file() else None
+
+
+def verify_bundle(source: Path) -> bool:
+    """True if filter-bundle.lua gives the same AST as the separate filters."""
+    asts = []
+    for bundle in (False, True):
+        with tempfile.TemporaryDirectory(prefix="verify-bundle-") as workdir:
+            run_filters(source, Path(workdir), bundle=bundle)
+            asts.append(json.loads((Path(workdir) / AST_NAME).read_text(encoding="utf-8")))
+    return asts[0] == asts[1]
+
+
+def verify_batch(source: Path, bundle: Optional[bool] = None) -> List[str]:
+    """Files that differ between the batch process and the pandoc CLI (none: identical).
+
+    Both run the filters the way conversions do (use_bundle()) unless
+    `bundle` says otherwise.
+    """
+    bundle = use_bundle() if bundle is None else bundle
+    with tempfile.TemporaryDirectory(prefix="verify-batch-") as tmp:
+        cli, batched = Path(tmp) / "cli", Path(tmp) / "batch"
+        cli.mkdir()
+        batched.mkdir()
+        run_pandoc(source, cli, bundle=bundle)
+        with PandocBatch(bundle) as batch:
+            run_pandoc(source, batched, batch)
+        differ = []
+        if (json.loads((cli / AST_NAME).read_text(encoding="utf-8"))
+                != json.loads((batched / AST_NAME).read_text(encoding="utf-8"))):
+            differ.append(AST_NAME)
+        for path in sorted(set(p.relative_to(cli) for p in cli.rglob("*") if p.is_file())
+                           | set(p.relative_to(batched) for p in batched.rglob("*") if p.is_file())):
+            if path.name == AST_NAME:
+                continue
+            a, b = cli / path, batched / path
+            if not (a.is_file() and b.is_file() and a.read_bytes() == b.read_bytes()):
+                differ.append(str(path))
+        return differ
+
+
+def main(argv: List[str]) -> int:
+    if argv[:1] == ["--verify-bundle"] and len(argv) > 1:
+        status = 0
+        for arg in argv[1:]:
+            try:
+                same = verify_bundle(Path(arg).resolve())
+            except subprocess.CalledProcessError as exc:
+                print(f"❌ {arg}: pandoc failed with exit status {exc.returncode}", file=sys.stderr)
+                status = 1
+                continue
+            print(f"{'✓' if same else '❌'} {arg}: bundled AST {'matches' if same else 'differs'}")
+            status = status or (0 if same else 1)
+        return status
+
+    if argv[:1] == ["--verify-batch"] and len(argv) > 1:
+        status = 0
+        for arg in argv[1:]:
+            try:
+                differ = verify_batch(Path(arg).resolve())
+            except (subprocess.CalledProcessError, BatchError) as exc:
+                print(f"❌ {arg}: {exc}", file=sys.stderr)
+                status = 1
+                continue
+            if differ:
+                print(f"❌ {arg}: batch output differs in {', '.join(differ)}")
+                status = 1
+            else:
+                print(f"✓ {arg}: batch output matches the CLI")
+        return status
+
+    if argv[:1] == ["--batch"]:
+        args = argv[1:]
+        jobs = os.cpu_count() or 1
+        if args[:1] == ["-j"] and len(args) > 1:
+            jobs, args = int(args[1]), args[2:]
+        if not args:
+            print("Usage: pandoc_stage.py --batch [-j N] <input.docx>...", file=sys.stderr)
+            return 2
+        if shutil.which("pandoc") is None:
+            print("❌ pandoc not found", file=sys.stderr)
+            return 1
+        errors = fill_cache([Path(arg).resolve() for arg in args], jobs)
+        for source, message in errors.items():
+            print(f"❌ {source.name}: {message}", file=sys.stderr)
+        return 1 if errors else 0
+
+    from_cache = "--from-cache" in argv
+    args = [arg for arg in argv if arg != "--from-cache"]
+    name = MARKDOWN_NAME
+    if args[:1] == ["--name"] and len(args) > 1:
+        name, args = args[1], args[2:]
+    if len(args) != 2:
+        print("Usage: pandoc_stage.py [--from-cache] [--name FILE] <input.docx> <out-dir>\n"
+              "       pandoc_stage.py --batch [-j N] <input.docx>...\n"
+              "       pandoc_stage.py --verify-bundle|--verify-batch <input.docx>...", file=sys.stderr)
+        return 2
+    source, out_dir = Path(args[0]).resolve(), Path(args[1])
+    try:
+        hit = convert(source, out_dir, from_cache=from_cache, name=name)
+    except CacheMiss as exc:
+        print(f"❌ {exc}", file=sys.stderr)
+        return 1
+    except subprocess.CalledProcessError as exc:
+        print(f"❌ pandoc failed with exit status {exc.returncode}", file=sys.stderr)
+        return 1
+    print("  Pandoc: reused cached document" if hit else "  Pandoc: converted and cached")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
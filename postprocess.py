@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Run every Markdown post-processing stage in one process.
+
+convert-single.sh used to rewrite index.md once per sed, perl and python3
+call. This engine reads the file once, applies the stages below in the same
+order as in-memory string transforms, and writes the result once.
+
+The substitutions that used to be sed/perl one-liners are declared in
+rules/*.yml and compiled by rule_engine.py. The standalone scripts
+(normalize-callouts.py, html-tables-to-pipes.py, ...) still work on their own;
+here they are imported as modules.
+"""
+
+from __future__ import annotations
+
+import functools
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Dict, List, Tuple
+
+import stage_profile
+from rule_engine import RuleSet
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+Stage = Tuple[str, Callable[[str], str]]
+
+# Files of the scripts loaded as stages (hashed by build_cache.py)
+LOADED_SCRIPTS: List[str] = []
+
+
+def load_script(filename: str) -> ModuleType:
+    """Import a pipeline script by file name, hyphenated names included."""
+
+    name = filename[: -len(".py")].replace("-", "_")
+    path = str(SCRIPT_DIR / filename)
+    if path not in LOADED_SCRIPTS:
+        LOADED_SCRIPTS.append(path)
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+RULES = RuleSet.load()
+
+
+def rule_slot(slot: str) -> Callable[[str], str]:
+    """Stage that applies the rules/ substitutions of one slot."""
+
+    return functools.partial(RULES.apply, slot)
+
+
+def build_stages() -> List[Stage]:
+    """Return the post-processing stages in pipeline order."""
+
+    return [
+        ("cleanup", rule_slot("cleanup")),
+        # Heading levels are repaired by fix-crossrefs.lua, from the index it
+        # resolves cross-references with (fix-heading-hierarchy.py used to
+        # run here).
+        ("titles", rule_slot("titles")),
+        ("emphasis", rule_slot("emphasis")),
+        ("github-alerts", rule_slot("alerts")),
+        # GitHub alerts, admonitions with quoted bodies and nested quotes,
+        # in one pass
+        ("callouts", load_script("normalize-callouts.py").normalize_callouts),
+        # Table repairs and pipe conversion share one parse per table
+        ("tables", functools.partial(
+            load_script("fix_table_structure.py").fix_table_structure,
+            serialize=load_script("html-tables-to-pipes.py").table_to_pipe,
+        )),
+        ("underline", rule_slot("underline")),
+        # Image paths arrive as ./imageN.ext (flatten-media-paths.lua), so
+        # fix-relative-images.py is no longer a stage.
+        ("list-continuity", load_script("fix-list-continuity.py").fix_list_continuity),
+        ("spacing", load_script("reduce-spacing.py").reduce_spacing),
+        ("table-spacing", load_script("fix-table-spacing.py").fix_table_spacing),
+    ]
+
+
+STAGES = build_stages()
+
+
+def _admonitions(before: str, after: str) -> Dict[str, int]:
+    return {"callouts_rewritten": after.count("\n!!! ") - before.count("\n!!! ")}
+
+
+def _tables(before: str, after: str) -> Dict[str, int]:
+    return {
+        "tables_converted": before.count("<table") - after.count("<table"),
+        "rowspans_flattened": before.count("rowspan=") - after.count("rowspan="),
+    }
+
+
+# What a profiled run (stage_profile.py) counts per stage: before/after text -> counts
+STAGE_COUNTS: Dict[str, Callable[[str, str], Dict[str, int]]] = {
+    "callouts": _admonitions,
+    "tables": _tables,
+}
+
+
+def run_stages(text: str, stages: List[Stage] = STAGES) -> str:
+    """Apply each stage to the document text in order."""
+
+    # RULES lives as long as the process (daemon.py runs many documents)
+    RULES.counts.clear()
+    for _name, stage in stages:
+        text = stage(text)
+    return text
+
+
+def run_profiled(text: str, stages: List[Stage] = STAGES) -> str:
+    """run_stages, recording each stage's time, sizes and counts in the profile."""
+
+    RULES.counts.clear()
+    for name, stage in stages:
+        with stage_profile.Timer() as timer:
+            result = stage(text)
+        counter = STAGE_COUNTS.get(name)
+        stage_profile.record(
+            f"postprocess/{name}", wall_s=timer.wall_s, cpu_s=timer.cpu_s,
+            input_bytes=len(text.encode("utf-8")), output_bytes=len(result.encode("utf-8")),
+            counts=counter(text, result) if counter else {},
+        )
+        text = result
+    stage_profile.record("postprocess", counts={"rule_hits": sum(RULES.counts.values())})
+    return text
+
+
+def main(path: Path, rule_stats: bool = False) -> None:
+    text = path.read_text(encoding="utf-8")
+    run = run_profiled if stage_profile.report_path() else run_stages
+    path.write_text(run(text), encoding="utf-8")
+    print(f"Post-processed {path} ({len(STAGES)} stages)")
+    if rule_stats:
+        for rule_id, hits in sorted(RULES.counts.items()):
+            print(f"  {rule_id}: {hits}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    stats = "--rule-stats" in args
+    if stats:
+        args.remove("--rule-stats")
+    if len(args) != 1:
+        print("Usage: postprocess.py [--rule-stats] <markdown-file>", file=sys.stderr)
+        raise SystemExit(1)
+    main(Path(args[0]), rule_stats=stats)
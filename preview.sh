@@ -3,6 +3,15 @@ set -euo pipefail
 
 # Preview converted manuals in trikdis-docs with "Work in Progress" section
 # Keeps converted manuals separate from production content
+#
+# --watch: also reconvert a manual whenever its DOCX is saved and swap the
+# result into the preview in one step (see watch.py)
+
+WATCH=0
+if [ "${1:-}" = "--watch" ]; then
+  WATCH=1
+  shift
+fi
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 TRIKDIS_DOCS="/Users/local/projects/trikdis-docs/manuals"
@@ -52,7 +61,11 @@ if [ -d "$WIP_DIR" ]; then
   for manual_link in "$WIP_DIR"/*; do
     if [ -L "$manual_link" ] || [ -d "$manual_link" ]; then
       manual_name=$(basename "$manual_link")
-      if [ -f "$manual_link/index.md" ]; then
+      if [ -f "$manual_link/.nav.yml" ]; then
+        # Split into chapters (SPLIT_CHAPTERS=1): one entry per page
+        WIP_NAV="$WIP_NAV"$'\n'"      - $manual_name:"
+        WIP_NAV="$WIP_NAV"$'\n'"$(python3 "$SCRIPT_DIR/chapters.py" nav "$manual_link" --prefix "wip/$manual_name/" --indent 10)"
+      elif [ -f "$manual_link/index.md" ]; then
         manual_path="wip/$manual_name/index.md"
         WIP_NAV="$WIP_NAV"$'\n'"      - $manual_name: $manual_path"
       fi
@@ -73,6 +86,18 @@ else
 fi
 
 echo "✅ WIP section added to navigation"
+
+# Let the search plugin take the manuals' stored entries (search_hook.py),
+# unless publish.sh has already installed the hook there
+if grep -q "search_hook.py" mkdocs.yml; then
+  :
+elif grep -q "^hooks:" mkdocs.yml; then
+  sed -i.tmp "/^hooks:/a\\
+  - $SCRIPT_DIR/search_hook.py
+" mkdocs.yml && rm -f mkdocs.yml.tmp
+else
+  printf '\nhooks:\n  - %s\n' "$SCRIPT_DIR/search_hook.py" >> mkdocs.yml
+fi
 echo ""
 echo "🚀 Starting MkDocs preview..."
 echo "   Visit: http://127.0.0.1:8000"
@@ -87,6 +112,9 @@ echo ""
 cleanup() {
   echo ""
   echo "🧹 Cleaning up..."
+  if [ -n "${WATCH_PID:-}" ]; then
+    kill "$WATCH_PID" 2>/dev/null || true
+  fi
   rm -rf "$WIP_DIR"
   mv mkdocs.yml.backup mkdocs.yml
   echo "✅ Cleanup complete"
@@ -95,6 +123,11 @@ cleanup() {
 # Register cleanup on exit
 trap cleanup EXIT INT TERM
 
+if [ "$WATCH" = "1" ]; then
+  (cd "$SCRIPT_DIR" && OUT_DIR="$SCRIPT_DIR/docs/manuals" exec python3 watch.py --preview "$WIP_DIR") &
+  WATCH_PID=$!
+fi
+
 # Open browser after a short delay
 (sleep 2 && open http://127.0.0.1:8000) &
 
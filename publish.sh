@@ -46,17 +46,40 @@ echo "   From: $MANUAL_NAME"
 echo "   To:   $DEST_PATH"
 echo ""
 
-# Create destination directory
-mkdir -p "$DEST_DIR"
+# Copy only added or changed files and delete files the previous publish
+# wrote that the manual no longer has (see publish_sync.py)
+python3 "$SCRIPT_DIR/publish_sync.py" "$SOURCE_DIR" "$DEST_DIR"
 
-# Copy manual
-cp -r "$SOURCE_DIR"/* "$DEST_DIR/"
+# The site's search plugin takes the manual's entries from the published
+# .search-index.json through search_hook.py (which imports search_index.py
+# and chapters.py); keep copies in trikdis-docs/hooks and list the hook in
+# its mkdocs.yml
+HOOK_DIR="$TRIKDIS_DOCS/hooks"
+mkdir -p "$HOOK_DIR"
+for f in search_hook.py search_index.py chapters.py; do
+  cmp -s "$SCRIPT_DIR/$f" "$HOOK_DIR/$f" || cp "$SCRIPT_DIR/$f" "$HOOK_DIR/$f"
+done
+if ! grep -q "search_hook.py" "$TRIKDIS_DOCS/mkdocs.yml"; then
+  if grep -q "^hooks:" "$TRIKDIS_DOCS/mkdocs.yml"; then
+    sed -i.tmp "/^hooks:/a\\
+  - hooks/search_hook.py
+" "$TRIKDIS_DOCS/mkdocs.yml" && rm -f "$TRIKDIS_DOCS/mkdocs.yml.tmp"
+  else
+    printf '\nhooks:\n  - hooks/search_hook.py\n' >> "$TRIKDIS_DOCS/mkdocs.yml"
+  fi
+  echo "   Added hooks/search_hook.py to trikdis-docs/mkdocs.yml"
+fi
 
-echo "✅ Manual copied to trikdis-docs"
+echo "✅ Manual published to trikdis-docs"
 echo ""
 echo "📝 Next steps:"
 echo "   1. Update trikdis-docs/mkdocs.yml navigation:"
-echo "      - Add: $DEST_PATH/index.md"
+if [ -f "$SOURCE_DIR/.nav.yml" ]; then
+  echo "      - Add the chapter pages:"
+  python3 "$SCRIPT_DIR/chapters.py" nav "$SOURCE_DIR" --prefix "$DEST_PATH/" --indent 8
+else
+  echo "      - Add: $DEST_PATH/index.md"
+fi
 echo ""
 echo "   2. Preview in trikdis-docs:"
 echo "      cd $TRIKDIS_DOCS"
@@ -67,6 +90,6 @@ echo "      rm -rf \"$SOURCE_DIR\""
 echo ""
 echo "   4. Commit to trikdis-docs:"
 echo "      cd $TRIKDIS_DOCS"
-echo "      git add docs/$DEST_PATH"
+echo "      git add docs/$DEST_PATH hooks mkdocs.yml"
 echo "      git commit -m \"Add $MANUAL_NAME manual\""
 echo "      git push"
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Publish a converted manual folder into the docs repository incrementally.
+
+publish.sh used to `cp -r` the whole manual, rewriting every image and
+index.md on each publish and never deleting files a newer conversion no
+longer produces. Instead:
+
+* every file of the manual (dot files such as .build-manifest.json are not
+  published, except the search entries in .search-index.json and the page
+  list in .nav.yml, which the docs site's search_hook.py reads) is hashed;
+* the destination keeps a `.publish-manifest.json` with the hash, size and
+  mtime of each file the last publish wrote; a destination file whose size
+  and mtime still match its entry is not read again;
+* only added or changed files are copied, each to a temporary file in the
+  destination folder that is then renamed into place, with the mode `cp`
+  would have given it (0666 less the umask);
+* files the previous publish wrote that are no longer in the manual are
+  deleted (files the manifest does not know about are never touched);
+* the manifest is written last, also through a rename.
+
+Republishing a manual in which one paragraph changed rewrites index.md only.
+
+    publish_sync.py [--dry-run] <manual-dir> <destination-dir>
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_NAME = ".publish-manifest.json"
+# Dot files the docs site uses: the search entries search_hook.py reads
+# (search_index.INDEX_NAME) and the page list they are keyed by (chapters.NAV_NAME)
+PUBLISHED_DOT_FILES = {".search-index.json", ".nav.yml"}
+
+
+def _file_mode() -> int:
+    """The mode `cp` gives a new file (0666 less the umask); mkstemp files are 0600."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+FILE_MODE = _file_mode()
+
+
+def digest_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_files(folder: Path) -> Dict[str, Path]:
+    """Files to publish, by POSIX path relative to `folder`.
+
+    Dot files are skipped, except PUBLISHED_DOT_FILES.
+    """
+    files = {}
+    for path in sorted(folder.rglob("*")):
+        rel = path.relative_to(folder)
+        hidden = any(part.startswith(".") for part in rel.parts)
+        if (hidden and rel.as_posix() not in PUBLISHED_DOT_FILES) or not path.is_file():
+            continue
+        files[rel.as_posix()] = path
+    return files
+
+
+def load_manifest(dest: Path) -> Dict[str, Dict]:
+    try:
+        data = json.loads((dest / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data.get("files", {}) if isinstance(data, dict) else {}
+
+
+def dest_digest(path: Path, entry: Optional[Dict]) -> Optional[str]:
+    """Hash of a destination file, from the manifest if it is unchanged since."""
+    try:
+        info = path.stat()
+    except FileNotFoundError:
+        return None
+    if entry and entry.get("size") == info.st_size and entry.get("mtime_ns") == info.st_mtime_ns:
+        return entry.get("sha256")
+    return digest_file(path)
+
+
+def copy_atomic(src: Path, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    fd, scratch = tempfile.mkstemp(prefix=f".{dst.name}.", dir=dst.parent)
+    os.close(fd)
+    try:
+        shutil.copyfile(src, scratch)
+        os.chmod(scratch, FILE_MODE)
+        os.replace(scratch, dst)
+    except BaseException:
+        Path(scratch).unlink(missing_ok=True)
+        raise
+
+
+def write_manifest(dest: Path, files: Dict[str, Dict]) -> None:
+    fd, scratch = tempfile.mkstemp(prefix=f"{MANIFEST_NAME}.", dir=dest)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.chmod(scratch, FILE_MODE)
+    os.replace(scratch, dest / MANIFEST_NAME)
+
+
+def remove_empty_dirs(dest: Path, removed: List[str]) -> None:
+    for rel in removed:
+        parent = (dest / rel).parent
+        while parent != dest:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+
+def sync(source: Path, dest: Path, dry_run: bool = False) -> Dict[str, List[str]]:
+    """Make `dest` match `source`; returns the paths added, updated, removed and unchanged."""
+    changes: Dict[str, List[str]] = {"added": [], "updated": [], "removed": [], "unchanged": []}
+    previous = load_manifest(dest)
+    files = source_files(source)
+    manifest: Dict[str, Dict] = {}
+
+    for rel, src in files.items():
+        digest = digest_file(src)
+        target = dest / rel
+        current = dest_digest(target, previous.get(rel))
+        if current == digest:
+            changes["unchanged"].append(rel)
+        else:
+            changes["added" if current is None else "updated"].append(rel)
+            if not dry_run:
+                copy_atomic(src, target)
+        if not dry_run:
+            info = target.stat()
+            manifest[rel] = {"sha256": digest, "size": info.st_size, "mtime_ns": info.st_mtime_ns}
+
+    for rel in sorted(set(previous) - set(files)):
+        target = dest / rel
+        if target.is_file():
+            changes["removed"].append(rel)
+            if not dry_run:
+                target.unlink()
+
+    if not dry_run:
+        remove_empty_dirs(dest, changes["removed"])
+        write_manifest(dest, manifest)
+    return changes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", type=Path, help="converted manual folder")
+    parser.add_argument("dest", type=Path, help="destination folder in the docs repository")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would change")
+    args = parser.parse_args(argv)
+
+    if not args.source.is_dir():
+        print(f"❌ Manual not found: {args.source}", file=sys.stderr)
+        return 1
+    if not args.dry_run:
+        args.dest.mkdir(parents=True, exist_ok=True)
+
+    changes = sync(args.source, args.dest, args.dry_run)
+    marks = {"added": "+", "updated": "~", "removed": "-"}
+    for kind, mark in marks.items():
+        for rel in changes[kind]:
+            print(f"   {mark} {rel}")
+    verb = "Would publish" if args.dry_run else "Published"
+    print(f"{verb}: {len(changes['added'])} added, {len(changes['updated'])} updated, "
+          f"{len(changes['removed'])} removed, {len(changes['unchanged'])} unchanged")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -6,63 +6,28 @@ Removes multiple consecutive empty lines and reduces spacing in list sections
 while preserving necessary formatting.
 """
 
-import re
 import sys
 from pathlib import Path
 
+import markdown_blocks
+
 
 def reduce_spacing(content: str) -> str:
     """Remove excessive empty lines while preserving structure."""
 
-    lines = content.split('\n')
-    output_lines = []
-    i = 0
-
-    while i < len(lines):
-        line = lines[i]
-
-        # Always add the current line
-        output_lines.append(line)
-
-        # If this line is empty, check how many empty lines follow
-        if line.strip() == "":
-            # Count consecutive empty lines
-            empty_count = 0
-            j = i + 1
-            while j < len(lines) and lines[j].strip() == "":
-                empty_count += 1
-                j += 1
-
-            # Skip excessive empty lines (keep max 1 empty line)
-            if empty_count > 0:
-                # Add at most one empty line
-                if i > 0 and output_lines[-1].strip() != "":
-                    # Only add empty line if previous line wasn't empty
-                    pass  # We already added the first empty line
-                else:
-                    # Remove the empty line we just added since previous was also empty
-                    output_lines.pop()
-
-                # Skip all the additional empty lines
-                i = j - 1
-
-        i += 1
-
-    # Clean up: remove multiple consecutive empty lines that might still exist
-    final_lines = []
-    prev_empty = False
-
-    for line in output_lines:
-        is_empty = line.strip() == ""
-
-        if is_empty and prev_empty:
-            # Skip this empty line (already have one)
-            continue
+    index = markdown_blocks.index(content)
+    output = markdown_blocks.Output()
+    copied = 0
 
-        final_lines.append(line)
-        prev_empty = is_empty
+    for block in index.blocks:
+        # A single empty line is kept; a run of several is removed entirely
+        # (what the original line-by-line pass did)
+        if block.kind == markdown_blocks.BLANK and block.end - block.start > 1:
+            output.keep(index, copied, block.start)
+            copied = block.end
 
-    return '\n'.join(final_lines)
+    output.keep(index, copied, len(index))
+    return output.text()
 
 
 def main(path: Path) -> None:
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Check the conversion of a fixture corpus against committed golden output.
+
+TABLE_FIXES.md and FILTER_IMPROVEMENTS.md describe fixes made for specific
+manuals; this runner keeps them fixed. For every case in
+golden/fixtures.txt (one source .docx per line, relative to the
+repository) golden/<name>/ holds:
+
+* input.md: what pandoc and the Lua filters made of the document, i.e.
+  the input of post-processing;
+* stages.json: for every postprocess.py stage, the lines it changed
+  (replaced line ranges) and the SHA-256 of its output, so the golden
+  output of any stage can be rebuilt from input.md;
+* index.md: the final Markdown, for reading and reviewing in diffs.
+
+A run converts the cases in parallel (-j). The pandoc step is taken from
+the pandoc cache (see pandoc_stage.py), so after a Python-only change no
+pandoc runs and the corpus is re-checked in seconds; --from-cache fails
+instead of running pandoc for a document that is not cached. A case whose
+.docx is not available is checked from its golden input.md (the pandoc
+step is then not checked).
+
+Every case whose .docx is available, and golden/batch-check.docx (a small
+synthetic manual from benchmarks/corpus.py, committed so the check always
+has a document), is also converted through the batch process
+(pandoc_stage.py --verify-batch): the AST, index.md and images of `--batch`
+must equal those of a single pandoc CLI run with the same filter mode. The
+check runs once per pandoc cache key and is skipped, with a note, when
+pandoc is not installed or with --from-cache.
+
+Each case reports the first step whose output differs from the golden one
+(pandoc or a post-processing stage) with a diff of that step's output, and
+lists the later stages that differ too; --all-stages prints the diff of
+every stage that differs.
+
+    regression.py [case ...] [-j N] [--from-cache] [--all-stages] [--context 3]
+    regression.py --update [case ...]       # Accept the current output as golden
+    regression.py --add <input.docx>        # New case (then --update)
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import difflib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+GOLDEN_DIR = SCRIPT_DIR / "golden"
+FIXTURES = GOLDEN_DIR / "fixtures.txt"
+INPUT_NAME = "input.md"
+STAGES_NAME = "stages.json"
+OUTPUT_NAME = "index.md"
+BATCH_FIXTURE = GOLDEN_DIR / "batch-check.docx"
+MAX_DIFF_LINES = 80
+
+# A stage's edit: lines [start, end) of its input replaced by `lines`
+Edit = Tuple[int, int, List[str]]
+
+
+@dataclass
+class Case:
+    name: str
+    source: Path
+
+    @property
+    def golden(self) -> Path:
+        return GOLDEN_DIR / self.name
+
+
+@dataclass
+class CaseResult:
+    name: str
+    status: str = "ok"  # ok, failed, error, updated
+    pandoc: str = "checked"  # checked, not checked (reason)
+    batch: str = "checked"  # checked, not checked (reason)
+    differing: List[str] = field(default_factory=list)
+    diffs: List[Tuple[str, str]] = field(default_factory=list)
+    message: str = ""
+    duration: float = 0.0
+
+
+def read_fixtures(path: Path = FIXTURES) -> List[Case]:
+    cases = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            source = SCRIPT_DIR / line
+            cases.append(Case(source.stem, source))
+    return cases
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def edits(before: str, after: str) -> List[Edit]:
+    """The line ranges `after` replaces in `before`."""
+    matcher = difflib.SequenceMatcher(None, before.split("\n"), after.split("\n"), autojunk=False)
+    new = after.split("\n")
+    return [(i1, i2, new[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+
+def apply_edits(text: str, changes: List[Edit]) -> str:
+    lines = text.split("\n")
+    for start, end, replacement in reversed(changes):
+        lines[start:end] = replacement
+    return "\n".join(lines)
+
+
+def golden_outputs(case: Case) -> Tuple[str, List[Tuple[str, str]]]:
+    """Golden input.md and the golden output of every stage, in order."""
+    text = (case.golden / INPUT_NAME).read_text(encoding="utf-8")
+    recorded = json.loads((case.golden / STAGES_NAME).read_text(encoding="utf-8"))
+    outputs = []
+    current = text
+    for stage in recorded["stages"]:
+        current = apply_edits(current, [tuple(edit) for edit in stage["edits"]])
+        if sha256_text(current) != stage["sha256"]:
+            raise ValueError(f"{case.golden / STAGES_NAME}: stage {stage['name']} does not rebuild")
+        outputs.append((stage["name"], current))
+    return text, outputs
+
+
+def pandoc_output(case: Case, from_cache: bool) -> Optional[str]:
+    """The case's pandoc Markdown, from the pandoc cache when possible; None without a source."""
+    import pandoc_stage
+
+    if not case.source.is_file():
+        return None
+    key = pandoc_stage.cache_key(case.source)
+    entry = pandoc_stage.PANDOC_CACHE / key
+    if not (entry / pandoc_stage.MARKDOWN_NAME).is_file():
+        if from_cache:
+            raise pandoc_stage.CacheMiss(f"{case.source.name} is not in the pandoc cache ({key[:12]})")
+        entry = pandoc_stage.store(case.source, key)
+    return (entry / pandoc_stage.MARKDOWN_NAME).read_text(encoding="utf-8")
+
+
+def batch_check(source: Path, from_cache: bool) -> Tuple[str, List[str]]:
+    """Compare the batch process with the pandoc CLI for `source`: (status, differing files).
+
+    A match is remembered per pandoc cache key, so the documents are only
+    converted again when the source, the filters or pandoc change.
+    """
+    import build_cache
+    import pandoc_stage
+
+    if not source.is_file():
+        return f"not checked ({source.name} not found)", []
+    marker = build_cache.CACHE_ROOT / "batch-verified" / pandoc_stage.cache_key(source)
+    if marker.is_file():
+        return "checked", []
+    if from_cache:
+        return "not checked (--from-cache)", []
+    if shutil.which("pandoc") is None:
+        return "not checked (pandoc not found)", []
+    differ = pandoc_stage.verify_batch(source)
+    if not differ:
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+    return "checked", differ
+
+
+def run_stages(text: str) -> List[Tuple[str, str]]:
+    import postprocess
+
+    outputs = []
+    # Some stages report progress on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, stage in postprocess.STAGES:
+            text = stage(text)
+            outputs.append((name, text))
+    return outputs
+
+
+def unified(name: str, golden: str, current: str, context: int) -> str:
+    lines = list(difflib.unified_diff(golden.split("\n"), current.split("\n"),
+                                      f"golden/{name}", f"current/{name}", n=context, lineterm=""))
+    if len(lines) > MAX_DIFF_LINES:
+        lines = lines[:MAX_DIFF_LINES] + [f"... {len(lines) - MAX_DIFF_LINES} more diff lines"]
+    return "\n".join(lines)
+
+
+def check_case(case: Case, from_cache: bool, all_stages: bool, context: int) -> CaseResult:
+    result = CaseResult(case.name)
+    start = time.monotonic()
+    try:
+        golden_input, golden = golden_outputs(case)
+        text = pandoc_output(case, from_cache)
+        if text is None:
+            result.pandoc = f"not checked ({case.source.name} not found; using golden {INPUT_NAME})"
+            text = golden_input
+        elif text != golden_input:
+            result.differing.append("pandoc")
+            result.diffs.append(("pandoc", unified("pandoc", golden_input, text, context)))
+        result.batch, batch_differ = batch_check(case.source, from_cache)
+        if batch_differ:
+            result.differing.append("batch")
+            result.diffs.append(("batch", f"--batch output differs from the CLI in {', '.join(batch_differ)}"))
+        current = run_stages(text)
+        if [name for name, _ in current] != [name for name, _ in golden]:
+            raise ValueError("the post-processing stages changed; run with --update")
+        for (name, output), (_, expected) in zip(current, golden):
+            if output != expected:
+                result.differing.append(name)
+                if all_stages or not result.diffs:
+                    result.diffs.append((name, unified(name, expected, output, context)))
+        result.status = "failed" if result.differing else "ok"
+    except Exception as exc:  # reported per case; the other cases still run
+        result.status = "error"
+        result.message = f"{type(exc).__name__}: {exc}"
+    result.duration = time.monotonic() - start
+    return result
+
+
+def update_case(case: Case, from_cache: bool) -> CaseResult:
+    """Write the golden files of `case` from the current pipeline."""
+    result = CaseResult(case.name, status="updated")
+    start = time.monotonic()
+    try:
+        text = pandoc_output(case, from_cache)
+        if text is None:
+            result.pandoc = f"not checked ({case.source.name} not found; keeping golden {INPUT_NAME})"
+            text = (case.golden / INPUT_NAME).read_text(encoding="utf-8")
+        stages = []
+        previous = text
+        for name, output in run_stages(text):
+            stages.append({"name": name, "sha256": sha256_text(output),
+                           "edits": edits(previous, output)})
+            previous = output
+        case.golden.mkdir(parents=True, exist_ok=True)
+        for filename, content in ((INPUT_NAME, text), (OUTPUT_NAME, previous),
+                                  (STAGES_NAME, json.dumps({"source": str(case.source.relative_to(SCRIPT_DIR)),
+                                                            "stages": stages},
+                                                           indent=1, ensure_ascii=False) + "\n")):
+            path = case.golden / filename
+            scratch = path.with_name(f".{path.name}.tmp")
+            scratch.write_text(content, encoding="utf-8")
+            os.replace(scratch, path)
+    except Exception as exc:
+        result.status = "error"
+        result.message = f"{type(exc).__name__}: {exc}"
+    result.duration = time.monotonic() - start
+    return result
+
+
+def print_result(result: CaseResult) -> None:
+    mark = {"ok": "✅", "updated": "🔄", "failed": "❌", "error": "❌"}[result.status]
+    print(f"{mark} {result.name} ({result.status}, {result.duration:.1f}s)")
+    if result.pandoc != "checked":
+        print(f"   ⚠️  pandoc {result.pandoc}")
+    if result.batch != "checked" and result.status != "updated":
+        print(f"   ⚠️  batch {result.batch}")
+    if result.message:
+        print(f"   {result.message}")
+    if result.differing:
+        print(f"   First difference: {result.differing[0]}"
+              + (f"; also differ: {', '.join(result.differing[1:])}" if result.differing[1:] else ""))
+    for _name, diff in result.diffs:
+        print("\n".join(f"   {line}" for line in diff.splitlines()))
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cases", nargs="*", help="case names (default: every fixture)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--from-cache", action="store_true",
+                        help="never run pandoc; fail cases that are not in the pandoc cache")
+    parser.add_argument("--all-stages", action="store_true",
+                        help="print the diff of every differing stage, not only the first")
+    parser.add_argument("--context", type=int, default=3, help="diff context lines")
+    parser.add_argument("--update", action="store_true", help="write the current output as golden")
+    parser.add_argument("--add", type=Path, metavar="DOCX", help="add a fixture case")
+    args = parser.parse_args(argv)
+
+    if args.add is not None:
+        source = args.add.resolve()
+        try:
+            line = str(source.relative_to(SCRIPT_DIR))
+        except ValueError:
+            print(f"❌ {source} is outside the repository", file=sys.stderr)
+            return 1
+        with open(FIXTURES, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        print(f"Added {source.stem}; run regression.py --update \"{source.stem}\"")
+        return 0
+
+    cases = read_fixtures()
+    if args.cases:
+        unknown = set(args.cases) - {case.name for case in cases}
+        if unknown:
+            print(f"❌ Unknown case(s): {', '.join(sorted(unknown))}", file=sys.stderr)
+            return 1
+        cases = [case for case in cases if case.name in args.cases]
+
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(cases) or 1))) as pool:
+        if args.update:
+            futures = [pool.submit(update_case, case, args.from_cache) for case in cases]
+        else:
+            futures = [pool.submit(check_case, case, args.from_cache, args.all_stages, args.context)
+                       for case in cases]
+        results = [future.result() for future in futures]
+    for result in results:
+        print_result(result)
+    bad = [r for r in results if r.status in ("failed", "error")]
+    batch_failed = False
+    if not args.update:
+        status, differ = batch_check(BATCH_FIXTURE, args.from_cache)
+        name = BATCH_FIXTURE.relative_to(SCRIPT_DIR)
+        if differ:
+            print(f"❌ {name}: --batch output differs from the CLI in {', '.join(differ)}")
+            batch_failed = True
+        elif status == "checked":
+            print(f"✅ {name}: --batch output matches the CLI")
+        else:
+            print(f"⚠️  {name}: batch {status}")
+    print("")
+    print(f"{len(results) - len(bad)}/{len(results)} case(s) "
+          f"{'updated' if args.update else 'match golden output'} in {time.monotonic() - start:.1f}s")
+    return 1 if bad or batch_failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""Compile the declarative substitution rules in rules/ into a few passes.
+
+Rules live in rules/base.yml and rules/products/*.yml (see base.yml for the
+format). Each top-level key is a slot: postprocess.py runs one slot at a
+point in its stage order. Within a slot the rules are compiled once into
+passes:
+
+* literal rules share one multi-pattern scan (a single alternation of the
+  escaped literals, longest first, resolved with a dict lookup);
+* regex rules share one alternation pass, each rule in its own named group
+  with its own flags;
+* `until` rules, which only apply to the top of the document, get their own
+  pass.
+
+A rule only joins an earlier pass when it cannot interfere with any rule it
+would move past: neither rule's pattern may match the other's literal or
+replacement text, and it must not depend on them through `after`. Rules
+whose matches could overlap in some other way need an explicit `after`;
+`rule_engine.py --check FILE` compares the compiled passes with running the
+rules one by one and reports any difference.
+
+Every rule counts how many times it fired (RuleSet.counts; postprocess.py
+clears them at the start of each document).
+
+Product rule files are not selected per manual: every file in
+rules/products/ applies to every manual, as the sed commands they replace
+did. A product rule is guarded by its own pattern (a product title such
+as `## ... Alarm Panel`, a sentence from that product's manual); one whose
+pattern other manuals can match as well, such as features-heading, applies
+to them too.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import yaml
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+RULES_DIR = SCRIPT_DIR / "rules"
+
+FLAG_LETTERS = {"m": re.MULTILINE, "s": re.DOTALL, "i": re.IGNORECASE}
+GROUP_REF_RE = re.compile(r"\\(\d+)|\\g<(\d+)>")
+
+
+class RuleError(ValueError):
+    """A rule file is malformed."""
+
+
+@dataclass
+class Rule:
+    id: str
+    pattern: str
+    replace: str
+    literal: bool = False
+    flags: str = ""
+    until: Optional[str] = None
+    after: List[str] = field(default_factory=list)
+    source: str = ""
+
+    def __post_init__(self) -> None:
+        if self.literal:
+            self.regex = re.compile(re.escape(self.pattern))
+        else:
+            self.regex = re.compile(self.pattern, self._flag_bits())
+            if self.regex.groupindex:
+                raise RuleError(f"{self.source}: rule {self.id!r} uses named groups")
+        self.until_re = re.compile(self.until, re.M) if self.until else None
+
+    def _flag_bits(self) -> int:
+        bits = 0
+        for letter in self.flags:
+            if letter not in FLAG_LETTERS:
+                raise RuleError(f"{self.source}: rule {self.id!r} has unknown flag {letter!r}")
+            bits |= FLAG_LETTERS[letter]
+        return bits
+
+    @property
+    def output_text(self) -> str:
+        """Replacement text with group references removed."""
+        return self.replace if self.literal else GROUP_REF_RE.sub("", self.replace)
+
+    def apply(self, text: str) -> "tuple[str, int]":
+        """Run this rule on its own (reference semantics for --check)."""
+        if self.literal:
+            return text.replace(self.pattern, self.replace), text.count(self.pattern)
+        return self.regex.subn(self.replace, text)
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """True if `a` and `b` can overlap when placed next to each other."""
+    if not a or not b:
+        return False
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:i]) or b.endswith(a[:i]) for i in range(1, min(len(a), len(b))))
+
+
+def interferes(a: Rule, b: Rule) -> bool:
+    """True if running `a` and `b` in one pass could differ from running them in order."""
+    if a.id in b.after or b.id in a.after:
+        return True
+    if a.literal and b.literal:
+        return (
+            _overlaps(a.pattern, b.pattern)
+            or _overlaps(a.replace, b.pattern)
+            or _overlaps(b.replace, a.pattern)
+        )
+    for x, y in ((a, b), (b, a)):
+        if x.regex.search(y.output_text):
+            return True
+        if y.literal and x.regex.search(y.pattern):
+            return True
+    return False
+
+
+class Pass:
+    """A group of rules applied in a single scan of the document."""
+
+    def __init__(self, kind: str, rules: Optional[List[Rule]] = None):
+        self.kind = kind
+        self.rules: List[Rule] = rules or []
+        self._regex: Optional[re.Pattern[str]] = None
+
+    def accepts(self, rule: Rule) -> bool:
+        return self.kind == _kind(rule) and self.kind != "scoped"
+
+    def compile(self) -> None:
+        if self.kind == "literal":
+            self._by_literal = {rule.pattern: rule for rule in self.rules}
+            literals = sorted(self._by_literal, key=len, reverse=True)
+            self._regex = re.compile("|".join(re.escape(lit) for lit in literals))
+        elif self.kind == "regex":
+            parts = []
+            self._templates: Dict[str, "tuple[Rule, str]"] = {}
+            group = 1
+            for i, rule in enumerate(self.rules):
+                name = f"r{i}"
+                offset = group
+                parts.append(f"(?P<{name}>{_scoped(rule)})")
+                group += 1 + rule.regex.groups
+                template = GROUP_REF_RE.sub(
+                    lambda m, o=offset, n=name: (
+                        f"\\g<{n}>" if int(m.group(1) or m.group(2)) == 0
+                        else f"\\g<{o + int(m.group(1) or m.group(2))}>"
+                    ),
+                    rule.replace,
+                )
+                self._templates[name] = (rule, template)
+            self._regex = re.compile("|".join(parts))
+        else:
+            (rule,) = self.rules
+            self._regex = rule.regex
+
+    def apply(self, text: str, counts: Counter) -> str:
+        if self._regex is None:
+            self.compile()
+        if self.kind == "literal":
+            def replace_literal(match: re.Match[str]) -> str:
+                rule = self._by_literal[match.group(0)]
+                counts[rule.id] += 1
+                return rule.replace
+
+            return self._regex.sub(replace_literal, text)
+
+        if self.kind == "regex":
+            def replace_regex(match: re.Match[str]) -> str:
+                rule, template = self._templates[match.lastgroup]
+                counts[rule.id] += 1
+                return match.expand(template)
+
+            return self._regex.sub(replace_regex, text)
+
+        rule = self.rules[0]
+        end = len(text)
+        first_break = text.find("\n")
+        if first_break != -1:
+            # Same range as sed's `1,/re/`: the end is looked for from line 2
+            stop = rule.until_re.search(text, first_break + 1)
+            if stop:
+                line_end = text.find("\n", stop.start())
+                end = len(text) if line_end == -1 else line_end
+        head, n = rule.regex.subn(rule.replace, text[:end])
+        counts[rule.id] += n
+        return head + text[end:]
+
+    def describe(self) -> str:
+        return f"{self.kind}: " + ", ".join(rule.id for rule in self.rules)
+
+
+def _kind(rule: Rule) -> str:
+    if rule.until:
+        return "scoped"
+    return "literal" if rule.literal else "regex"
+
+
+def _scoped(rule: Rule) -> str:
+    """Pattern with the rule's flags attached, for use inside an alternation."""
+    return f"(?{rule.flags}:{rule.pattern})" if rule.flags else f"(?:{rule.pattern})"
+
+
+def compile_passes(rules: Iterable[Rule]) -> List[Pass]:
+    """Group ordered rules into as few passes as interference allows."""
+    passes: List[Pass] = []
+    for rule in rules:
+        target = None
+        for candidate in reversed(passes):
+            if any(interferes(rule, other) for other in candidate.rules):
+                break
+            if candidate.accepts(rule):
+                target = candidate
+        if target is None:
+            target = Pass(_kind(rule))
+            passes.append(target)
+        target.rules.append(rule)
+    for p in passes:
+        p.compile()
+    return passes
+
+
+def load_rule_file(path: Path) -> Dict[str, List[Rule]]:
+    data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+    if not isinstance(data, dict):
+        raise RuleError(f"{path}: expected a mapping of slot -> rules")
+    slots: Dict[str, List[Rule]] = {}
+    for slot, entries in data.items():
+        rules = []
+        for entry in entries or []:
+            if "id" not in entry or "replace" not in entry:
+                raise RuleError(f"{path}: every rule needs `id` and `replace`: {entry!r}")
+            if ("literal" in entry) == ("regex" in entry):
+                raise RuleError(f"{path}: rule {entry['id']!r} needs exactly one of literal/regex")
+            rules.append(
+                Rule(
+                    id=entry["id"],
+                    pattern=entry.get("literal", entry.get("regex")),
+                    replace=entry["replace"],
+                    literal="literal" in entry,
+                    flags=entry.get("flags", ""),
+                    until=entry.get("until"),
+                    after=list(entry.get("after", [])),
+                    source=str(path),
+                )
+            )
+        slots[slot] = rules
+    return slots
+
+
+def rule_files(rules_dir: Path = RULES_DIR) -> List[Path]:
+    """base.yml first, then product rule files in name order.
+
+    All of them apply to every manual; product rules are guarded by their
+    own patterns, not by file.
+    """
+    return [rules_dir / "base.yml"] + sorted((rules_dir / "products").glob("*.yml"))
+
+
+class RuleSet:
+    """All rules, compiled per slot."""
+
+    def __init__(self, slots: Dict[str, List[Rule]]):
+        self.rules = slots
+        self.passes = {slot: compile_passes(rules) for slot, rules in slots.items()}
+        self.counts: Counter = Counter()
+
+    @classmethod
+    def load(cls, paths: Optional[Iterable[Path]] = None) -> "RuleSet":
+        slots: Dict[str, List[Rule]] = {}
+        seen: Dict[str, str] = {}
+        for path in paths or rule_files():
+            for slot, rules in load_rule_file(path).items():
+                for rule in rules:
+                    if rule.id in seen:
+                        raise RuleError(f"{path}: duplicate rule id {rule.id!r} (also in {seen[rule.id]})")
+                    seen[rule.id] = str(path)
+                slots.setdefault(slot, []).extend(rules)
+        return cls(slots)
+
+    def apply(self, slot: str, text: str) -> str:
+        """Run every pass of `slot` over the text, counting rule hits."""
+        for p in self.passes.get(slot, []):
+            text = p.apply(text, self.counts)
+        return text
+
+    def apply_sequential(self, slot: str, text: str) -> "tuple[str, Counter]":
+        """Run the rules of `slot` one by one, in file order."""
+        counts: Counter = Counter()
+        for rule in self.rules.get(slot, []):
+            if rule.until:
+                p = Pass("scoped", [rule])
+                text = p.apply(text, counts)
+            else:
+                text, n = rule.apply(text)
+                counts[rule.id] += n
+        return text, counts
+
+
+def main(argv: List[str]) -> int:
+    rules = RuleSet.load()
+    if not argv or argv[0] == "--list":
+        for slot, passes in rules.passes.items():
+            n_rules = len(rules.rules[slot])
+            print(f"{slot}: {n_rules} rules in {len(passes)} passes")
+            for p in passes:
+                print(f"  {p.describe()}")
+        return 0
+
+    if argv[0] == "--check" and len(argv) == 2:
+        text = Path(argv[1]).read_text(encoding="utf-8")
+        status = 0
+        for slot in rules.passes:
+            expected, _ = rules.apply_sequential(slot, text)
+            if rules.apply(slot, text) != expected:
+                print(f"{slot}: compiled passes differ from sequential rules")
+                status = 1
+        for rule_id, n in sorted(rules.counts.items()):
+            print(f"{rule_id}: {n}")
+        return status
+
+    print("Usage: rule_engine.py [--list | --check <markdown-file>]", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,94 @@
+"""MkDocs hook: index the converted manuals from their stored search entries.
+
+The `search` plugin renders and re-splits the text of every page on every
+`mkdocs build` and every `mkdocs serve` rebuild. Each conversion already
+wrote the manual's entries to <manual>/.search-index.json (search_index.py);
+with this hook the plugin takes a manual page's entries from there instead
+of parsing the page:
+
+    hooks:
+      - search_hook.py      # path relative to mkdocs.yml
+
+A page is taken from the stored entries only if the file's key still
+matches (same pages, same markdown extensions and search settings in the
+site's mkdocs.yml); pages of other manuals and every page outside the
+manuals are indexed by the plugin as before. Works with MkDocs' search
+plugin and with Material's.
+"""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from mkdocs.plugins import event_priority
+
+import search_index
+
+log = logging.getLogger(f"mkdocs.hooks.{__name__}")
+
+# The site's search settings and markdown extensions (search_index.site_config)
+_site_config: dict = {}
+# Manual folder -> its stored entries (None: missing or out of date), per build
+_manuals: Dict[Path, Optional[dict]] = {}
+_stats = {"stored": 0, "parsed": 0}
+
+
+def _stored_entries(page) -> Optional[List[dict]]:
+    """The page's entries from its manual's .search-index.json, with site locations."""
+    source = Path(page.file.abs_src_path)
+    manual_dir = source.parent
+    if not (manual_dir / search_index.INDEX_NAME).is_file():
+        return None
+    if manual_dir not in _manuals:
+        _manuals[manual_dir] = search_index.load(manual_dir, _site_config)
+    data = _manuals[manual_dir]
+    if data is None:
+        return None
+    url = search_index.page_url(source.name)
+    entries = [entry for entry in data["docs"] if entry["location"].split("#", 1)[0] == url]
+    if not entries:
+        return None
+    # The page entry is titled as the plugin titles it
+    return [dict(entry, location=page.url + entry["location"][len(url):],
+                 title=page.title if entry["location"] == url else entry["title"])
+            for entry in entries]
+
+
+# After the search plugin's on_pre_build, which creates its index
+@event_priority(-100)
+def on_pre_build(config, **kwargs) -> None:
+    global _site_config
+    plugin = config.plugins.get("search") or config.plugins.get("material/search")
+    index = getattr(plugin, "search_index", None)
+    if index is None:
+        log.warning("No search plugin index found; manuals are indexed by the plugin")
+        return
+    _site_config = search_index.site_config(Path(config.config_file_path or search_index.MKDOCS_CONFIG))
+    _manuals.clear()
+    _stats.update(stored=0, parsed=0)
+    # `_entries` in MkDocs' search plugin, `entries` in Material's
+    entries = next((value for value in (getattr(index, "entries", None),
+                                        getattr(index, "_entries", None))
+                    if isinstance(value, list)), None)
+    if entries is None:
+        log.warning("The search plugin's index has no entry list; manuals are indexed by the plugin")
+        return
+    parse = index.add_entry_from_context
+
+    def add_entry_from_context(page) -> None:
+        stored = _stored_entries(page)
+        if stored is None:
+            _stats["parsed"] += 1
+            parse(page)
+        else:
+            _stats["stored"] += 1
+            entries.extend(stored)
+
+    index.add_entry_from_context = add_entry_from_context
+
+
+def on_post_build(config, **kwargs) -> None:
+    log.info(f"Search index: {_stats['stored']} page(s) from stored manual entries, "
+             f"{_stats['parsed']} parsed")
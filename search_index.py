@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""Per-manual MkDocs search index entries, built when a manual is converted.
+
+The `search` plugin re-reads and re-splits the text of every page on every
+`mkdocs build`/`serve`, although a conversion changes one manual at a
+time. This stage produces a manual's entries once, when it is converted,
+and search_hook.py (an MkDocs hook in mkdocs.yml) hands them to the search
+plugin in place of its own indexing of the manual's pages.
+
+* Each page of the manual (index.md, or the chapter pages of a split, see
+  chapters.py) is rendered with Python-Markdown and the
+  `markdown_extensions` of mkdocs.yml, and cut into one entry for the page
+  and one per heading section by MkDocs' own search parser, as the search
+  plugin does with `indexing: full`.
+* The entries are written to <manual>/.search-index.json with locations
+  relative to the manual and the key they were built for: the SHA-256 of
+  the pages, the markdown extensions and the search settings (lang,
+  separator) of mkdocs.yml. The entries are normalized as the plugin
+  stores them, so a stored manual indexes exactly as a parsed one.
+* The hook uses a manual's file only while its key matches the site's
+  mkdocs.yml and the pages on disk; otherwise the plugin indexes the pages
+  itself.
+* publish.sh publishes the file (and .nav.yml, which lists the pages) with
+  the manual and installs the hook in the docs repository, so the site
+  build uses the entries too, not only preview.sh.
+
+Needs mkdocs and Markdown (requirements.txt); without them the stage prints
+a warning and writes nothing.
+
+    search_index.py build <manual-dir>
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+import chapters
+
+try:
+    import markdown
+    from mkdocs.contrib.search.search_index import ContentParser
+except ImportError:  # the stage is skipped, see build()
+    markdown = None
+    ContentParser = None
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+MKDOCS_CONFIG = SCRIPT_DIR / "mkdocs.yml"
+INDEX_NAME = ".search-index.json"
+INDEX_VERSION = 2
+BUILTIN_EXTENSIONS = ["toc", "tables", "fenced_code"]
+WHITESPACE_RE = re.compile(r"[ \t\n\r\f\v]+")
+# The search plugin's defaults (mkdocs.contrib.search)
+DEFAULT_SEARCH = {"lang": ["en"], "separator": r"[\s\-]+", "min_search_length": 3,
+                  "prebuild_index": False, "indexing": "full"}
+
+
+class _ConfigLoader(yaml.SafeLoader):
+    """SafeLoader that reads MkDocs' !!python/name and !ENV tags as plain values."""
+
+
+_ConfigLoader.add_multi_constructor("", lambda loader, suffix, node: None)
+
+
+def site_config(path: Path = MKDOCS_CONFIG) -> dict:
+    """Search settings and markdown extensions of mkdocs.yml."""
+    data = yaml.load(path.read_text(encoding="utf-8"), Loader=_ConfigLoader) or {}
+    search = dict(DEFAULT_SEARCH)
+    for plugin in data.get("plugins") or []:
+        if isinstance(plugin, dict) and "search" in plugin:
+            search.update(plugin["search"] or {})
+    if isinstance(search["lang"], str):
+        search["lang"] = [search["lang"]]
+    extensions: List[str] = []
+    extension_configs: Dict[str, dict] = {}
+    for entry in data.get("markdown_extensions") or []:
+        if isinstance(entry, dict):
+            for name, options in entry.items():
+                extensions.append(name)
+                extension_configs[name] = options or {}
+        else:
+            extensions.append(entry)
+    # MkDocs always loads these before the configured ones
+    extensions = [name for name in BUILTIN_EXTENSIONS if name not in extensions] + extensions
+    return {"search": search, "extensions": extensions, "extension_configs": extension_configs}
+
+
+def pages(manual_dir: Path) -> List[Tuple[str, str]]:
+    """(title, file) of every page of the manual, in order."""
+    return chapters.read_nav(manual_dir) or [(manual_dir.name, chapters.INDEX_NAME)]
+
+
+def page_url(name: str) -> str:
+    """URL of a page relative to the manual, as MkDocs' directory URLs make it."""
+    return "" if name == chapters.INDEX_NAME else f"{Path(name).stem}/"
+
+
+def cache_key(manual_dir: Path, config: dict) -> str:
+    digest = hashlib.sha256(f"{INDEX_VERSION}\n".encode())
+    digest.update(json.dumps([config["search"], config["extensions"],
+                              config["extension_configs"]], sort_keys=True).encode())
+    # Not the titles: the intro's is the folder name, which publishing
+    # changes, and the hook titles the pages as MkDocs does anyway
+    for _title, name in pages(manual_dir):
+        digest.update(f"\n{name}\n".encode())
+        digest.update((manual_dir / name).read_bytes())
+    return digest.hexdigest()
+
+
+def entry(location: str, title: str, text: str) -> dict:
+    """An entry as the search plugin stores it (SearchIndex._add_entry)."""
+    text = WHITESPACE_RE.sub(" ", text.replace("\u00a0", " ").strip())
+    return {"title": title, "text": text, "location": location}
+
+
+def markdown_renderer(config: dict) -> "markdown.Markdown":
+    """One Markdown instance with every extension of mkdocs.yml that is installed."""
+    usable = []
+    for name in config["extensions"]:
+        try:
+            markdown.Markdown(extensions=[name],
+                              extension_configs={name: config["extension_configs"].get(name, {})})
+        except (ImportError, AttributeError, TypeError, KeyError) as exc:
+            print(f"⚠️  Markdown extension {name} not usable ({exc}); indexing without it",
+                  file=sys.stderr)
+            continue
+        usable.append(name)
+    return markdown.Markdown(extensions=usable,
+                             extension_configs={name: config["extension_configs"].get(name, {})
+                                                for name in usable})
+
+
+def toc_titles(tokens: List[dict], titles: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    titles = {} if titles is None else titles
+    for token in tokens:
+        titles[token["id"]] = html.unescape(token["name"])
+        toc_titles(token.get("children", []), titles)
+    return titles
+
+
+def index_page(renderer: "markdown.Markdown", text: str, url: str, title: str) -> List[dict]:
+    """The page entry and one entry per heading section, as the search plugin makes them."""
+    renderer.reset()
+    content = renderer.convert(text)
+    titles = toc_titles(getattr(renderer, "toc_tokens", []))
+    parser = ContentParser()
+    parser.feed(content)
+    parser.close()
+    entries = [entry(url, title, parser.stripped_html.rstrip("\n"))]
+    for section in parser.data:
+        if section.id in titles:
+            entries.append(entry(f"{url}#{section.id}", titles[section.id], " ".join(section.text)))
+    return entries
+
+
+def build(manual_dir: Path, config: Optional[dict] = None) -> Optional[dict]:
+    """Write <manual>/.search-index.json; None if mkdocs/Markdown are not installed."""
+    if ContentParser is None:
+        return None
+    config = config or site_config()
+    renderer = markdown_renderer(config)
+    docs: List[dict] = []
+    for title, name in pages(manual_dir):
+        text = (manual_dir / name).read_text(encoding="utf-8")
+        docs.extend(index_page(renderer, text, page_url(name), title))
+    data = {"version": INDEX_VERSION, "key": cache_key(manual_dir, config), "docs": docs}
+    path = manual_dir / INDEX_NAME
+    scratch = path.with_name(f".{path.name}.tmp")
+    scratch.write_text(json.dumps(data, ensure_ascii=False) + "\n", encoding="utf-8")
+    os.replace(scratch, path)
+    return data
+
+
+def load(manual_dir: Path, config: dict) -> Optional[dict]:
+    """The manual's entries if they were built from its current pages and settings."""
+    try:
+        data = json.loads((manual_dir / INDEX_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != INDEX_VERSION or data.get("key") != cache_key(manual_dir, config):
+        return None
+    return data
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("build")
+    p.add_argument("manual_dir", type=Path)
+    args = parser.parse_args(argv)
+
+    if ContentParser is None:
+        print("⚠️  mkdocs not installed (pip install -r requirements.txt): "
+              "search index not built", file=sys.stderr)
+        return 0
+    data = build(args.manual_dir)
+    print(f"Search index: {len(data['docs'])} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
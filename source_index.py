@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Cached index of the manuals on the product share.
+
+find-latest-manual.sh used to list `<product>/_EN/*.docx` on the share
+(/Volumes/TRIKDIS/PRODUKTAI, over SMB) for every product, every time. This
+walks the product tree once and keeps what it found in
+.cache/sources/<root-hash>.json:
+
+* for every folder it read (the root and each product's `_EN` folder):
+  its mtime and the entries it used;
+* for every .docx in an `_EN` folder: size, mtime and SHA-256.
+
+Product folders are read in parallel (-j). On the next scan a folder whose
+mtime is unchanged is not listed again and its files are not stat()ed;
+only changed folders are read, and only files whose size or mtime changed
+are hashed again. Word lock files (`~$...`) and `Archyvas` (archive)
+folders are skipped, as before. Word saves a document by renaming a new
+file into place, which updates the folder's mtime; --full reads every
+folder and stats every file again, for files changed in place or shares
+that do not update folder mtimes.
+
+`scan` prints the manuals that are new or changed since the previous scan,
+the latest (by name: ..._YYYY MM DD.docx) of each product only, one per
+line, ready for the batch converter:
+
+    source_index.py scan [--root DIR] [-j N] [--full] [--all] [-0]
+    source_index.py scan -0 | xargs -0 ./convert-batch.sh
+    source_index.py latest <product-dir>         # What find-latest-manual.sh prints
+
+--root defaults to $PRODUCT_ROOT or /Volumes/TRIKDIS/PRODUKTAI; any local
+folder with the same layout works. --all prints the latest manual of every
+product, changed or not.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import build_cache
+
+DEFAULT_ROOT = Path(os.environ.get("PRODUCT_ROOT", "/Volumes/TRIKDIS/PRODUKTAI"))
+INDEX_DIR = build_cache.CACHE_ROOT / "sources"
+INDEX_VERSION = 1
+MANUALS_DIR = "_EN"
+ARCHIVE_DIR = "Archyvas"
+
+
+def index_path(root: Path) -> Path:
+    digest = hashlib.sha256(str(root).encode("utf-8")).hexdigest()[:16]
+    return INDEX_DIR / f"{digest}.json"
+
+
+def load(root: Path) -> dict:
+    try:
+        data = json.loads(index_path(root).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        data = {}
+    if data.get("version") != INDEX_VERSION or data.get("root") != str(root):
+        data = {"version": INDEX_VERSION, "root": str(root)}
+    data.setdefault("dirs", {})
+    data.setdefault("files", {})
+    return data
+
+
+def save(root: Path, data: dict) -> None:
+    path = index_path(root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    scratch = path.with_name(f".{path.name}.tmp")
+    scratch.write_text(json.dumps(data, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(scratch, path)
+
+
+def skipped(name: str) -> bool:
+    return name.startswith(("~$", ".")) or name.lower() == ARCHIVE_DIR.lower()
+
+
+def read_dir(path: Path, previous: Optional[dict], full: bool,
+             want_dirs: bool) -> Tuple[Optional[dict], bool]:
+    """(entry, listed again) for a folder: its mtime and the sub-folders or .docx names in it."""
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except OSError:
+        return None, True
+    if previous and previous.get("mtime_ns") == mtime_ns and not full:
+        return previous, False
+    names = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if skipped(entry.name):
+                continue
+            if want_dirs and entry.is_dir():
+                names.append(entry.name)
+            elif not want_dirs and entry.name.lower().endswith(".docx") and entry.is_file():
+                names.append(entry.name)
+    return {"mtime_ns": mtime_ns, "entries": sorted(names)}, True
+
+
+def scan_product(root: Path, product: str, dirs: Dict[str, dict], files: Dict[str, dict],
+                 full: bool) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """Folder and file records of one product's _EN folder."""
+    rel_dir = f"{product}/{MANUALS_DIR}"
+    entry, listed = read_dir(root / rel_dir, dirs.get(rel_dir), full, want_dirs=False)
+    if entry is None:
+        return {}, {}
+    found: Dict[str, dict] = {}
+    for name in entry["entries"]:
+        rel = f"{rel_dir}/{name}"
+        previous = files.get(rel)
+        if not listed and previous is not None:
+            found[rel] = previous
+            continue
+        try:
+            st = (root / rel).stat()
+        except OSError:
+            continue
+        if previous and (previous["size"], previous["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            found[rel] = previous
+        else:
+            found[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                          "sha256": build_cache.sha256_file(root / rel)}
+    return {rel_dir: entry}, found
+
+
+def scan(root: Path, data: dict, products: Optional[List[str]] = None, jobs: int = 8,
+         full: bool = False) -> List[str]:
+    """Bring `data` up to date with the share; returns the files that are new or changed."""
+    dirs, files = data["dirs"], data["files"]
+    whole_share = products is None
+    if whole_share:
+        entry, _ = read_dir(root, dirs.get(""), full, want_dirs=True)
+        if entry is None:
+            raise FileNotFoundError(f"{root} not found")
+        dirs[""] = entry
+        products = entry["entries"]
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        results = list(pool.map(lambda product: scan_product(root, product, dirs, files, full),
+                                products))
+
+    changed = []
+    for product, (product_dirs, found) in zip(products, results):
+        prefix = f"{product}/"
+        for rel in [rel for rel in files if rel.startswith(prefix)]:
+            if rel not in found:
+                del files[rel]
+        for rel in [rel for rel in dirs if rel.startswith(prefix)]:
+            if rel not in product_dirs:
+                del dirs[rel]
+        for rel, record in found.items():
+            if files.get(rel, {}).get("sha256") != record["sha256"]:
+                changed.append(rel)
+            files[rel] = record
+        dirs.update(product_dirs)
+    if whole_share:
+        # Products that are no longer on the share
+        current = set(dirs[""]["entries"])
+        for table in (dirs, files):
+            for rel in [rel for rel in table if rel and rel.split("/", 1)[0] not in current]:
+                del table[rel]
+    return sorted(changed)
+
+
+def latest(files: Dict[str, dict]) -> Dict[str, str]:
+    """Latest manual of each product, by file name (names end in the date)."""
+    newest: Dict[str, str] = {}
+    for rel in files:
+        product = rel.split("/", 1)[0]
+        if product not in newest or Path(rel).name > Path(newest[product]).name:
+            newest[product] = rel
+    return newest
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("scan")
+    p.add_argument("--root", type=Path, default=DEFAULT_ROOT)
+    p.add_argument("-j", "--jobs", type=int, default=8, help="product folders read at once")
+    p.add_argument("--full", action="store_true", help="list every folder, even if unchanged")
+    p.add_argument("--all", action="store_true", help="print every product's latest manual")
+    p.add_argument("-0", "--print0", action="store_true", help="end paths with NUL, for xargs -0")
+    p = commands.add_parser("latest")
+    p.add_argument("product_dir", type=Path)
+    p.add_argument("--full", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "latest":
+        product_dir = args.product_dir.resolve()
+        root, product = product_dir.parent, product_dir.name
+        data = load(root)
+        scan(root, data, [product], jobs=1, full=args.full)
+        save(root, data)
+        newest = latest(data["files"]).get(product)
+        if newest is not None:
+            print(root / newest)
+        return 0
+
+    root = args.root.resolve()
+    if not root.is_dir():
+        print(f"❌ {root} not found", file=sys.stderr)
+        return 1
+    data = load(root)
+    changed = set(scan(root, data, jobs=args.jobs, full=args.full))
+    save(root, data)
+    newest = latest(data["files"])
+    picked = [rel for _, rel in sorted(newest.items()) if args.all or rel in changed]
+    end = "\0" if args.print0 else "\n"
+    for rel in picked:
+        sys.stdout.write(f"{root / rel}{end}")
+    print(f"{len(newest)} product(s), {len(data['files'])} manual(s), "
+          f"{len(picked)} {'latest' if args.all else 'new or changed'}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
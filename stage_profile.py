@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Per-stage timing and memory reports for conversions.
+
+`convert-single.sh --profile` writes docs/manuals/<name>/.profile.json:
+
+    {
+      "manual": "GT+ UM_ENG_2025 09 11",
+      "source": ".../GT+ UM_ENG_2025 09 11.docx",
+      "wall_s": 14.2,
+      "stages": [
+        {"name": "pandoc", "wall_s": 9.8, "cpu_s": 9.5, "peak_rss_kib": 412000,
+         "input_bytes": 3456789, "output_bytes": 2901234, "counts": {}},
+        {"name": "postprocess/tables", "wall_s": 0.04, "cpu_s": 0.04,
+         "input_bytes": 80123, "output_bytes": 61234,
+         "counts": {"tables_converted": 10, "rowspans_flattened": 31}},
+        ...
+      ],
+      "counts": {"tables_converted": 10, ...}
+    }
+
+Each step of convert-single.sh runs under `stage_profile.py run`, which
+measures the wall and CPU time and the peak RSS of the step's process and
+the sizes of its input and output. Stages that run in Python add their own
+detail through PIPELINE_PROFILE (the report path): postprocess.py one entry
+per post-processing stage, image_stage.py the images per outcome. Entries
+with the same name are merged.
+
+batch.py --profile collects the reports of a run and prints the slowest
+manuals and stages (`aggregate`).
+
+    stage_profile.py start <report> <input.docx>
+    stage_profile.py run <report> <stage> [--input PATH]... [--output PATH]... -- <command>...
+    stage_profile.py finish <report>
+    stage_profile.py summary <report>...
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+REPORT_NAME = ".profile.json"
+ENV_VAR = "PIPELINE_PROFILE"
+
+
+def report_path() -> Optional[Path]:
+    """The report the current conversion writes to, if profiling is on."""
+    value = os.environ.get(ENV_VAR)
+    return Path(value) if value else None
+
+
+def size_of(paths: Iterable[Path]) -> int:
+    total = 0
+    for path in paths:
+        if path.is_dir():
+            total += sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+        elif path.is_file():
+            total += path.stat().st_size
+    return total
+
+
+def load(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {"stages": []}
+
+
+def save(path: Path, report: dict) -> None:
+    scratch = path.with_name(f".{path.name}.tmp")
+    scratch.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    os.replace(scratch, path)
+
+
+def record(name: str, path: Optional[Path] = None, **fields) -> None:
+    """Add `fields` to the stage entry `name`; counts are added up."""
+    path = path or report_path()
+    if path is None:
+        return
+    report = load(path)
+    stages = report.setdefault("stages", [])
+    entry = next((s for s in stages if s["name"] == name), None)
+    if entry is None:
+        entry = {"name": name}
+        stages.append(entry)
+    counts = fields.pop("counts", None)
+    entry.update(fields)
+    if counts:
+        merged = entry.setdefault("counts", {})
+        for key, value in counts.items():
+            merged[key] = merged.get(key, 0) + value
+    save(path, report)
+
+
+class Timer:
+    """Wall and CPU time of a block of Python code."""
+
+    def __enter__(self) -> "Timer":
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.wall_s = round(time.perf_counter() - self.wall, 6)
+        self.cpu_s = round(time.process_time() - self.cpu, 6)
+
+
+def run(report: Path, name: str, command: List[str], inputs: List[Path],
+        outputs: List[Path]) -> int:
+    """Run one pipeline step and record its wall/CPU time, peak RSS and sizes."""
+    input_bytes = size_of(inputs)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    returncode = subprocess.call(command, env=dict(os.environ, **{ENV_VAR: str(report)}))
+    wall = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    # ru_maxrss is in KiB on Linux (bytes on macOS)
+    scale = 1024 if sys.platform == "darwin" else 1
+    record(name, report, wall_s=round(wall, 6), cpu_s=round(cpu, 6),
+           peak_rss_kib=after.ru_maxrss // scale,
+           input_bytes=input_bytes, output_bytes=size_of(outputs),
+           returncode=returncode)
+    return returncode
+
+
+def start(report: Path, source: Path) -> None:
+    report.parent.mkdir(parents=True, exist_ok=True)
+    save(report, {"manual": source.stem, "source": str(source),
+                  "started": time.time(), "stages": []})
+
+
+def finish(report: Path) -> dict:
+    data = load(report)
+    data["wall_s"] = round(time.time() - data.pop("started", time.time()), 6)
+    totals: Dict[str, int] = {}
+    for stage in data["stages"]:
+        for key, value in stage.get("counts", {}).items():
+            totals[key] = totals.get(key, 0) + value
+    data["counts"] = totals
+    save(report, data)
+    return data
+
+
+def top_level(stages: List[dict]) -> List[dict]:
+    """Stages run by convert-single.sh (postprocess sub-stages are "postprocess/<name>")."""
+    return [s for s in stages if "/" not in s["name"]]
+
+
+def aggregate(reports: List[dict]) -> dict:
+    """Totals per stage and per manual over the reports of a batch run."""
+    stages: Dict[str, Dict[str, float]] = {}
+    counts: Dict[str, int] = {}
+    manuals = []
+    for report in reports:
+        for stage in report.get("stages", []):
+            total = stages.setdefault(stage["name"], {"wall_s": 0.0, "cpu_s": 0.0,
+                                                      "peak_rss_kib": 0, "manuals": 0})
+            total["wall_s"] += stage.get("wall_s", 0.0)
+            total["cpu_s"] += stage.get("cpu_s", 0.0)
+            total["peak_rss_kib"] = max(total["peak_rss_kib"], stage.get("peak_rss_kib", 0))
+            total["manuals"] += 1
+        for key, value in report.get("counts", {}).items():
+            counts[key] = counts.get(key, 0) + value
+        slowest = max(top_level(report.get("stages", [])), key=lambda s: s.get("wall_s", 0.0),
+                      default={"name": "-"})
+        manuals.append({"manual": report.get("manual"), "wall_s": report.get("wall_s", 0.0),
+                        "slowest_stage": slowest["name"]})
+    manuals.sort(key=lambda m: m["wall_s"], reverse=True)
+    return {"manuals": manuals, "stages": stages, "counts": counts}
+
+
+def print_summary(summary: dict, limit: int = 10) -> None:
+    print("")
+    print(f"{'Stage':<28} {'wall':>9} {'cpu':>9} {'peak MiB':>9}")
+    ordered = sorted(summary["stages"].items(), key=lambda item: item[1]["wall_s"], reverse=True)
+    for name, total in ordered:
+        rss = f"{total['peak_rss_kib'] / 1024:9.1f}" if total["peak_rss_kib"] else f"{'':>9}"
+        print(f"{name:<28} {total['wall_s']:8.2f}s {total['cpu_s']:8.2f}s {rss}")
+    print("")
+    print(f"{'Slowest manuals':<40} {'wall':>9}  slowest stage")
+    for manual in summary["manuals"][:limit]:
+        print(f"{str(manual['manual']):<40} {manual['wall_s']:8.2f}s  {manual['slowest_stage']}")
+    if summary["counts"]:
+        print("")
+        print(", ".join(f"{key}: {value}" for key, value in sorted(summary["counts"].items())))
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("start")
+    p.add_argument("report", type=Path)
+    p.add_argument("source", type=Path)
+    p = commands.add_parser("run")
+    p.add_argument("report", type=Path)
+    p.add_argument("stage")
+    p.add_argument("--input", type=Path, action="append", default=[])
+    p.add_argument("--output", type=Path, action="append", default=[])
+    p = commands.add_parser("finish")
+    p.add_argument("report", type=Path)
+    p = commands.add_parser("summary")
+    p.add_argument("reports", type=Path, nargs="+")
+    command: List[str] = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, command = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    if args.command == "start":
+        start(args.report.resolve(), args.source)
+    elif args.command == "run":
+        if not command:
+            parser.error("run: missing command after --")
+        return run(args.report.resolve(), args.stage, command, args.input, args.output)
+    elif args.command == "finish":
+        data = finish(args.report)
+        print(f"⏱  Profile: {args.report} ({data['wall_s']:.1f}s)")
+    else:
+        print_summary(aggregate([load(path) for path in args.reports]))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
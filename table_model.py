@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""Parse the HTML tables pandoc leaves in index.md into a small object model.
+
+fix_table_structure.py repairs tables and html-tables-to-pipes.py turns them
+into pipe tables. Both work on the same model, so a table is tokenized once:
+
+* `find_tables` locates every `<table ...>...</table>` span with plain
+  string searches, in one scan of the document;
+* `Table.parse` tokenizes one table into rows and cells;
+* repairs edit rows and cells and mark the table `changed`;
+* `Table.to_html` gives the original text back for an unchanged table and
+  rebuilds the HTML from the model otherwise.
+
+A cell keeps its inner HTML (`content`) and, computed in the same scan, the
+text the pipe table shows (`text`): entities decoded, `<br>` kept and every
+other tag dropped.
+"""
+
+from __future__ import annotations
+
+import re
+from html import unescape
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# Comments, tags (attributes may hold quoted '>'), everything else is text.
+# No branch can run past the next '<', so a scan is linear in the table
+# size even with unterminated comments, tags or quotes; such a fragment is
+# read as text.
+TOKEN_PATTERN = re.compile(
+    r'<!--[^<]*?-->'
+    r'|<(/?)([a-zA-Z][^\s/<>]*)((?:[^<>"\']|"[^"<]*"|\'[^\'<]*\')*)>'
+)
+SPAN_PATTERNS = {
+    "rowspan": re.compile(r'\browspan\s*=\s*["\']?\s*(\d+)', re.IGNORECASE),
+    "colspan": re.compile(r'\bcolspan\s*=\s*["\']?\s*(\d+)', re.IGNORECASE),
+}
+SECTION_TAGS = ("thead", "tbody", "tfoot")
+TABLE_OPEN = "<table"
+TABLE_CLOSE = "</table>"
+
+
+# Largest spans browsers honour; bigger values are clamped
+MAX_SPAN = {"rowspan": 65534, "colspan": 1000}
+
+
+def _span(attrs: str, name: str) -> int:
+    match = SPAN_PATTERNS[name].search(attrs)
+    return min(max(1, int(match.group(1))), MAX_SPAN[name]) if match else 1
+
+
+def cell_text(html: str) -> str:
+    """Text of cell HTML as a pipe table shows it: entities decoded, <br> kept."""
+    parts = []
+    pos = 0
+    for match in TOKEN_PATTERN.finditer(html):
+        if match.start() > pos:
+            parts.append(unescape(html[pos:match.start()]))
+        pos = match.end()
+        if match.group(2) and match.group(2).lower() == "br":
+            parts.append("<br>")
+    if len(html) > pos:
+        parts.append(unescape(html[pos:]))
+    return "".join(parts)
+
+
+class Cell:
+    """One <td> or <th>."""
+
+    __slots__ = ("tag", "attrs", "rowspan", "colspan", "_content", "_text")
+
+    def __init__(self, tag: str, content: str = "", attrs: str = ""):
+        self.tag = tag
+        self.attrs = attrs
+        self.rowspan = _span(attrs, "rowspan")
+        self.colspan = _span(attrs, "colspan")
+        self._content = content
+        self._text: Optional[str] = None
+
+    @property
+    def content(self) -> str:
+        """Inner HTML of the cell."""
+        return self._content
+
+    @content.setter
+    def content(self, html: str) -> None:
+        self._content = html
+        self._text = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = cell_text(self._content)
+        return self._text
+
+    def to_html(self) -> str:
+        return f"<{self.tag}{self.attrs}>{self._content}</{self.tag}>"
+
+    def __repr__(self) -> str:
+        return f"Cell({self.tag!r}, {self._content!r}, attrs={self.attrs!r})"
+
+
+class Row:
+    """One <tr>; `section` is thead, tbody, tfoot or "" outside any section."""
+
+    __slots__ = ("section", "attrs", "cells")
+
+    def __init__(self, section: str = "", cells: Optional[List[Cell]] = None, attrs: str = ""):
+        self.section = section
+        self.attrs = attrs
+        self.cells: List[Cell] = cells if cells is not None else []
+
+    @property
+    def in_thead(self) -> bool:
+        return self.section == "thead"
+
+    def to_html(self) -> str:
+        return "\n".join([f"<tr{self.attrs}>", *(cell.to_html() for cell in self.cells), "</tr>"])
+
+
+class Table:
+    """One <table> element: opening tag, anything before the rows, the rows."""
+
+    __slots__ = ("open_tag", "preamble", "sections", "rows", "source", "changed")
+
+    def __init__(self, open_tag: str = "<table>", preamble: str = "",
+                 rows: Optional[List[Row]] = None, source: str = ""):
+        self.open_tag = open_tag
+        self.preamble = preamble
+        self.rows: List[Row] = rows if rows is not None else []
+        # Sections the source opened, in order (kept even if they end up empty)
+        self.sections: List[str] = []
+        self.source = source
+        self.changed = False
+
+    @classmethod
+    def parse(cls, html: str) -> "Table":
+        """Tokenize one `<table ...>...</table>` string."""
+        table = cls(source=html)
+        row: Optional[Row] = None
+        cell: Optional[Cell] = None
+        cell_start = 0
+        text_parts: List[str] = []
+        section = ""
+        # Where the text after <table ...> starts, until the first row or section
+        preamble_start: Optional[int] = None
+        in_preamble = False
+
+        def close_cell(end: int) -> None:
+            nonlocal cell
+            if cell is not None:
+                cell._content = html[cell_start:end]
+                cell._text = "".join(text_parts)
+                row.cells.append(cell)
+                cell = None
+
+        def close_row(end: int) -> None:
+            nonlocal row
+            close_cell(end)
+            if row is not None:
+                # Empty rows are kept for fix_table_structure.py to remove
+                table.rows.append(row)
+            row = None
+
+        pos = 0
+        for match in TOKEN_PATTERN.finditer(html):
+            if cell is not None and match.start() > pos:
+                text_parts.append(unescape(html[pos:match.start()]))
+            pos = match.end()
+            if match.group(2) is None:
+                continue  # comment
+            closing, tag, attrs = match.group(1), match.group(2).lower(), match.group(3)
+
+            if tag == "table" and not closing and preamble_start is None:
+                table.open_tag = match.group(0)
+                preamble_start = match.end()
+                in_preamble = True
+                continue
+            if in_preamble and tag in ("td", "th", "tr", *SECTION_TAGS):
+                table.preamble = html[preamble_start:match.start()].strip()
+                in_preamble = False
+
+            if tag in ("td", "th"):
+                close_cell(match.start())
+                if not closing:
+                    if row is None:
+                        row = Row(section)
+                    cell = Cell(tag, attrs=attrs)
+                    cell_start = match.end()
+                    text_parts = []
+            elif tag == "tr":
+                close_row(match.start())
+                if not closing:
+                    row = Row(section, attrs=attrs)
+            elif tag in SECTION_TAGS or tag == "table":
+                close_row(match.start())
+                section = tag if tag != "table" and not closing else ""
+                if section and section not in table.sections:
+                    table.sections.append(section)
+            elif tag == "br" and cell is not None:
+                text_parts.append("<br>")
+        if cell is not None and len(html) > pos:
+            text_parts.append(unescape(html[pos:]))
+        close_row(len(html))
+        return table
+
+    def section_rows(self, section: str) -> List[Row]:
+        return [row for row in self.rows if row.section == section]
+
+    def to_html(self) -> str:
+        """The source text if nothing changed, else HTML rebuilt from the model."""
+        if not self.changed and self.source:
+            return self.source
+        lines = [self.open_tag]
+        if self.preamble:
+            lines.append(self.preamble)
+        section = ""
+        for row in self.rows:
+            if row.section != section:
+                if section:
+                    lines.append(f"</{section}>")
+                if row.section:
+                    lines.append(f"<{row.section}>")
+                section = row.section
+            lines.append(row.to_html())
+        if section:
+            lines.append(f"</{section}>")
+        lines.append(TABLE_CLOSE)
+        return "\n".join(lines)
+
+
+def find_tables(content: str) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) of each <table ...>...</table> span, in one scan."""
+    pos = 0
+    while True:
+        start = content.find(TABLE_OPEN, pos)
+        if start == -1:
+            return
+        open_end = content.find(">", start)
+        if open_end == -1:
+            return
+        end = content.find(TABLE_CLOSE, open_end)
+        if end == -1:
+            # No later table can be closed either
+            return
+        end += len(TABLE_CLOSE)
+        yield start, end
+        pos = end
+
+
+def rewrite_tables(content: str, on_table: Callable[[Table], str],
+                   on_text: Optional[Callable[[str], str]] = None) -> str:
+    """Replace each table with on_table(parsed table); on_text gets the text between."""
+    parts = []
+    pos = 0
+    for start, end in find_tables(content):
+        text = content[pos:start]
+        parts.append(on_text(text) if on_text else text)
+        parts.append(on_table(Table.parse(content[start:end])))
+        pos = end
+    text = content[pos:]
+    parts.append(on_text(text) if on_text else text)
+    return "".join(parts)
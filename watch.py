@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Reconvert manuals when their DOCX is saved and update the preview site.
+
+Polls the source .docx files (same defaults as convert-batch.sh; Word's
+`~$` lock files are ignored). A file counts as saved once its size and
+mtime have not changed for --debounce seconds, since Word writes a document
+in several steps. Each saved manual is then converted on its own, like
+convert-batch.sh does, so the pandoc and image caches and the build
+manifest are reused.
+
+The conversion still rewrites docs/manuals/<name>/index.md several times.
+The preview tree therefore never points at that folder: after a
+conversion, the manual is copied into a new snapshot folder under
+.cache/preview/ (images are hardlinked) and the preview entry
+`<preview-dir>/<name>` is a symlink that is swapped to the new snapshot
+with a single rename. `mkdocs serve` sees one change per save.
+
+    watch.py --preview <dir> [--interval 1] [--debounce 2] [input.docx ...]
+
+Without --preview, manuals are only reconverted. preview.sh --watch runs
+this with the preview's wip/ folder.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import asset_store
+import batch
+import build_cache
+
+SNAPSHOT_ROOT = build_cache.CACHE_ROOT / "preview"
+
+Signature = Tuple[int, int]
+
+
+def signature(path: Path) -> Optional[Signature]:
+    try:
+        info = path.stat()
+    except FileNotFoundError:
+        return None
+    return info.st_size, info.st_mtime_ns
+
+
+def snapshot(manual_dir: Path, root: Path = SNAPSHOT_ROOT) -> Path:
+    """Copy a converted manual into a new folder under `root`.
+
+    Images are hardlinked: stages only ever replace them through a rename.
+    index.md and other files are copied, because the next conversion
+    rewrites them in place.
+    """
+    target = root / f"{manual_dir.name}-{time.time_ns()}"
+    scratch = root / f".{target.name}.tmp"
+    for src in sorted(manual_dir.rglob("*")):
+        rel = src.relative_to(manual_dir)
+        if any(part.startswith(".") for part in rel.parts):
+            continue
+        dst = scratch / rel
+        if src.is_dir():
+            dst.mkdir(parents=True, exist_ok=True)
+            continue
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if src.suffix.lower() in asset_store.ASSET_SUFFIXES:
+            try:
+                os.link(src, dst)
+                continue
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+    scratch.mkdir(parents=True, exist_ok=True)
+    os.replace(scratch, target)
+    return target
+
+
+def swap_link(link: Path, target: Path) -> Optional[Path]:
+    """Point the symlink `link` at `target` in one rename; returns the old target."""
+    if link.exists() and not link.is_symlink():
+        raise IsADirectoryError(f"{link} is not a symlink; refusing to replace it")
+    previous = Path(os.readlink(link)) if link.is_symlink() else None
+    scratch = link.with_name(f".{link.name}.swap")
+    scratch.unlink(missing_ok=True)
+    os.symlink(target, scratch)
+    os.replace(scratch, link)
+    return previous
+
+
+def publish_preview(manual_dir: Path, preview_dir: Path) -> Path:
+    """Swap `<preview_dir>/<name>` to a fresh snapshot of `manual_dir`.
+
+    The previous snapshot is kept, since mkdocs may still be reading it;
+    older ones are removed.
+    """
+    preview_dir.mkdir(parents=True, exist_ok=True)
+    target = snapshot(manual_dir)
+    previous = swap_link(preview_dir / manual_dir.name, target)
+    for old in SNAPSHOT_ROOT.iterdir():
+        if (old.name.rpartition("-")[0] == manual_dir.name and old.is_dir()
+                and old not in (target, previous)):
+            shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+class Watcher:
+    """Tracks source signatures and reports the files whose save has settled."""
+
+    def __init__(self, patterns: List[str], base: Path, debounce: float,
+                 sources: Optional[List[Path]] = None):
+        self.patterns = patterns
+        self.base = base
+        self.debounce = debounce
+        self.sources = sources
+        self.known: Dict[Path, Signature] = {}
+        # Changed files: signature last seen and when it was first seen
+        self.pending: Dict[Path, Tuple[Signature, float]] = {}
+
+    def scan(self) -> List[Path]:
+        if self.sources is not None:
+            return [path for path in self.sources if path.is_file()]
+        return batch.find_sources(self.patterns, self.base)
+
+    def prime(self) -> None:
+        """Take the current state as converted; only later saves trigger."""
+        for path in self.scan():
+            sig = signature(path)
+            if sig is not None:
+                self.known[path] = sig
+
+    def poll(self, now: float) -> List[Path]:
+        settled = []
+        for path in self.scan():
+            sig = signature(path)
+            if sig is None:
+                continue
+            if sig == self.known.get(path):
+                self.pending.pop(path, None)
+                continue
+            seen = self.pending.get(path)
+            if seen is None or seen[0] != sig:
+                self.pending[path] = (sig, now)
+            elif now - seen[1] >= self.debounce:
+                del self.pending[path]
+                self.known[path] = sig
+                settled.append(path)
+        return settled
+
+
+def convert(source: Path, env: Dict[str, str], preview_dir: Optional[Path]) -> bool:
+    # Pick up edits to filters, stages or rules since the last conversion
+    build_cache.pipeline_inputs.cache_clear()
+    build_cache.pandoc_inputs.cache_clear()
+    job = batch.run_job(batch.Job(name=source.stem, sources=[source]), env)
+    batch.print_job(job, None)
+    result = job.results[-1]
+    if result.status != "ok":
+        return result.status == "skipped"
+    if preview_dir is not None:
+        target = publish_preview(Path(env["OUT_DIR"]) / job.name, preview_dir)
+        print(f"🔄 Preview updated: {preview_dir / job.name} -> {target.name}")
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sources", nargs="*", type=Path,
+                        help="DOCX files to watch (default: *.docx and 'docx manuals/*.docx')")
+    parser.add_argument("--preview", type=Path,
+                        help="folder of per-manual symlinks served by mkdocs (e.g. trikdis-docs wip/)")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="seconds between polls (default: 1)")
+    parser.add_argument("--debounce", type=float, default=2.0,
+                        help="seconds a file must stay unchanged before converting (default: 2)")
+    parser.add_argument("--initial", action="store_true",
+                        help="also convert out-of-date manuals at start-up")
+    args = parser.parse_args(argv)
+
+    cwd = Path.cwd()
+    sources = [path.resolve() for path in args.sources] if args.sources else None
+    watcher = Watcher(batch.DEFAULT_PATTERNS, cwd, args.debounce, sources)
+
+    env = dict(os.environ)
+    env["OUT_DIR"] = str((cwd / env.get("OUT_DIR", "docs/manuals")).resolve())
+
+    if not args.initial:
+        watcher.prime()
+    print(f"👀 Watching {len(watcher.scan())} file(s) -> {env['OUT_DIR']}"
+          + (f", preview {args.preview}" if args.preview else "") + " (Ctrl+C to stop)")
+    sys.stdout.flush()
+    try:
+        while True:
+            for source in watcher.poll(time.monotonic()):
+                print(f"📝 Saved: {batch.display(source)}")
+                if not convert(source, env, args.preview):
+                    print(f"❌ Conversion failed: {batch.display(source)}")
+                sys.stdout.flush()
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())